@@ -7,7 +7,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from rest_framework import status
-from orders.models import Order
+from orders.models import ACTIVE, Order
 from .models import User
 from .serializers import (
     UserRegistrationSerializer,
@@ -131,7 +131,7 @@ class UserProfileAPIView(RetrieveUpdateDestroyAPIView):
         Response: objects
             Renders to content type as requested by the client.
         """
-        if Order.objects.filter(returned=False, user=self.get_object()).exists():
+        if Order.objects.filter(status=ACTIVE, user=self.get_object()).exists():
             return Response(
                 {"status": "OK", "message": DELETE_USER_EXISTING_BOOKINGS},
                 status=status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import BrandDailyRollup, CarDailyRollup, TypeDailyRollup
+
+# Register your models here.
+admin.site.register(CarDailyRollup)
+admin.site.register(BrandDailyRollup)
+admin.site.register(TypeDailyRollup)
@@ -0,0 +1,71 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('cars', '0012_carblackout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TypeDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('fines', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('booked_days', models.IntegerField(default=0)),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='cars.type')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CarDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('fines', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('booked_days', models.IntegerField(default=0)),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='cars.car')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BrandDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('fines', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('booked_days', models.IntegerField(default=0)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='cars.brand')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='typedailyrollup',
+            constraint=models.UniqueConstraint(fields=('type', 'day'), name='type_daily_rollup_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='cardailyrollup',
+            index=models.Index(fields=['day'], name='car_daily_rollup_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cardailyrollup',
+            constraint=models.UniqueConstraint(fields=('car', 'day'), name='car_daily_rollup_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='branddailyrollup',
+            constraint=models.UniqueConstraint(fields=('brand', 'day'), name='brand_daily_rollup_uniq'),
+        ),
+    ]
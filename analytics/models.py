@@ -0,0 +1,59 @@
+from django.db import models
+from cars.models import Brand, Car, Type
+
+
+class DailyRollup(models.Model):
+    """Totals of the orders of a day, for one car, brand or type.
+    The sales, `orders`, `revenue` and `discount`, are counted on the day the order is made,
+    `booked_days` on every day of the booking and `fines` on its last day.
+    Cancelled orders aren't counted.
+    """
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fines = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    booked_days = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class CarDailyRollup(DailyRollup):
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name="daily_rollups")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['car', 'day'], name='car_daily_rollup_uniq'),
+        ]
+        indexes = [
+            # fleet totals over a date range.
+            models.Index(fields=['day'], name='car_daily_rollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"Car-{self.car_id} {self.day}"
+
+
+class BrandDailyRollup(DailyRollup):
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name="daily_rollups")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['brand', 'day'], name='brand_daily_rollup_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Brand-{self.brand_id} {self.day}"
+
+
+class TypeDailyRollup(DailyRollup):
+    type = models.ForeignKey(Type, on_delete=models.CASCADE, related_name="daily_rollups")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['type', 'day'], name='type_daily_rollup_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Type-{self.type_id} {self.day}"
@@ -0,0 +1,309 @@
+"""Daily rollups of :model:`orders.Order` by car, brand and type.
+
+Every order adds to the rollups of its car, and of the brand and type of the
+car: its sale, price and discount, on the day it was ordered, a booked day on
+every day of its booking and its fine on its last day. Cancelled orders, and
+orders whose car was deleted, add nothing: deleting a car removes its rollups
+from its brand and type.
+
+The rollups are kept up to date incrementally: saving or deleting an order
+applies the difference between its stored and its new contribution, with an
+`INSERT ... ON CONFLICT DO UPDATE` per table within the transaction of the
+order. The brand and type rollups follow the current brand and type of the
+cars, moving a car to another brand or type moves its rollups with it.
+`backfill_rollups` rebuilds them from the orders, a window of days at a time.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
+from psycopg2.extras import DateRange
+from cars.models import Car
+from orders.models import BOOKED, CANCELLED_STATUSES, Order
+from .models import BrandDailyRollup, CarDailyRollup, TypeDailyRollup
+
+ORDER_FIELDS = ('car_id', 'status', 'order_date', 'start_date', 'end_date', 'price', 'discount', 'fine_amount')
+"""Fields of an order its contribution to the rollups depends on.
+"""
+
+MEASURES = ('orders', 'revenue', 'discount', 'fines', 'booked_days')
+
+DIMENSIONS = (
+    (CarDailyRollup, 'car_id'),
+    (BrandDailyRollup, 'brand_id'),
+    (TypeDailyRollup, 'type_id'),
+)
+"""Rollup model and key column of each dimension, in the order of the keys of a contribution.
+"""
+
+CHUNK_SIZE = 2000
+"""Number of orders read, and of rollup rows written, at once.
+"""
+
+WINDOW_DAYS = 31
+"""Number of days rebuilt per transaction by the backfill.
+"""
+
+
+def order_state(order):
+    """Return the values of the order its contribution depends on, as stored.
+    The values given to an unsaved instance, like strings for dates, are converted.
+    """
+    return tuple(
+        Order._meta.get_field(field).to_python(getattr(order, field)) for field in ORDER_FIELDS
+    )
+
+
+def stored_state(order_id):
+    """Return the stored contribution of the order, None if it isn't stored.
+    The row of the order is locked until the end of the current transaction, so that concurrent
+    updates of the order apply their changes one after the other.
+
+    Returns
+    -------
+    contribution: tuple
+        (keys, state), the (car id, brand id, type id) of the stored car of the order and the
+        stored values of its `ORDER_FIELDS`.
+    """
+    row = Order.objects.select_for_update(of=('self',)).filter(id=order_id).values_list(
+        'car__brand_id', 'car__type_id', *ORDER_FIELDS
+    ).first()
+    if row is None:
+        return None
+    return (row[2], row[0], row[1]), row[2:]
+
+
+def add_contribution(totals, keys, state, sign=1, start=None, end=None):
+    """Adds the contribution of an order to the totals.
+
+    Parameters
+    ----------
+    totals: defaultdict
+        Measures by (dimension index, key, day), as lists in the order of `MEASURES`.
+    keys: tuple
+        (car id, brand id, type id) of the order.
+    state: tuple
+        Values of the `ORDER_FIELDS` of the order.
+    sign: int
+        1 to add the contribution, -1 to remove it.
+    start: date
+        First day counted, None to count from the first day of the order.
+    end: date
+        Last day counted, None to count up to the last day of the order.
+    """
+    car_id, status, order_date, start_date, end_date, price, discount, fine = state
+    if car_id is None or status in CANCELLED_STATUSES:
+        return
+
+    def add(day, index, value):
+        if (start is None or day >= start) and (end is None or day <= end):
+            for dimension, key in enumerate(keys):
+                totals[(dimension, key, day)][index] += sign * value
+
+    add(order_date, 0, 1)
+    add(order_date, 1, price)
+    add(order_date, 2, discount)
+    if fine:
+        add(end_date, 3, fine)
+    day = max(start_date, start) if start else start_date
+    last = min(end_date, end) if end else end_date
+    while day <= last:
+        add(day, 4, 1)
+        day += timedelta(days=1)
+
+
+def new_totals():
+    return defaultdict(lambda: [0, Decimal(0), Decimal(0), Decimal(0), 0])
+
+
+def upsert(totals):
+    """Adds the totals to the rollup tables, creating the missing rows.
+    Unchanged totals are skipped.
+
+    Returns
+    -------
+    count: int
+        Number of rollup rows written.
+    """
+    rows = defaultdict(list)
+    for (dimension, key, day), measures in totals.items():
+        if any(measures):
+            rows[dimension].append((key, day, *measures))
+    updates = ', '.join(f"{measure} = t.{measure} + EXCLUDED.{measure}" for measure in MEASURES)
+    with connection.cursor() as cursor:
+        for dimension, dimension_rows in rows.items():
+            model, key = DIMENSIONS[dimension]
+            table = model._meta.db_table
+            # sorted, so concurrent upserts lock the rows in the same order.
+            pending = iter(sorted(dimension_rows))
+            while True:
+                chunk = list(islice(pending, CHUNK_SIZE))
+                if not chunk:
+                    break
+                values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+                cursor.execute(
+                    f"INSERT INTO {table} AS t ({key}, day, {', '.join(MEASURES)}) VALUES {values} "
+                    f"ON CONFLICT ({key}, day) DO UPDATE SET {updates}",
+                    [value for row in chunk for value in row]
+                )
+    return sum(len(dimension_rows) for dimension_rows in rows.values())
+
+
+def update_rollups(changes, keys=None):
+    """Applies the changes of orders to the rollups, in the current transaction.
+
+    Parameters
+    ----------
+    changes: list
+        (previous state, new state) of every changed order, as tuples of the values of its
+        `ORDER_FIELDS`, None for an order created or deleted.
+    keys: dict
+        (car id, brand id, type id) by car id, of the stored cars of the previous states.
+        The keys of the other cars are read.
+    """
+    changes = [(previous, state) for previous, state in changes if previous != state]
+    keys = dict(keys or {})
+    car_ids = {state[0] for change in changes for state in change if state is not None}
+    car_ids -= {None, *keys}
+    if car_ids:
+        keys.update(
+            (car_id, (car_id, brand_id, type_id))
+            for car_id, brand_id, type_id in Car.objects.filter(id__in=car_ids).values_list(
+                'id', 'brand_id', 'type_id'
+            )
+        )
+    totals = new_totals()
+    for previous, state in changes:
+        for sign, values in ((-1, previous), (1, state)):
+            if values is not None and values[0] in keys:
+                add_contribution(totals, keys[values[0]], values, sign)
+    upsert(totals)
+
+
+def move_car_rollups(car_id, dimension, previous_key, key):
+    """Moves the rollups of a car from its previous brand or type to its new one, in the
+    current transaction.
+
+    Parameters
+    ----------
+    car_id: int
+        Id of the :model:`cars.Car`.
+    dimension: int
+        Index of the brand or type dimension in `DIMENSIONS`.
+    previous_key: int
+        Id of the previous brand or type.
+    key: int
+        Id of the new brand or type, None to only remove the rollups of the car from the
+        previous one, for a deleted car.
+    """
+    model, column = DIMENSIONS[dimension]
+    table = model._meta.db_table
+    measures = ', '.join(MEASURES)
+    updates = ', '.join(f"{measure} = t.{measure} + EXCLUDED.{measure}" for measure in MEASURES)
+    with connection.cursor() as cursor:
+        # sorted by key, so concurrent moves lock the rows in the same order.
+        moves = [(sign, target) for sign, target in ((-1, previous_key), (1, key)) if target is not None]
+        for sign, target in sorted(moves, key=lambda move: move[1]):
+            selected = ', '.join(f"%s * {measure}" for measure in MEASURES)
+            cursor.execute(
+                f"INSERT INTO {table} AS t ({column}, day, {measures}) "
+                f"SELECT %s, day, {selected} FROM {CarDailyRollup._meta.db_table} WHERE car_id = %s "
+                f"ON CONFLICT ({column}, day) DO UPDATE SET {updates}",
+                [target, *[sign] * len(MEASURES), car_id]
+            )
+
+
+def backfill_bounds():
+    """Return the first and last days of the orders and of the rollups, (None, None) if there are none.
+    """
+    orders = Order.objects.aggregate(Min('order_date'), Min('start_date'), Max('order_date'), Max('end_date'))
+    rollups = [model.objects.aggregate(Min('day'), Max('day')) for model, key in DIMENSIONS]
+    firsts = [orders['order_date__min'], orders['start_date__min'], *[days['day__min'] for days in rollups]]
+    lasts = [orders['order_date__max'], orders['end_date__max'], *[days['day__max'] for days in rollups]]
+    firsts = [day for day in firsts if day is not None]
+    lasts = [day for day in lasts if day is not None]
+    if not firsts:
+        return None, None
+    return min(firsts), max(lasts)
+
+
+def rebuild_window(start, end, chunk_size):
+    """Rebuilds the rollups of the days between the dates, in one transaction.
+
+    The rollup tables are locked against the incremental updates for the rebuild of the window
+    only, the orders saved meanwhile are applied once it commits.
+
+    Returns
+    -------
+    report: dict
+        -orders: (int) number of orders read
+        -rows: (int) number of rollup rows written
+    """
+    orders = Order.objects.filter(BOOKED, car__isnull=False).filter(
+        Q(period__overlap=DateRange(start, end, '[]')) | Q(order_date__range=(start, end))
+    )
+    rows = orders.order_by('id').values_list('car__brand_id', 'car__type_id', *ORDER_FIELDS)
+    report = {'orders': 0, 'rows': 0}
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            tables = ', '.join(model._meta.db_table for model, key in DIMENSIONS)
+            cursor.execute(f"LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE")
+        for model, key in DIMENSIONS:
+            model.objects.filter(day__range=(start, end)).delete()
+        rows = rows.iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            totals = new_totals()
+            for row in chunk:
+                add_contribution(totals, (row[2], row[0], row[1]), row[2:], start=start, end=end)
+            report['orders'] += len(chunk)
+            report['rows'] += upsert(totals)
+    return report
+
+
+def backfill_rollups(start=None, end=None, chunk_size=CHUNK_SIZE, window_days=WINDOW_DAYS):
+    """Rebuilds the rollups of the days between the dates from the orders.
+
+    The days are rebuilt a window at a time, each window in its own short transaction, so the
+    order writes wait for one window at most. Orders are counted with the current brand and
+    type of their car.
+
+    Parameters
+    ----------
+    start: date
+        First day rebuilt, None to rebuild from the first order or rollup.
+    end: date
+        Last day rebuilt, None to rebuild up to the last order or rollup.
+    chunk_size: int
+        Number of orders read and applied at once.
+    window_days: int
+        Number of days rebuilt per transaction.
+
+    Returns
+    -------
+    report: dict
+        -orders: (int) number of orders read, once per window they fall in
+        -rows: (int) number of rollup rows written
+        -windows: (int) number of windows rebuilt
+    """
+    report = {'orders': 0, 'rows': 0, 'windows': 0}
+    if start is None or end is None:
+        first, last = backfill_bounds()
+        if first is None:
+            return report
+        start = start or first
+        end = end or last
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + timedelta(days=window_days - 1), end)
+        window = rebuild_window(window_start, window_end, chunk_size)
+        report['orders'] += window['orders']
+        report['rows'] += window['rows']
+        report['windows'] += 1
+        window_start = window_end + timedelta(days=1)
+    return report
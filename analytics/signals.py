@@ -0,0 +1,102 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from cars.models import Car
+from orders.models import Order
+from .rollups import ORDER_FIELDS, move_car_rollups, order_state, stored_state, update_rollups
+
+ROLLUP_UPDATE_FIELDS = {'car', *ORDER_FIELDS}
+"""Names of the fields whose update can change the rollups, as given in `update_fields`.
+"""
+
+
+def changes_rollups(update_fields):
+    return update_fields is None or not ROLLUP_UPDATE_FIELDS.isdisjoint(update_fields)
+
+
+@receiver(pre_save, sender=Order)
+def read_stored_order(sender, instance, update_fields=None, **kwargs):
+    """Reads and locks the stored contribution of an order about to be updated, which its new
+    values are compared with after the save. `Order.save` runs in a transaction, so the row
+    stays locked until the rollups are updated.
+    ----------
+    instance: object
+        Instance of :model:`orders.Order`
+    sender: :model:`orders.Order`
+    """
+    instance._rollup_contribution = None
+    if instance.pk is not None and changes_rollups(update_fields):
+        instance._rollup_contribution = stored_state(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollups(sender, instance, update_fields=None, **kwargs):
+    """Applies the change of a created or updated order to the rollups.
+    ----------
+    instance: object
+        Instance of :model:`orders.Order`
+    sender: :model:`orders.Order`
+    """
+    if not changes_rollups(update_fields):
+        return
+    previous, keys = None, {}
+    if instance._rollup_contribution is not None:
+        previous_keys, previous = instance._rollup_contribution
+        keys[previous_keys[0]] = previous_keys
+    update_rollups([(previous, order_state(instance))], keys)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_rollups(sender, instance, **kwargs):
+    """Removes a deleted order from the rollups.
+    ----------
+    instance: object
+        Instance of :model:`orders.Order`
+    sender: :model:`orders.Order`
+    """
+    update_rollups([(order_state(instance), None)])
+
+
+@receiver(pre_save, sender=Car)
+def read_stored_car(sender, instance, **kwargs):
+    """Reads and locks the stored brand and type of a car about to be updated.
+    ----------
+    instance: object
+        Instance of :model:`cars.Car`
+    sender: :model:`cars.Car`
+    """
+    instance._rollup_keys = None
+    if instance.pk is not None:
+        instance._rollup_keys = Car.objects.select_for_update().filter(pk=instance.pk).values_list(
+            'brand_id', 'type_id'
+        ).first()
+
+
+@receiver(post_save, sender=Car)
+def move_car_brand_type_rollups(sender, instance, created, **kwargs):
+    """Moves the rollups of a car to its new brand or type.
+    ----------
+    instance: object
+        Instance of :model:`cars.Car`
+    sender: :model:`cars.Car`
+    """
+    if created or instance._rollup_keys is None:
+        return
+    for dimension, previous_key, key in zip((1, 2), instance._rollup_keys, (instance.brand_id, instance.type_id)):
+        if previous_key != key:
+            move_car_rollups(instance.pk, dimension, previous_key, key)
+
+
+@receiver(pre_delete, sender=Car)
+def remove_car_rollups(sender, instance, **kwargs):
+    """Removes the rollups of a deleted car from its brand and type, before its own rollups are
+    deleted with it. Its orders lose their car with an update which sends no signal.
+    ----------
+    instance: object
+        Instance of :model:`cars.Car`
+    sender: :model:`cars.Car`
+    """
+    keys = Car.objects.select_for_update().filter(pk=instance.pk).values_list('brand_id', 'type_id').first()
+    if keys is None:
+        return
+    for dimension, previous_key in zip((1, 2), keys):
+        move_car_rollups(instance.pk, dimension, previous_key, None)
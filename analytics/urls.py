@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import RollupView, UtilizationView
+
+urlpatterns = [
+    path('rollups/', RollupView.as_view(), name="analytics-rollups"),
+    path('utilization/', UtilizationView.as_view(), name="analytics-utilization"),
+]
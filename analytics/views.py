@@ -0,0 +1,141 @@
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from cars.models import Car
+from constants import INVALID_ROLLUP_GROUP, INVALID_ROLLUP_PERIOD
+from orders.exports import export_dates
+from .models import BrandDailyRollup, CarDailyRollup, TypeDailyRollup
+from .rollups import MEASURES
+
+GROUPS = {
+    'car': CarDailyRollup,
+    'brand': BrandDailyRollup,
+    'type': TypeDailyRollup,
+}
+"""Rollup model of each `group_by` value.
+"""
+
+CAR_GROUPS = {
+    'car': 'id',
+    'brand': 'brand',
+    'type': 'type',
+}
+"""Field of :model:`cars.Car` of each `group_by` value.
+"""
+
+PERIODS = {
+    'day': TruncDay,
+    'month': TruncMonth,
+}
+
+
+def query_choice(request, name, choices, default, message):
+    """Return the validated value of a query param among the choices.
+    """
+    value = request.query_params.get(name, default)
+    if value not in choices:
+        raise ValidationError({'message': message})
+    return value
+
+
+def utilization(cars, booked_days, days):
+    """Return the utilization of a number of cars booked for some days out of the days of a range.
+    """
+    available_days = cars * days
+    return {
+        'cars': cars,
+        'booked_days': booked_days,
+        'utilization': round(booked_days / available_days, 4) if available_days else 0,
+    }
+
+
+class RollupView(APIView):
+    """Revenue, discounts, fines, orders and booked days between the `from` and `to` dates,
+    both included, read from the daily rollups.
+    The totals are grouped by `car`, `brand` or `type` with `?group_by=`, brand by default,
+    and by `day` or `month` with `?period=`, month by default.
+    """
+
+    permission_classes = [IsAdminUser]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        group = query_choice(request, 'group_by', GROUPS, 'brand', INVALID_ROLLUP_GROUP)
+        period = query_choice(request, 'period', PERIODS, 'month', INVALID_ROLLUP_PERIOD)
+        start_date, end_date = export_dates(request)
+        rows = GROUPS[group].objects.filter(day__range=(start_date, end_date)).values(
+            group, name=F(f'{group}__name'), period=PERIODS[period]('day')
+        ).annotate(
+            **{measure: Sum(measure) for measure in MEASURES}
+        ).order_by('period', group)
+        return Response({'from': start_date, 'to': end_date, 'group_by': group, 'period': period, 'data': rows})
+
+
+class UtilizationView(APIView):
+    """Utilization of the fleet between the `from` and `to` dates, both included, the share of
+    the days the listable cars were booked, read from the daily rollups of the cars.
+    With `?group_by=car`, `?group_by=brand` or `?group_by=type` the utilization of every car,
+    brand or type is listed. The number of cars is the current one.
+    """
+
+    permission_classes = [IsAdminUser]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        group = query_choice(request, 'group_by', (*CAR_GROUPS, None), None, INVALID_ROLLUP_GROUP)
+        start_date, end_date = export_dates(request)
+        days = (end_date - start_date).days + 1
+        data = {'from': start_date, 'to': end_date, 'days': days}
+        cars = Car.objects.filter(is_listable=True)
+        rollups = CarDailyRollup.objects.filter(day__range=(start_date, end_date), car__is_listable=True)
+        if group is None:
+            booked_days = rollups.aggregate(booked_days=Sum('booked_days'))['booked_days'] or 0
+            data.update(utilization(cars.count(), booked_days, days))
+            return Response(data)
+
+        field = CAR_GROUPS[group]
+        cars = dict(cars.values_list(field).annotate(Count('id')).order_by())
+        booked = dict(rollups.values_list(f'car__{field}').annotate(Sum('booked_days')).order_by())
+        data['group_by'] = group
+        data['data'] = [
+            {group: key, **utilization(count, booked.get(key, 0), days)}
+            for key, count in sorted(cars.items())
+        ]
+        return Response(data)
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Type, Brand, Car
+from .models import Type, Brand, Car, CarBlackout
 
 # Register your models here.
 admin.site.register(Type)
 admin.site.register(Brand)
 admin.site.register(Car)
+admin.site.register(CarBlackout)
@@ -0,0 +1,357 @@
+"""Availability lookups for :model:`cars.Car`.
+
+The lookups match the booked ``period`` of :model:`orders.Order` with the range
+overlap operator, which is served by the GiST index of the order exclusion
+constraint. So the cost of a date-range search depends on the cars being
+listed and not on the size of the order history.
+
+The blackouts of :model:`cars.CarBlackout` and the live holds of
+:model:`orders.BookingHold` are matched the same way, on the GiST index of their
+own exclusion constraints, and make a car unavailable exactly like a booking.
+"""
+
+from datetime import date, timedelta
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from orders.models import BOOKED, BookingHold, Order
+from .models import CarBlackout, booking_period
+
+MAX_CALENDAR_DAYS = 366
+"""Maximum number of days of an availability calendar.
+"""
+
+MAX_FREE_WINDOWS = 3
+"""Default number of free windows suggested for a booked car.
+"""
+
+BEST_FIT_HORIZON_DAYS = 30
+"""Days looked at around a booking to measure the free gap it falls in.
+"""
+
+
+def overlapping_orders(start_date, end_date):
+    """Return the non-cancelled orders overlapping the given dates.
+
+    Parameters
+    ----------
+    start_date: date
+        First day of the requested period.
+    end_date: date
+        Last day of the requested period, inclusive.
+
+    Returns
+    -------
+    queryset: for :model:`orders.Order`
+    """
+    return Order.objects.filter(BOOKED, period__overlap=booking_period(start_date, end_date))
+
+
+def overlapping_blackouts(start_date, end_date):
+    """Return the blackouts overlapping the given dates.
+
+    Parameters
+    ----------
+    start_date: date
+        First day of the requested period.
+    end_date: date
+        Last day of the requested period, inclusive.
+
+    Returns
+    -------
+    queryset: for :model:`cars.CarBlackout`
+    """
+    return CarBlackout.objects.filter(period__overlap=booking_period(start_date, end_date))
+
+
+def overlapping_holds(start_date, end_date):
+    """Return the live booking holds overlapping the given dates.
+
+    Parameters
+    ----------
+    start_date: date
+        First day of the requested period.
+    end_date: date
+        Last day of the requested period, inclusive.
+
+    Returns
+    -------
+    queryset: for :model:`orders.BookingHold`
+    """
+    return BookingHold.objects.filter(
+        period__overlap=booking_period(start_date, end_date), expires_at__gt=timezone.now()
+    )
+
+
+def booked_periods(start_date, end_date, **filters):
+    """Return the dates of the bookings, blackouts and live holds overlapping the given dates,
+    read with a single query.
+
+    Parameters
+    ----------
+    start_date: date
+        First day of the requested period.
+    end_date: date
+        Last day of the requested period, inclusive, None for no end.
+    **filters
+        Lookups on the car of the bookings, blackouts and holds.
+
+    Returns
+    -------
+    queryset: of (car_id, start_date, end_date) tuples
+    """
+    fields = ('car_id', 'start_date', 'end_date')
+    return overlapping_orders(start_date, end_date).filter(**filters).values_list(*fields).union(
+        overlapping_blackouts(start_date, end_date).filter(**filters).values_list(*fields),
+        overlapping_holds(start_date, end_date).filter(**filters).values_list(*fields),
+        all=True
+    )
+
+
+def exclude_booked_cars(queryset, start_date, end_date):
+    """Exclude the cars which are booked, blacked out or held for any day of the given dates.
+    Every car is checked with a single probe of the (car, period) GiST index of the orders,
+    and one of the blackouts and of the holds.
+
+    Parameters
+    ----------
+    queryset: queryset
+        Queryset of :model:`cars.Car`.
+    start_date: date
+        First day of the requested period.
+    end_date: date
+        Last day of the requested period, inclusive.
+
+    Returns
+    -------
+    queryset: for :model:`cars.Car`
+    """
+    orders = overlapping_orders(start_date, end_date).filter(car=OuterRef('pk'))
+    blackouts = overlapping_blackouts(start_date, end_date).filter(car=OuterRef('pk'))
+    holds = overlapping_holds(start_date, end_date).filter(car=OuterRef('pk'))
+    return queryset.filter(~Exists(orders), ~Exists(blackouts), ~Exists(holds))
+
+
+def merge_intervals(intervals):
+    """Merge overlapping and adjacent date intervals.
+
+    Parameters
+    ----------
+    intervals: list
+        (start_date, end_date) tuples sorted by start date, both days inclusive.
+
+    Returns
+    -------
+    merged: list
+        Disjoint (start_date, end_date) tuples sorted by start date.
+    """
+    merged = []
+    for start_date, end_date in intervals:
+        if merged and start_date <= merged[-1][1] + timedelta(days=1):
+            if end_date > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end_date)
+        else:
+            merged.append((start_date, end_date))
+    return merged
+
+
+def booked_intervals(car_ids, start_date, end_date):
+    """Return the booked intervals of the cars within the given dates, blackouts and holds included.
+    All the cars are read with a single range query, the intervals are then merged per car
+    with a sweep over the rows sorted by car and start date.
+
+    Parameters
+    ----------
+    car_ids: list or queryset
+        Ids of :model:`cars.Car`, a `values_list('id', flat=True)` queryset is matched as a subquery.
+    start_date: date
+        First day of the period.
+    end_date: date
+        Last day of the period, inclusive.
+
+    Returns
+    -------
+    intervals: dict
+        Merged (start_date, end_date) tuples clipped to the period, by car id.
+    """
+    rows = booked_periods(start_date, end_date, car_id__in=car_ids).order_by('car_id', 'start_date')
+    intervals = {car_id: [] for car_id in car_ids}
+    for car_id, booked_start, booked_end in rows:
+        intervals[car_id].append((max(booked_start, start_date), min(booked_end, end_date)))
+    return {car_id: merge_intervals(booked) for car_id, booked in intervals.items()}
+
+
+def free_intervals(booked, start_date, end_date):
+    """Return the free intervals of the period, complement of the merged booked intervals.
+
+    Parameters
+    ----------
+    booked: list
+        Merged (start_date, end_date) tuples within the period.
+    start_date: date
+        First day of the period.
+    end_date: date
+        Last day of the period, inclusive.
+
+    Returns
+    -------
+    free: list
+        (start_date, end_date) tuples sorted by start date.
+    """
+    free = []
+    cursor = start_date
+    for booked_start, booked_end in booked:
+        if booked_start > cursor:
+            free.append((cursor, booked_start - timedelta(days=1)))
+        cursor = max(cursor, booked_end + timedelta(days=1))
+    if cursor <= end_date:
+        free.append((cursor, end_date))
+    return free
+
+
+def earliest_start_dates(car_ids, start_date, end_date, days):
+    """Return the earliest date each car can be booked for the given number of days
+    within the given dates.
+    The booked intervals of all the cars are read with a single query, then the free
+    intervals of every car are swept for the first one long enough.
+
+    Parameters
+    ----------
+    car_ids: list or queryset
+        Ids of :model:`cars.Car`, a `values_list('id', flat=True)` queryset is matched as a subquery.
+    start_date: date
+        First day of the window.
+    end_date: date
+        Last day of the window, inclusive.
+    days: int
+        Number of days of the booking.
+
+    Returns
+    -------
+    start_dates: dict
+        Earliest start date by car id, the cars without a long enough free interval are left out.
+    """
+    length = timedelta(days=days - 1)
+    start_dates = {}
+    for car_id, booked in booked_intervals(car_ids, start_date, end_date).items():
+        for free_start, free_end in free_intervals(booked, start_date, end_date):
+            if free_end - free_start >= length:
+                start_dates[car_id] = free_start
+                break
+    return start_dates
+
+
+def best_fit_car_ids(car_ids, start_date, end_date, horizon=BEST_FIT_HORIZON_DAYS):
+    """Order the cars, free for the given dates, by the free gap the booking would fall in,
+    the tightest gap first. Filling the tightest gaps keeps the longer gaps of the fleet free
+    for longer bookings.
+    The bookings around the dates are read with a single query, the gaps are capped at the
+    horizon on each side, and start today at the earliest.
+
+    Parameters
+    ----------
+    car_ids: list
+        Ids of :model:`cars.Car` free for the given dates.
+    start_date: date
+        First day of the booking.
+    end_date: date
+        Last day of the booking, inclusive.
+    horizon: int
+        Maximum days of free gap counted on each side of the booking.
+
+    Returns
+    -------
+    car_ids: list
+        Ids sorted by the days left free around the booking, then by id.
+    """
+    window_start = max(start_date - timedelta(days=horizon), date.today())
+    window_end = end_date + timedelta(days=horizon)
+    slack = {}
+    for car_id, booked in booked_intervals(car_ids, window_start, window_end).items():
+        before = [booked_end for _, booked_end in booked if booked_end < start_date]
+        after = [booked_start for booked_start, _ in booked if booked_start > end_date]
+        gap_start = before[-1] + timedelta(days=1) if before else window_start
+        gap_end = after[0] - timedelta(days=1) if after else window_end
+        slack[car_id] = (start_date - gap_start) + (gap_end - end_date)
+    return sorted(slack, key=lambda car_id: (slack[car_id], car_id))
+
+
+def availability_calendar(car_ids, start_date, end_date):
+    """Return the availability calendar of the cars for the given dates.
+
+    Parameters
+    ----------
+    car_ids: list
+        Ids of :model:`cars.Car`.
+    start_date: date
+        First day of the calendar.
+    end_date: date
+        Last day of the calendar, inclusive.
+
+    Returns
+    -------
+    calendar: list
+        One dict per car with,
+            -car: (int) id of the car
+            -booked: (list) booked intervals
+            -free: (list) free intervals
+            -days: (list) booked status of every day
+    """
+    calendar = []
+    for car_id, booked in booked_intervals(car_ids, start_date, end_date).items():
+        booked_days = set()
+        for booked_start, booked_end in booked:
+            booked_days.update(
+                booked_start + timedelta(days=i) for i in range((booked_end - booked_start).days + 1)
+            )
+        calendar.append({
+            'car': car_id,
+            'booked': [{'start_date': start, 'end_date': end} for start, end in booked],
+            'free': [
+                {'start_date': start, 'end_date': end}
+                for start, end in free_intervals(booked, start_date, end_date)
+            ],
+            'days': [
+                {'date': day, 'booked': day in booked_days}
+                for day in (start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1))
+            ],
+        })
+    return calendar
+
+
+def free_windows(car_id, start_date, end_date, count=MAX_FREE_WINDOWS):
+    """Return the free windows of the car nearest to the requested dates, with as many days.
+    The future bookings, blackouts and holds of the car are read with a single query sorted by
+    start date, and every gap between them gives the window of the gap closest to the requested
+    start date.
+
+    Parameters
+    ----------
+    car_id: int
+        Id of :model:`cars.Car`.
+    start_date: date
+        First day of the requested period.
+    end_date: date
+        Last day of the requested period, inclusive.
+    count: int
+        Maximum number of windows.
+
+    Returns
+    -------
+    windows: list
+        {start_date, end_date} dicts from today on, the nearest to the requested dates first.
+    """
+    length = end_date - start_date
+    gap_start = date.today()
+    booked = merge_intervals(
+        (booked_start, booked_end)
+        for _, booked_start, booked_end in booked_periods(gap_start, None, car_id=car_id).order_by('start_date')
+    )
+    starts = []
+    for booked_start, booked_end in booked:
+        latest_start = booked_start - timedelta(days=1) - length
+        if latest_start >= gap_start:
+            starts.append(min(max(gap_start, start_date), latest_start))
+        gap_start = max(gap_start, booked_end + timedelta(days=1))
+    starts.append(max(gap_start, start_date))
+    starts.sort(key=lambda start: (abs(start - start_date), start))
+    return [{'start_date': start, 'end_date': start + length} for start in starts[:count]]
@@ -0,0 +1,127 @@
+"""Versioned cache of the car catalogue.
+
+Every cached namespace has a version number stored in the Django cache, which is
+shared by all the workers. Changing the data bumps the version, the workers then
+notice the new version on their next read and reload their copy.
+
+Brands and types rarely change, so they are kept in the memory of each worker
+and only the version number is read from the shared cache per request.
+
+The versions also give cheap ETags to the car endpoints, see `versions_etag`.
+"""
+
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOGUE = 'catalogue'
+"""Version namespace of :model:`cars.Brand` and :model:`cars.Type`.
+"""
+
+CARS = 'cars'
+"""Version namespace of :model:`cars.Car`.
+"""
+
+BOOKINGS = 'bookings'
+"""Version namespace of the bookings, which decide the availability of the cars.
+"""
+
+CATALOGUE_TIMEOUT = 60 * 60 * 24
+"""Seconds a version of the catalogue is kept in the shared cache.
+"""
+
+HOLD_EXPIRY_GRANULARITY = 60
+"""Maximum seconds an ETag depending on the bookings outlives an expired booking hold.
+"""
+
+_catalogue = {'version': None, 'brands': {}, 'types': {}}
+
+
+def version_key(namespace):
+    return f"{namespace}:version"
+
+
+def get_version(namespace):
+    """Return the current version of the namespace.
+    A missing version, never set or evicted from the cache, is seeded with the current
+    time in milliseconds so that versions keep increasing.
+    """
+    version = cache.get(version_key(namespace))
+    if version is None:
+        cache.add(version_key(namespace), int(time.time() * 1000), timeout=None)
+        version = cache.get(version_key(namespace))
+    return version
+
+
+def _increment(namespace):
+    try:
+        cache.incr(version_key(namespace))
+    except ValueError:
+        get_version(namespace)
+
+
+def bump_version(namespace):
+    """Invalidate the cached data of the namespace.
+    The version is bumped right away for the current transaction, and again once the
+    transaction commits, so that data cached by other workers before the commit is dropped.
+    """
+    _increment(namespace)
+    transaction.on_commit(lambda: _increment(namespace))
+
+
+def get_catalogue():
+    """Return the serialized brands and types, keyed by their ids.
+
+    Returns
+    -------
+    catalogue: dict
+        -brands: (dict) serialized :model:`cars.Brand` by id
+        -types: (dict) serialized :model:`cars.Type` by id
+    """
+    global _catalogue
+    version = get_version(CATALOGUE)
+    if _catalogue['version'] != version:
+        key = f"{CATALOGUE}:{version}"
+        data = cache.get(key)
+        if data is None:
+            from .models import Brand, Type
+            from .serializers import BrandSerializer, TypeSerializer
+            data = {
+                'brands': {
+                    brand['id']: dict(brand)
+                    for brand in BrandSerializer(Brand.objects.order_by('id'), many=True).data
+                },
+                'types': {
+                    car_type['id']: dict(car_type)
+                    for car_type in TypeSerializer(Type.objects.order_by('id'), many=True).data
+                },
+            }
+            cache.set(key, data, timeout=CATALOGUE_TIMEOUT)
+        _catalogue = {'version': version, **data}
+    return _catalogue
+
+
+def versions_etag(request, namespaces):
+    """Return a strong ETag for the response to the request, derived from the current versions
+    of the namespaces the response depends on.
+
+    Booking holds expire with time, without a change bumping the bookings version, so an
+    ETag depending on the bookings also changes every `HOLD_EXPIRY_GRANULARITY` seconds.
+
+    Parameters
+    ----------
+    request: HttpRequest object
+        Contains data about the request.
+    namespaces: list
+        Version namespaces the response depends on.
+
+    Returns
+    -------
+    etag: string
+    """
+    versions = ':'.join(str(get_version(namespace)) for namespace in namespaces)
+    if BOOKINGS in namespaces:
+        versions = f"{versions}:{int(time.time() // HOLD_EXPIRY_GRANULARITY)}"
+    key = f"{versions}:{request.get_full_path()}:{request.META.get('HTTP_ACCEPT', '')}"
+    return hashlib.md5(key.encode()).hexdigest()
@@ -0,0 +1,90 @@
+"""Facet counts of a car search.
+
+All the facets are counted by a single ``GROUP BY GROUPING SETS`` query over the
+filtered cars, one grouping set per facet and an empty set for the total.
+"""
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Value, When
+from .cache import get_catalogue
+
+PRICE_BUCKETS = (1000, 2000, 5000, 10000)
+"""Upper bounds of the price buckets, the last bucket has no upper bound.
+"""
+
+FACETS = ('fuel_type', 'transmission_type', 'seats', 'brand_id', 'type_id', 'price_bucket')
+"""Columns counted by the facets query, in the order of its result rows.
+"""
+
+
+def price_bucket(bounds):
+    """Return the expression numbering the price bucket of a car, from 0.
+    """
+    return Case(
+        *[When(price__lt=bound, then=Value(i)) for i, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+
+
+def car_facets(queryset, price_buckets=PRICE_BUCKETS):
+    """Return the facet counts of the cars of the queryset.
+
+    Parameters
+    ----------
+    queryset: queryset
+        Filtered queryset of :model:`cars.Car`.
+    price_buckets: tuple
+        Increasing upper bounds of the price buckets.
+
+    Returns
+    -------
+    facets: dict
+        -count: (int) number of cars
+        -fuel_type, transmission_type, seats: (list) value and count of each value
+        -brand, type: (list) id, name and count of each brand or type
+        -price: (list) min, max and count of each non empty price bucket
+    """
+    cars = queryset.order_by().values(*FACETS[:-1], price_bucket=price_bucket(price_buckets))
+    sql, params = cars.query.get_compiler(using=cars.db).as_sql()
+    columns = ', '.join(FACETS)
+    grouping_sets = ', '.join(f"({column})" for column in FACETS)
+    with connections[cars.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT {columns}, COUNT(*) FROM ({sql}) AS cars GROUP BY GROUPING SETS ({grouping_sets}, ())",
+            params
+        )
+        rows = cursor.fetchall()
+
+    facets = {'count': 0, **{column: {} for column in FACETS}}
+    for *values, count in rows:
+        # The faceted columns aren't nullable, so the only not null column of a row
+        # is the one it is grouped by, the total row has none.
+        grouped = [(column, value) for column, value in zip(FACETS, values) if value is not None]
+        if grouped:
+            column, value = grouped[0]
+            facets[column][value] = count
+        else:
+            facets['count'] = count
+
+    catalogue = get_catalogue()
+    bounds = (None, *price_buckets, None)
+    return {
+        'count': facets['count'],
+        **{
+            column: [{'value': value, 'count': count} for value, count in sorted(facets[column].items())]
+            for column in ('fuel_type', 'transmission_type', 'seats')
+        },
+        'brand': [
+            {'id': brand_id, 'name': catalogue['brands'].get(brand_id, {}).get('name'), 'count': count}
+            for brand_id, count in sorted(facets['brand_id'].items())
+        ],
+        'type': [
+            {'id': type_id, 'name': catalogue['types'].get(type_id, {}).get('name'), 'count': count}
+            for type_id, count in sorted(facets['type_id'].items())
+        ],
+        'price': [
+            {'min': bounds[bucket], 'max': bounds[bucket + 1], 'count': count}
+            for bucket, count in sorted(facets['price_bucket'].items())
+        ],
+    }
@@ -1,4 +1,5 @@
 from django_filters import rest_framework as filters
+from django.contrib.postgres.search import TrigramWordSimilarity
 from .models import Car
 
 
@@ -26,6 +27,34 @@ class CarFilter(filters.FilterSet):
     """filtering brand field, looks for containing substring in the field.
     """
 
+    search = filters.CharFilter(method='filter_search')
+    """fuzzy search over the name, brand and type of the car, ranked by the best match.
+    """
+
     class Meta:
         model = Car
         fields = '__all__'
+        exclude = ['search_text', 'is_listable']
+
+    def filter_search(self, queryset, name, value):
+        """Filters the cars whose name, brand or type names are a trigram word match of the value,
+        ordered by similarity.
+        The match is made on the `search_text` column with the ``%>`` operator, in a single scan of its
+        trigram GIN index.
+
+        Parameters
+        ----------
+        queryset: queryset
+            Queryset of :model:`cars.Car`.
+        name: string
+            Name of the filter.
+        value: string
+            Searched text.
+
+        Returns
+        -------
+        queryset: for :model:`cars.Car`
+        """
+        return queryset.filter(search_text__trigram_word_similar=value).annotate(
+            search_rank=TrigramWordSimilarity(value, 'search_text')
+        ).order_by('-search_rank', 'id')
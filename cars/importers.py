@@ -0,0 +1,171 @@
+"""Bulk import of :model:`cars.Car` from CSV or NDJSON streams.
+
+Rows are read lazily from the stream and validated in chunks, the brands and
+types are resolved by name from dicts loaded once per import, and every valid
+chunk is inserted with a single `bulk_create`. Invalid rows are reported with
+their row number and don't abort the import, so memory stays constant whatever
+the size of the stream. A stream which can't be read any further, not UTF-8 or
+malformed CSV, is reported as an invalid row too and ends the import.
+"""
+
+import codecs
+import csv
+import json
+from rest_framework import serializers
+from .cache import CARS, bump_version
+from .models import Brand, Type, Car
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+
+class InvalidStream(Exception):
+    """Raised when the rest of an imported stream can't be read.
+    """
+
+
+class CarImportSerializer(serializers.ModelSerializer):
+    """Validates an imported row of :model:`cars.Car`, with the brand and type given by name.
+    """
+
+    brand = serializers.CharField()
+    type = serializers.CharField()
+
+    class Meta:
+        model = Car
+        exclude = ['search_text', 'is_listable']
+
+    def validate_brand(self, value):
+        brand = self.context['brands'].get(value.strip().lower())
+        if brand is None:
+            raise serializers.ValidationError("Invalid brand name.")
+        return brand
+
+    def validate_type(self, value):
+        car_type = self.context['types'].get(value.strip().lower())
+        if car_type is None:
+            raise serializers.ValidationError("Invalid type name.")
+        return car_type
+
+
+def decode_lines(chunks, encoding='utf-8'):
+    """Yield the decoded text of the byte chunks of a stream, lazily.
+
+    Raises
+    ------
+    InvalidStream
+        With the byte position in the stream of the first invalid byte.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    position = 0
+    for chunk in chunks:
+        try:
+            text = decoder.decode(chunk)
+        except UnicodeDecodeError as error:
+            raise InvalidStream(f"Invalid {encoding} text at byte {position + error.start}.")
+        position += len(chunk)
+        if text:
+            yield text
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError as error:
+        raise InvalidStream(f"Invalid {encoding} text at byte {position + error.start}.")
+
+
+def read_rows(lines, format):
+    """Yield the rows of a CSV or NDJSON stream, lazily.
+
+    Parameters
+    ----------
+    lines: iterable
+        Text lines of the stream.
+    format: string
+        `csv` or `ndjson`, a CSV stream starts with a header line.
+
+    Yields
+    ------
+    row: dict, None or InvalidStream
+        Fields of the row, None for a line which isn't a JSON object, the error ending the
+        rows when the rest of the stream can't be read.
+    """
+    try:
+        if format == CSV:
+            try:
+                yield from csv.DictReader(lines)
+            except csv.Error as error:
+                raise InvalidStream(f"Invalid CSV, {error}")
+            return
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    except InvalidStream as error:
+        yield error
+
+
+def chunked(rows, size):
+    """Yield lists of up to `size` numbered rows.
+    """
+    chunk = []
+    for number, row in enumerate(rows, start=1):
+        chunk.append((number, row))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_cars(rows, batch_size=500, on_error=None):
+    """Validate and insert the rows as :model:`cars.Car`.
+
+    Parameters
+    ----------
+    rows: iterable
+        Rows of fields, as yielded by `read_rows`.
+    batch_size: int
+        Number of rows validated and inserted at once.
+    on_error: callable
+        Called with the row number and the errors of every invalid row.
+
+    Returns
+    -------
+    result: dict
+        -created: (int) number of cars created
+        -failed: (int) number of invalid rows
+        -truncated: (bool) whether the import ended on a stream which can't be read further
+    """
+    context = {
+        'brands': {brand.name.lower(): brand for brand in Brand.objects.all()},
+        'types': {car_type.name.lower(): car_type for car_type in Type.objects.all()},
+    }
+    result = {'created': 0, 'failed': 0, 'truncated': False}
+    for chunk in chunked(rows, batch_size):
+        cars = []
+        for number, row in chunk:
+            if row is None:
+                errors = {'non_field_errors': ["Invalid row, expected a JSON object."]}
+            elif isinstance(row, InvalidStream):
+                errors = {'non_field_errors': [str(row)]}
+                result['truncated'] = True
+            else:
+                serializer = CarImportSerializer(data=row, context=context)
+                if serializer.is_valid():
+                    car = Car(**serializer.validated_data)
+                    car.refresh_denormalized_fields()
+                    cars.append(car)
+                    continue
+                errors = serializer.errors
+            result['failed'] += 1
+            if on_error is not None:
+                on_error(number, errors)
+        Car.objects.bulk_create(cars, batch_size=batch_size)
+        result['created'] += len(cars)
+    if result['created']:
+        bump_version(CARS)
+    return result
@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from cars.availability import exclude_booked_cars
+from cars.models import Brand, Type, Car
+from orders.models import BOOKED, Order
+
+
+class Command(BaseCommand):
+    """Compares the date-range car search against a large order history.
+
+    Seeds the given number of historic :model:`orders.Order` rows inside a
+    transaction which is rolled back at the end, then times the legacy
+    ``NOT IN (SELECT car FROM orders ...)`` search, joined with the brands and types,
+    against the `is_listable` flag and the (car, period) GiST index.
+    """
+
+    help = "Benchmarks the date-range availability search with a large order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000000, help="Number of historic orders to seed.")
+        parser.add_argument('--cars', type=int, default=1000, help="Number of cars to seed.")
+        parser.add_argument('--repeat', type=int, default=5, help="Number of timed runs per query.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['cars'], options['orders'])
+            start_date = date.today() + timedelta(days=7)
+            end_date = start_date + timedelta(days=3)
+            legacy = Car.objects.exclude(
+                Q(available=False) |
+                Q(brand__available=False) |
+                Q(type__available=False)
+            ).order_by('id').exclude(id__in=Order.objects.filter(
+                BOOKED,
+                start_date__lte=end_date,
+                end_date__gte=start_date
+            ).values('car'))
+            indexed = exclude_booked_cars(Car.objects.filter(is_listable=True).order_by('id'), start_date, end_date)
+
+            for name, queryset in (('legacy subquery', legacy), ('period index', indexed)):
+                self.report(name, queryset, options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, cars, orders):
+        """Bulk inserts the benchmark cars and historic orders.
+        """
+        brand = Brand.objects.create(name="benchmark-brand")
+        car_type = Type.objects.create(name="benchmark-type")
+        created = Car.objects.bulk_create(
+            Car(name=f"car-{i}", brand=brand, type=car_type, price=1000, reg_number=f"BENCH-{i}")
+            for i in range(cars)
+        )
+        first_car_id = min(car.id for car in created)
+        self.stdout.write(f"Seeding {orders} historic orders for {cars} cars...")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Order._meta.db_table}
+                    (car_id, start_date, end_date, price, fine_amount, accrued_fine, status, order_date,
+                     discount, payment_intent_id, period)
+                SELECT car_id, start_date, end_date, 1000, 0, 0, status, start_date, 0,
+                       'benchmark-' || g, daterange(start_date, end_date, '[]')
+                FROM (
+                    SELECT g, %s + g %% %s AS car_id,
+                           CASE WHEN g %% 10 = 0 THEN 'cancelled' ELSE 'returned' END AS status,
+                           CURRENT_DATE - 7 * (g / %s + 1) AS start_date,
+                           CURRENT_DATE - 7 * (g / %s + 1) + g %% 5 AS end_date
+                    FROM generate_series(0, %s - 1) AS g
+                ) AS seed
+                """,
+                [first_car_id, cars, cars, cars, orders]
+            )
+            cursor.execute(f"ANALYZE {Order._meta.db_table}")
+            cursor.execute(f"ANALYZE {Car._meta.db_table}")
+
+    def report(self, name, queryset, repeat):
+        """Times the first page of the search and prints the best and average run.
+        """
+        timings = []
+        for _ in range(repeat):
+            started = perf_counter()
+            list(queryset[:6])
+            timings.append((perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"{name}: best {min(timings):.2f} ms, average {sum(timings) / len(timings):.2f} ms"
+        )
@@ -0,0 +1,42 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from cars.importers import CSV, FORMATS, NDJSON, import_cars, read_rows
+
+
+class Command(BaseCommand):
+    """Bulk imports :model:`cars.Car` from a CSV or NDJSON file.
+
+    The file is streamed and imported in batches, invalid rows are written to
+    stderr with their row number and don't stop the import.
+    """
+
+    help = "Imports cars from a CSV or NDJSON file, the brands and types are given by name."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path of the file to import.")
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help="Format of the file, guessed from its extension by default."
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of rows inserted at once.")
+
+    def handle(self, *args, **options):
+        format = options['format']
+        if format is None:
+            extension = os.path.splitext(options['path'])[1].lower()
+            format = {'.csv': CSV, '.ndjson': NDJSON, '.jsonl': NDJSON}.get(extension)
+            if format is None:
+                raise CommandError("Unknown file extension, use --format.")
+
+        def report(row, errors):
+            self.stderr.write(f"Row {row}: {json.dumps(errors)}")
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as lines:
+                result = import_cars(read_rows(lines, format), batch_size=options['batch_size'], on_error=report)
+        except OSError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} cars, {result['failed']} invalid rows."
+        ))
@@ -0,0 +1,33 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:11
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_alter_car_price'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='car',
+            name='search_text',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE cars_car SET search_text = cars_car.name || ' ' || cars_brand.name || ' ' || cars_type.name
+            FROM cars_brand, cars_type
+            WHERE cars_brand.id = cars_car.brand_id AND cars_type.id = cars_car.type_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_text'], name='car_search_text_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
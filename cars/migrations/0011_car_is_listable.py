@@ -0,0 +1,30 @@
+# Generated by Django 4.0.5 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0010_car_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='is_listable',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE cars_car SET is_listable = cars_car.available AND cars_brand.available AND cars_type.available
+            FROM cars_brand, cars_type
+            WHERE cars_brand.id = cars_car.brand_id AND cars_type.id = cars_car.type_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('is_listable', True)), fields=['id'], name='car_listable_idx'),
+        ),
+    ]
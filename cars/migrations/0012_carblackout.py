@@ -0,0 +1,33 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:26
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0011_car_is_listable'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.CreateModel(
+            name='CarBlackout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('period', django.contrib.postgres.fields.ranges.DateRangeField(editable=False)),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blackouts', to='cars.car')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='carblackout',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[('car', '='), ('period', '&&')], name='car_blackout_period_excl'),
+        ),
+    ]
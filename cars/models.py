@@ -1,4 +1,23 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, RangeOperators
+from django.contrib.postgres.indexes import GinIndex
+from psycopg2.extras import DateRange
+
+BLACKOUT_PERIOD_CONSTRAINT = 'car_blackout_period_excl'
+
+
+def car_search_text(name, brand_name, type_name):
+    """Return the text searched by the fuzzy car search, joining the car name
+    with the names of its brand and type.
+    """
+    return f"{name} {brand_name} {type_name}"
+
+
+def booking_period(start_date, end_date):
+    """Return the range covering the booking dates, both days inclusive.
+    """
+    return DateRange(start_date, end_date, '[]')
 
 
 class Brand(models.Model):
@@ -37,6 +56,56 @@ class Car(models.Model):
     transmission_type = models.CharField(max_length=10, choices=TRANSMISSION_TYPE_CHOICE, default="manual")
     reg_number = models.CharField(max_length=20)
     available = models.BooleanField(default=True)
+    search_text = models.TextField(editable=False, default='')
+    is_listable = models.BooleanField(editable=False, default=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_text'], opclasses=['gin_trgm_ops'], name='car_search_text_trgm_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_listable=True), name='car_listable_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id} - {self.name}"
+
+    def refresh_denormalized_fields(self):
+        """Sets the fields copied from the brand and type of the car,
+        the search text and whether the car, its brand and its type are all available.
+        """
+        self.search_text = car_search_text(self.name, self.brand.name, self.type.name)
+        self.is_listable = self.available and self.brand.available and self.type.available
+
+    def save(self, *args, **kwargs):
+        self.refresh_denormalized_fields()
+        # the rollups of the car move with its brand and type within the transaction of the save.
+        with transaction.atomic():
+            super(Car, self).save(*args, **kwargs)
+
+
+class CarBlackout(models.Model):
+    """Dates a :model:`cars.Car` is off the road, for servicing. Blackouts make the car
+    unavailable exactly like bookings, and can't overlap each other.
+    """
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name="blackouts")
+    start_date = models.DateField()
+    end_date = models.DateField()
+    reason = models.CharField(max_length=255, blank=True)
+    period = DateRangeField(editable=False)
+
+    class Meta:
+        constraints = [
+            ExclusionConstraint(
+                name=BLACKOUT_PERIOD_CONSTRAINT,
+                expressions=[
+                    ('car', RangeOperators.EQUAL),
+                    ('period', RangeOperators.OVERLAPS),
+                ],
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.id} - {self.car_id} ({self.start_date} - {self.end_date})"
+
+    def save(self, *args, **kwargs):
+        self.period = booking_period(self.start_date, self.end_date)
+        super(CarBlackout, self).save(*args, **kwargs)
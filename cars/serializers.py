@@ -1,6 +1,9 @@
 from rest_framework import serializers
+from constants import CAR_BLACKOUT_NOT_AVAILABLE, INVALID_START_END_DATE
+from .availability import booked_periods
+from .cache import get_catalogue
 from .models import (
-    Type, Brand, Car
+    Type, Brand, Car, CarBlackout
 )
 
 
@@ -16,17 +19,64 @@ class BrandSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class CatalogueField(serializers.Field):
+    """Read only field rendering a brand or type from the catalogue cache,
+    instead of joining it to the query of the cars.
+    """
+
+    def __init__(self, catalogue, serializer_class, **kwargs):
+        self.catalogue = catalogue
+        self.serializer_class = serializer_class
+        kwargs['read_only'] = True
+        super(CatalogueField, self).__init__(**kwargs)
+
+    def to_representation(self, value):
+        data = get_catalogue()[self.catalogue].get(value)
+        if data is None:
+            # created after the catalogue was loaded, within the current transaction.
+            model = self.serializer_class.Meta.model
+            data = self.serializer_class(model.objects.get(pk=value)).data
+        return data
+
+
 class CarViewSerializer(serializers.ModelSerializer):
-    type = TypeSerializer()
-    brand = BrandSerializer()
+    type = CatalogueField('types', TypeSerializer, source='type_id')
+    brand = CatalogueField('brands', BrandSerializer, source='brand_id')
     
     class Meta:
         model = Car
-        fields = '__all__'
+        exclude = ['search_text', 'is_listable']
 
 
 class CarCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Car
-        fields = '__all__'
+        exclude = ['search_text', 'is_listable']
+
+
+class CarBlackoutSerializer(serializers.ModelSerializer):
+    """Validates that a blackout doesn't overlap the bookings, live holds or other blackouts of its car.
+    """
+
+    class Meta:
+        model = CarBlackout
+        exclude = ['period']
+        read_only_fields = ['car']
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date > end_date:
+            raise serializers.ValidationError({'message': INVALID_START_END_DATE})
+        car_id = self.instance.car_id if self.instance else self.context['car'].id
+        # the bookings, blackouts and live holds of the car, as for the car search and the checkout.
+        booked = list(booked_periods(start_date, end_date, car_id=car_id))
+        if self.instance is not None:
+            # the stored period of the blackout being updated doesn't conflict with itself.
+            own = (car_id, self.instance.start_date, self.instance.end_date)
+            if own in booked:
+                booked.remove(own)
+        if booked:
+            raise serializers.ValidationError({'message': CAR_BLACKOUT_NOT_AVAILABLE})
+        return attrs
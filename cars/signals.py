@@ -0,0 +1,96 @@
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Concat
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import BOOKINGS, CARS, CATALOGUE, bump_version
+from .models import Brand, Type, Car, CarBlackout
+
+
+def refresh_cars(cars):
+    """Rebuilds the `search_text` and `is_listable` fields of the given cars from their current
+    brand and type, in a single update query.
+    ----------
+    cars: queryset
+        Queryset of :model:`cars.Car`
+    """
+    brand = Brand.objects.filter(pk=OuterRef('brand_id'))
+    car_type = Type.objects.filter(pk=OuterRef('type_id'))
+    cars.update(
+        search_text=Concat(
+            'name',
+            Value(' '),
+            Subquery(brand.values('name')),
+            Value(' '),
+            Subquery(car_type.values('name')),
+            output_field=TextField(),
+        ),
+        is_listable=ExpressionWrapper(
+            Q(Exists(brand.filter(available=True)), Exists(car_type.filter(available=True)), available=True),
+            output_field=BooleanField(),
+        ),
+    )
+
+
+@receiver(post_save, sender=Brand)
+def update_brand_cars(sender, instance, created, **kwargs):
+    """Updates the search text and listable flag of the cars of a brand after it is saved.
+    ----------
+    instance: object
+        Instance of :model:`cars.Brand`
+    sender: :model:`cars.Brand`
+    """
+    if not created:
+        refresh_cars(Car.objects.filter(brand=instance))
+
+
+@receiver(post_save, sender=Type)
+def update_type_cars(sender, instance, created, **kwargs):
+    """Updates the search text and listable flag of the cars of a type after it is saved.
+    ----------
+    instance: object
+        Instance of :model:`cars.Type`
+    sender: :model:`cars.Type`
+    """
+    if not created:
+        refresh_cars(Car.objects.filter(type=instance))
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Type)
+@receiver(post_delete, sender=Type)
+def invalidate_catalogue(sender, instance, **kwargs):
+    """Bumps the catalogue version after a brand or type is saved or deleted,
+    so that every worker reloads its cached catalogue.
+    ----------
+    instance: object
+        Instance of :model:`cars.Brand` or :model:`cars.Type`
+    sender: :model:`cars.Brand` or :model:`cars.Type`
+    """
+    bump_version(CATALOGUE)
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def invalidate_cars(sender, instance, **kwargs):
+    """Bumps the cars version after a car is saved or deleted,
+    which changes the ETags of the car endpoints.
+    ----------
+    instance: object
+        Instance of :model:`cars.Car`
+    sender: :model:`cars.Car`
+    """
+    bump_version(CARS)
+
+
+@receiver(post_save, sender=CarBlackout)
+@receiver(post_delete, sender=CarBlackout)
+def invalidate_blackouts(sender, instance, **kwargs):
+    """Bumps the bookings version after a blackout is saved or deleted,
+    as blackouts change the availability of the cars like bookings.
+    ----------
+    instance: object
+        Instance of :model:`cars.CarBlackout`
+    sender: :model:`cars.CarBlackout`
+    """
+    bump_version(BOOKINGS)
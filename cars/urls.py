@@ -6,6 +6,14 @@ from .views import (
     BrandRetrieveUpdateDestroyAPIView,
     ListCreateCarAPIView,
     CarRetrieveUpdateDestroyAPIView,
+    CarAvailabilityView,
+    FleetAvailabilityView,
+    ImportCarsView,
+    CarFacetsView,
+    CarFreeWindowsView,
+    FlexibleCarSearchView,
+    ListCreateCarBlackoutAPIView,
+    CarBlackoutRetrieveUpdateDestroyAPIView,
 )
 
 urlpatterns = [
@@ -17,4 +25,15 @@ urlpatterns = [
 
     path('list_create_car/', ListCreateCarAPIView.as_view(), name='list-create-car'),
     path('<int:pk>/car_detail/', CarRetrieveUpdateDestroyAPIView.as_view(), name='car-detail'),
+    path('facets/', CarFacetsView.as_view(), name='car-facets'),
+    path('flexible-search/', FlexibleCarSearchView.as_view(), name='car-flexible-search'),
+
+    path('<int:pk>/availability/', CarAvailabilityView.as_view(), name='car-availability'),
+    path('availability/', FleetAvailabilityView.as_view(), name='fleet-availability'),
+    path('<int:pk>/free-windows/', CarFreeWindowsView.as_view(), name='car-free-windows'),
+
+    path('<int:pk>/blackouts/', ListCreateCarBlackoutAPIView.as_view(), name='list-create-car-blackout'),
+    path('blackouts/<int:pk>/', CarBlackoutRetrieveUpdateDestroyAPIView.as_view(), name='car-blackout-detail'),
+
+    path('import/', ImportCarsView.as_view(), name='import-cars'),
 ]
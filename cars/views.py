@@ -1,34 +1,77 @@
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
-from orders.models import Order
+from rest_framework.generics import (
+    GenericAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView, get_object_or_404
+)
+from rest_framework.views import APIView
+from core.pagination import OptionalCursorPagination
+from orders.models import ACTIVE, Order
 from .permissions import (
     IsAdminOrReadOnly
 )
+from .availability import (
+    MAX_CALENDAR_DAYS,
+    MAX_FREE_WINDOWS,
+    availability_calendar,
+    earliest_start_dates,
+    exclude_booked_cars,
+    free_windows,
+)
+from .cache import BOOKINGS, CARS, CATALOGUE, get_catalogue, get_version, versions_etag
+from .facets import car_facets
+from .importers import CSV, NDJSON, decode_lines, import_cars, read_rows
 from .filters import CarFilter
 from .models import (
-    Type, Brand, Car
+    Type, Brand, Car, CarBlackout
 )
 from .serializers import (
     TypeSerializer,
     BrandSerializer,
     CarViewSerializer,
-    CarCreateSerializer
+    CarCreateSerializer,
+    CarBlackoutSerializer,
 )
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from urllib.parse import urlencode
+from django.core.cache import cache
 from rest_framework import status
-from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from constants import (
     DELETE_BRAND_EXISTING_BOOKINGS,
     DELETE_CAR_EXISTING_BOOKINGS,
     DELETE_SUCCESS,
     DELETE_TYPE_EXISTING_BOOKINGS,
+    INVALID_BOOKING_DAYS,
+    INVALID_CAR_IDS,
+    INVALID_DATE_FORMAT,
+    INVALID_DATE_RANGE_LENGTH,
+    INVALID_IMPORT_FORMAT,
+    INVALID_REQUEST,
+    INVALID_SEARCH_PAGINATION,
     INVALID_START_DATE,
     INVALID_START_END_DATE,
+    PROVIDE_START_END_DATE,
     UPDATE_SUCCESS,
 )
 
 
+def car_list_etag(request, *args, **kwargs):
+    """ETag of the car list, it changes with the cars, brands and types,
+    and with the bookings when the list is searched for dates.
+    """
+    namespaces = [CARS, CATALOGUE]
+    if 'start_date' in request.GET or 'end_date' in request.GET:
+        namespaces.append(BOOKINGS)
+    return versions_etag(request, namespaces)
+
+
+def car_detail_etag(request, *args, **kwargs):
+    """ETag of the car detail, it changes with the cars, brands and types.
+    """
+    return versions_etag(request, [CARS, CATALOGUE])
+
+
 class ListCreateTypeAPIView(ListCreateAPIView):
     """List all available car types and create new :model:`cars.Type`.
     """
@@ -46,6 +89,29 @@ class ListCreateTypeAPIView(ListCreateAPIView):
     """List of permissions that should be used for granting or denial of request.
     """
 
+    def list(self, request, *args, **kwargs):
+        """Lists the types from the catalogue cache, without querying the database.
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        types = list(get_catalogue()['types'].values())
+        page = self.paginate_queryset(types)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(types)
+
 
 class TypeRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
     """Retrieve, Update and Delete :model:`types`
@@ -105,7 +171,7 @@ class TypeRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         Response: objects
             Renders to content type as requested by the client.
         """
-        if Order.objects.filter(returned=False, car__type=kwargs['pk']).exists():
+        if Order.objects.filter(status=ACTIVE, car__type=kwargs['pk']).exists():
             return Response(
                 {"status": "OK", "message": DELETE_TYPE_EXISTING_BOOKINGS},
                 status=status.HTTP_400_BAD_REQUEST
@@ -134,6 +200,29 @@ class ListCreateBrandAPIView(ListCreateAPIView):
     """List of permissions that should be used for granting or denial of request.
     """
 
+    def list(self, request, *args, **kwargs):
+        """Lists the brands from the catalogue cache, without querying the database.
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        brands = list(get_catalogue()['brands'].values())
+        page = self.paginate_queryset(brands)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(brands)
+
 
 class BrandRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
     """Retrieve, Update and Delete :model:`cars.Brands`
@@ -193,7 +282,7 @@ class BrandRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         Response: objects
             Renders to content type as requested by the client.
         """
-        if Order.objects.filter(returned=False, car__brand=kwargs['pk']).exists():
+        if Order.objects.filter(status=ACTIVE, car__brand=kwargs['pk']).exists():
             return Response(
                 {"status": "OK", "message": DELETE_BRAND_EXISTING_BOOKINGS},
                 status=status.HTTP_400_BAD_REQUEST
@@ -205,33 +294,26 @@ class BrandRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         )
 
 
-class ListCreateCarAPIView(ListCreateAPIView):
-    """List all available cars with filter and create new cars
+class CarSearchMixin:
+    """Searches the listable :model:`cars.Car` with the `CarFilter` filters,
+    and with the `start_date` and `end_date` parameters for the available cars.
     """
-    queryset = Car.objects.all()
-    permission_classes = [IsAdminOrReadOnly]
-    filterset_class = CarFilter
 
-    def get_serializer_class(self):
-        """Return the class to use for the serializer.
-        returns
-        -------
-        serializer: for :model:`Car`
-        """
-        if self.request.method == "GET":
-            return CarViewSerializer
-        return CarCreateSerializer
+    filterset_class = CarFilter
+    """Filterset class used by the filter backend.
+    """
 
     def get_queryset(self):
         """Return queryset that should be used for returning objects from this view.
-        if start date and end date are provided in GET parameters, then check for overlapping orders and
-        exclude those order cars from the list of car.
+        if start date and end date are provided in GET parameters, then the cars booked for
+        those dates are excluded using the booked period index.
         returns
         -------
         queryset: for :model:`Car`
         """
         start_date = self.request.GET.get('start_date')
         end_date = self.request.GET.get('end_date')
+        queryset = Car.objects.filter(is_listable=True).order_by('id')
 
         #validating the dates of users request.
         if start_date is not None and end_date is not None:
@@ -245,31 +327,168 @@ class ListCreateCarAPIView(ListCreateAPIView):
                 raise ValidationError({
                     'message': INVALID_START_DATE
                 })
-            #getting the overlapping cars from the given dates.
-            overlapping_cars_id = Order.objects.filter(
-                                                        cancelled=False,
-                                                        start_date__lte=end_date,
-                                                        end_date__gte=start_date
-                                                    ).values('car')
-
-            #removing the overlapping cars from the list.
-            queryset = Car.objects.exclude(
-                Q(id__in=overlapping_cars_id) |
-                Q(available=False) |
-                Q(brand__available=False) |
-                Q(type__available=False)
-            ).order_by('id')
-        else:
-            queryset = Car.objects.exclude(
-                Q(available=False) |
-                Q(brand__available=False) |
-                Q(type__available=False)
-            ).order_by('id')
+            #removing the cars booked for the given dates from the list.
+            queryset = exclude_booked_cars(queryset, start_date, end_date)
         return queryset
 
 
+@method_decorator(condition(etag_func=car_list_etag), name='get')
+class ListCreateCarAPIView(CarSearchMixin, ListCreateAPIView):
+    """List all available cars with filter and create new cars.
+    Responds with 304 Not Modified, before querying the cars, when the `If-None-Match`
+    header matches the current ETag.
+    """
+    queryset = Car.objects.all()
+    permission_classes = [IsAdminOrReadOnly]
+    pagination_class = OptionalCursorPagination
+
+    def paginate_queryset(self, queryset):
+        """Rejects the keyset mode for a fuzzy search, its pages follow the car id
+        which would drop the ranking of the results.
+        """
+        if self.request.query_params.get('search') and self.paginator.use_cursor(self.request):
+            raise ValidationError({'message': INVALID_SEARCH_PAGINATION})
+        return super(ListCreateCarAPIView, self).paginate_queryset(queryset)
+
+    def get_serializer_class(self):
+        """Return the class to use for the serializer.
+        returns
+        -------
+        serializer: for :model:`Car`
+        """
+        if self.request.method == "GET":
+            return CarViewSerializer
+        return CarCreateSerializer
+
+
+@method_decorator(condition(etag_func=car_list_etag), name='get')
+class CarFacetsView(CarSearchMixin, GenericAPIView):
+    """Facet counts of the car search, by fuel type, transmission type, seats, brand, type
+    and price bucket. Takes the same filters and dates as the car list, and counts all the
+    facets with a single query.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    cache_timeout = 60
+    """Seconds the counts of a search are cached, None disables the cache.
+    """
+
+    def get_cache_key(self, request):
+        """Return the cache key of the counts, made of the non empty search parameters sorted
+        by name and of the versions of the data the counts depend on.
+        """
+        search_params = set(self.filterset_class.base_filters) | {'start_date', 'end_date'}
+        params = sorted(
+            (name, value.strip())
+            for name, value in request.GET.items()
+            if name in search_params and value.strip()
+        )
+        namespaces = [CARS, CATALOGUE]
+        if 'start_date' in request.GET or 'end_date' in request.GET:
+            namespaces.append(BOOKINGS)
+        versions = ':'.join(str(get_version(namespace)) for namespace in namespaces)
+        return f"facets:{versions}:{urlencode(params)}"
+
+    def get(self, request, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        key = self.get_cache_key(request)
+        facets = cache.get(key) if self.cache_timeout else None
+        if facets is None:
+            facets = car_facets(self.filter_queryset(self.get_queryset()))
+            if self.cache_timeout:
+                cache.set(key, facets, timeout=self.cache_timeout)
+        return Response(facets, status=status.HTTP_200_OK)
+
+
+class FlexibleCarSearchView(CarSearchMixin, GenericAPIView):
+    """Search of the cars available for a number of days anywhere within the `from` and `to`
+    dates, given by the `days` parameter. Takes the same filters as the car list, and returns
+    every car with its earliest start date, the earliest first.
+    The start dates are computed for the first `max_candidates` filtered cars, by id, only.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    serializer_class = CarViewSerializer
+    """The serializer class that should be used for serializing output.
+    """
+
+    max_candidates = 500
+    """Maximum number of cars the start dates are computed for, as all of them are computed
+    before sorting and paginating.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        start_date, end_date = calendar_dates(request)
+        if start_date < date.today():
+            raise ValidationError({'message': INVALID_START_DATE})
+        try:
+            days = int(request.GET.get('days', ''))
+        except ValueError:
+            raise ValidationError({'message': INVALID_BOOKING_DAYS})
+        if not 0 < days <= (end_date - start_date).days + 1:
+            raise ValidationError({'message': INVALID_BOOKING_DAYS})
+
+        # the filtered cars are matched by a subquery, not a list of ids sent back to the database.
+        car_ids = self.filter_queryset(self.get_queryset()).order_by('id').values_list('id', flat=True)
+        car_ids = car_ids[:self.max_candidates]
+        start_dates = earliest_start_dates(car_ids, start_date, end_date, days)
+        results = sorted(start_dates.items(), key=lambda item: (item[1], item[0]))
+        page = self.paginate_queryset(results)
+        if page is not None:
+            results = page
+        #the cars deleted or made unlisted since their start dates were computed are skipped.
+        cars = Car.objects.filter(is_listable=True).in_bulk([car_id for car_id, _ in results])
+        data = [
+            {**self.get_serializer(cars[car_id]).data, 'earliest_start_date': start}
+            for car_id, start in results if car_id in cars
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+@method_decorator(condition(etag_func=car_detail_etag), name='get')
 class CarRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
-    """Retrieve, Update and Delete for :model:`Car`
+    """Retrieve, Update and Delete for :model:`Car`.
+    Responds with 304 Not Modified, before querying the car, when the `If-None-Match`
+    header matches the current ETag.
     """
     queryset = Car.objects.all()
     serializer_class = CarCreateSerializer
@@ -326,7 +545,7 @@ class CarRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         Response: objects
             Renders to content type as requested by the client.
         """
-        if Order.objects.filter(returned=False, car=kwargs['pk']).exists():
+        if Order.objects.filter(status=ACTIVE, car=kwargs['pk']).exists():
             return Response(
                 {"status": "OK", "message": DELETE_CAR_EXISTING_BOOKINGS},
                 status=status.HTTP_400_BAD_REQUEST
@@ -336,3 +555,276 @@ class CarRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
             {"status": "OK", "message": DELETE_SUCCESS},
             status=response.status_code
         )
+
+
+class ListCreateCarBlackoutAPIView(ListCreateAPIView):
+    """List and create the :model:`cars.CarBlackout` of a car.
+    """
+
+    serializer_class = CarBlackoutSerializer
+    """The serializer class that should be used for validating and deserializing input,
+    and for serializing output.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def get_car(self):
+        return get_object_or_404(Car, id=self.kwargs['pk'])
+
+    def get_queryset(self):
+        """Return the blackouts of the car, the latest first.
+        returns
+        -------
+        queryset: for :model:`cars.CarBlackout`
+        """
+        return CarBlackout.objects.filter(car=self.get_car()).order_by('-start_date', '-id')
+
+    def get_serializer_context(self):
+        context = super(ListCreateCarBlackoutAPIView, self).get_serializer_context()
+        if self.request.method == "POST":
+            context['car'] = self.get_car()
+        return context
+
+    def perform_create(self, serializer):
+        serializer.save(car=serializer.context['car'])
+
+
+class CarBlackoutRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
+    """Retrieve, Update and Delete :model:`cars.CarBlackout`.
+    """
+
+    queryset = CarBlackout.objects.all()
+    """The queryset that should be used for returning objects from this view.
+    """
+
+    serializer_class = CarBlackoutSerializer
+    """The serializer class that should be used for validating and deserializing input,
+    and for serializing output.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+
+def calendar_dates(request, start_param='from', end_param='to'):
+    """Return the validated `from` and `to` dates of an availability calendar request.
+
+    Parameters
+    ----------
+    request: HttpRequest object
+        Contains data about the request.
+    start_param: string
+        Query parameter of the first date.
+    end_param: string
+        Query parameter of the last date.
+
+    Returns
+    -------
+    dates: tuple
+        (from date, to date)
+    """
+    start_date = request.GET.get(start_param)
+    end_date = request.GET.get(end_param)
+    if start_date is None or end_date is None:
+        raise ValidationError({'message': PROVIDE_START_END_DATE})
+    try:
+        start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValidationError({'message': INVALID_DATE_FORMAT})
+    if start_date > end_date:
+        raise ValidationError({'message': INVALID_START_END_DATE})
+    elif end_date - start_date >= timedelta(days=MAX_CALENDAR_DAYS):
+        raise ValidationError({'message': INVALID_DATE_RANGE_LENGTH})
+    return start_date, end_date
+
+
+class CarAvailabilityView(APIView):
+    """Availability calendar of a :model:`cars.Car`, between the `from` and `to` dates.
+    Returns the booked and free intervals and the booked status of every day.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        pk: (int)
+            Id of the :model:`cars.Car`.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        start_date, end_date = calendar_dates(request)
+        car = get_object_or_404(Car, id=pk)
+        calendar = availability_calendar([car.id], start_date, end_date)[0]
+        return Response(
+            {'from': start_date, 'to': end_date, **calendar},
+            status=status.HTTP_200_OK
+        )
+
+
+class CarFreeWindowsView(APIView):
+    """Free windows of a :model:`cars.Car` nearest to the `start_date` and `end_date` parameters,
+    each as long as the requested period. The number of windows is given by the `count` parameter.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    max_count = 10
+    """Maximum number of windows of a request.
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        pk: (int)
+            Id of the :model:`cars.Car`.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        start_date, end_date = calendar_dates(request, 'start_date', 'end_date')
+        try:
+            count = min(max(int(request.GET.get('count', MAX_FREE_WINDOWS)), 1), self.max_count)
+        except ValueError:
+            raise ValidationError({'message': INVALID_REQUEST})
+        car = get_object_or_404(Car, id=pk)
+        return Response(
+            {'car': car.id, 'results': free_windows(car.id, start_date, end_date, count)},
+            status=status.HTTP_200_OK
+        )
+
+
+class FleetAvailabilityView(APIView):
+    """Availability calendars of many :model:`cars.Car` in one request.
+    The cars are given as comma separated ids in the `ids` parameter, all the calendars are
+    computed from a single query.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    max_cars = 500
+    """Maximum number of cars of a request.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        start_date, end_date = calendar_dates(request)
+        try:
+            car_ids = sorted({int(car_id) for car_id in request.GET.get('ids', '').split(',') if car_id})
+        except ValueError:
+            raise ValidationError({'message': INVALID_CAR_IDS})
+        if not 0 < len(car_ids) <= self.max_cars:
+            raise ValidationError({'message': INVALID_CAR_IDS})
+        car_ids = list(Car.objects.filter(id__in=car_ids).order_by('id').values_list('id', flat=True))
+        return Response(
+            {'from': start_date, 'to': end_date, 'results': availability_calendar(car_ids, start_date, end_date)},
+            status=status.HTTP_200_OK
+        )
+
+
+class ImportCarsView(APIView):
+    """Bulk import of :model:`cars.Car` from a CSV or NDJSON request body.
+    The body is read as a stream and imported in batches, the brand and type of a row are
+    given by name. Invalid rows are skipped and reported with their row number, a body which
+    can't be read further, not UTF-8 or malformed CSV, ends the import with a 400 response.
+    """
+
+    permission_classes = [IsAdminOrReadOnly]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    formats = {
+        'text/csv': CSV,
+        'application/x-ndjson': NDJSON,
+        'application/ndjson': NDJSON,
+    }
+    """Import format of the accepted content types.
+    """
+
+    batch_size = 500
+    """Number of rows validated and inserted at once.
+    """
+
+    max_reported_errors = 1000
+    """Maximum number of invalid rows reported in the response.
+    """
+
+    def post(self, request, *args, **kwargs):
+        """Accepts post requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        format = self.formats.get(request.content_type.split(';')[0].strip())
+        if format is None:
+            raise ValidationError({'message': INVALID_IMPORT_FORMAT})
+        errors = []
+
+        def report(row, row_errors):
+            if len(errors) < self.max_reported_errors:
+                errors.append({'row': row, 'errors': row_errors})
+
+        lines = decode_lines(request.stream or [])
+        result = import_cars(read_rows(lines, format), batch_size=self.batch_size, on_error=report)
+        created = result['created'] and not result['truncated']
+        return Response(
+            {**result, 'errors': errors},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
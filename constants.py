@@ -15,9 +15,23 @@ INVALID_START_DATE = "Invalid request, start date should be today or later."
 
 CAR_BOOKING_NOT_AVAILABLE = "Car booking not available for given dates."
 ORDER_ALREADY_CANCELLED = "Invalid request, order is already canceled."
-ORDER_CANCEL_FAILED = "Sorry the cancel request could not be processed."
 LATE_ORDER_CANCEL = "Order cannot be canceled after the booking date."
 ORDER_CANCEL_SUCCESS = "Order canceled successfully."
 INVALID_REQUEST = "Invalid request."
 CAR_RETURN_SUCCESS = "Car return successfully."
-PROVIDE_START_END_DATE = "Start date and End date are mandatory."
\ No newline at end of file
+ORDER_NOT_FOUND = "Order not found."
+INVALID_ORDER_STATUS = "Invalid request, the order can't be moved to this status."
+PROVIDE_START_END_DATE = "Start date and End date are mandatory."
+INVALID_DATE_FORMAT = "Invalid date, dates should be in YYYY-MM-DD format."
+INVALID_DATE_RANGE_LENGTH = "Invalid request, the date range can't be longer than 366 days."
+INVALID_CAR_IDS = "Invalid request, provide between 1 and 500 comma separated car ids."
+INVALID_IMPORT_FORMAT = "Invalid request, the content type should be text/csv or application/x-ndjson."
+INVALID_BOOKING_DAYS = "Invalid request, days should be a number between 1 and the length of the date range."
+INVALID_EXPORT_FORMAT = "Invalid request, the export type should be csv or ndjson."
+INVALID_INVOICE_FORMAT = "Invalid request, the invoice type should be html or pdf."
+CAR_BLACKOUT_NOT_AVAILABLE = "Car is already booked or blacked out for given dates."
+NO_CAR_AVAILABLE = "No car matching the request is available for given dates."
+INVALID_GROUP_CARS = "Invalid request, provide between 1 and 10 distinct listable car ids."
+INVALID_ROLLUP_GROUP = "Invalid request, group_by should be car, brand or type."
+INVALID_ROLLUP_PERIOD = "Invalid request, period should be day or month."
+INVALID_SEARCH_PAGINATION = "Invalid request, a search can't be paginated with a cursor, its results are ranked."
@@ -0,0 +1,60 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key.
+    Pages are fetched with ``WHERE id > <cursor>`` so that deep pages cost the same
+    as the first one, and no ``COUNT(*)`` query is made.
+    """
+
+    ordering = 'id'
+    """Field used as the key of the pages, must be unique and indexed.
+    """
+
+
+class OptionalCursorPagination(LimitOffsetPagination):
+    """Limit offset pagination with an opt-in keyset mode.
+
+    Clients opt into the keyset mode by sending ``?pagination=cursor``, the
+    ``next`` and ``previous`` links returned in that mode carry an opaque
+    ``cursor`` parameter which keeps the mode.
+    """
+
+    mode_query_param = 'pagination'
+    """Query parameter used to select the pagination mode.
+    """
+
+    cursor_pagination_class = IdCursorPagination
+    """Pagination class used for the keyset mode.
+    """
+
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        """Return True if the request asks for the keyset mode.
+        """
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor' or
+            self.cursor_pagination_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super(OptionalCursorPagination, self).paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super(OptionalCursorPagination, self).get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response_schema(schema)
+        return super(OptionalCursorPagination, self).get_paginated_response_schema(schema)
+
+    def get_html_context(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super(OptionalCursorPagination, self).get_html_context()
@@ -0,0 +1,91 @@
+"""Minimal in-memory PDF writer for plain text documents.
+
+The documents are small, like invoices, and are built from the lines of text
+held in memory. The objects are written one after the other, keeping their
+offsets for the cross-reference table, so no document model is built. Text is
+set in the standard Helvetica font, which needs no embedding, on A4 pages.
+"""
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 11
+LEADING = 14
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+
+def escape(text):
+    """Return the text as the bytes of a PDF literal string.
+    Characters outside latin-1 are replaced, the standard fonts have no other glyphs.
+    """
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', 'replace')
+
+
+def page_content(lines):
+    """Return the content stream drawing the lines from the top of a page.
+    """
+    content = [b"BT /F1 %d Tf %d TL %d %d Td" % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN)]
+    for i, line in enumerate(lines):
+        content.append(b"%s(%s) Tj" % (b"T* " if i else b"", escape(line)))
+    content.append(b"ET")
+    return b"\n".join(content)
+
+
+def iter_text_pdf(lines, title=''):
+    """Yield the bytes of a PDF document with the lines of text, a chunk per object.
+
+    Parameters
+    ----------
+    lines: list
+        Lines of text, without line breaks.
+    title: string
+        Title of the document.
+
+    Yields
+    ------
+    chunk: bytes
+    """
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    # objects 1 to 4 are the catalog, the page tree, the font and the info, then a page
+    # and its content stream for every page.
+    page_ids = [5 + 2 * i for i in range(len(pages))]
+    offsets = []
+    position = 0
+
+    def write(chunk):
+        nonlocal position
+        position += len(chunk)
+        return chunk
+
+    def write_object(body):
+        offsets.append(position)
+        return write(b"%d 0 obj\n%s\nendobj\n" % (len(offsets), body))
+
+    yield write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    yield write_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield write_object(
+        b"<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(pages))
+    )
+    yield write_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    yield write_object(b"<< /Title (%s) /Producer (Car Rental System) >>" % escape(title))
+    for page_id, page in zip(page_ids, pages):
+        yield write_object(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >>"
+            b" /Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, page_id + 1)
+        )
+        content = page_content(page)
+        yield write_object(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+
+    xref = position
+    yield b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)
+    yield b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    yield b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref)
+
+
+def text_pdf(lines, title=''):
+    """Return the bytes of a PDF document with the lines of text, see `iter_text_pdf`.
+    The whole document is held in memory, to be cached or attached to an email.
+    """
+    return b"".join(iter_text_pdf(lines, title))
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'phonenumber_field',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -58,6 +59,8 @@ INSTALLED_APPS = [
     'cars.apps.CarsConfig',
     'orders.apps.OrdersConfig',
     'payments.apps.PaymentsConfig',
+    'notifications.apps.NotificationsConfig',
+    'analytics.apps.AnalyticsConfig',
 ]
 
 MIDDLEWARE = [
@@ -111,6 +114,23 @@ DATABASES = {
 db_from_env = dj_database_url.config()
 DATABASES['default'].update(db_from_env)
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# The catalogue cache is shared by the workers through this cache, so a shared
+# backend should be used whenever more than one worker process is running.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
+    }
+
 # Rest Framework settings
 
 REST_FRAMEWORK = {
@@ -191,6 +211,9 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASSWORD')
 EMAIL_PORT = 587
 
+# Attach a PDF copy to the invoice emails
+INVOICE_PDF_ATTACHMENT = os.environ.get('INVOICE_PDF_ATTACHMENT') == 'True'
+
 # Stripe Credentials
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
@@ -14,5 +14,8 @@ urlpatterns = [
     path('orders/', include('orders.urls')),
 
     # Payment Urls
-    path('payments/', include('payments.urls'))
+    path('payments/', include('payments.urls')),
+
+    # Analytics Urls
+    path('analytics/', include('analytics.urls')),
 ]
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.outbox import MAX_ATTEMPTS, send_batch
+
+
+class Command(BaseCommand):
+    """Sends the queued emails of :model:`notifications.OutboxEmail`.
+
+    The outbox is drained in batches, each batch over a single connection to
+    the mail server. With `--loop` the worker keeps polling the outbox.
+    """
+
+    help = "Sends the emails of the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of emails sent per connection.")
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help="Attempts before giving up an email.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between two polls of an empty outbox.")
+
+    def handle(self, *args, **options):
+        while True:
+            result = send_batch(options['batch_size'], options['max_attempts'])
+            if result['sent'] or result['failed']:
+                self.stdout.write(f"Sent {result['sent']} emails, {result['failed']} failed.")
+            if result['sent'] + result['failed'] < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
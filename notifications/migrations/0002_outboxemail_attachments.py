@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='attachments',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class OutboxEmail(models.Model):
+    """Email queued for sending by the `send_outbox` worker.
+    Emails are written in the transaction of the change they notify about, so they are only
+    sent if it commits, and the request doesn't wait for the mail server.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html = models.BooleanField(default=False)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    attachments = models.JSONField(default=list, blank=True)
+    """Attached files, as dicts of filename, base64 content and mimetype.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=Q(sent_at__isnull=True), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} - {self.subject}"
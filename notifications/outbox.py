@@ -0,0 +1,123 @@
+"""Transactional email outbox.
+
+`queue_email` stores the email in :model:`notifications.OutboxEmail`, within the
+current transaction. The `send_outbox` management command drains the outbox in
+batches, over one connection to the mail server per batch, and retries the
+failed emails with an exponential backoff.
+"""
+
+import base64
+from datetime import timedelta
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxEmail
+
+MAX_ATTEMPTS = 8
+"""Number of attempts after which an email is given up.
+"""
+
+RETRY_DELAY = timedelta(seconds=30)
+"""Delay before the first retry of a failed email, doubled after every attempt.
+"""
+
+MAX_RETRY_DELAY = timedelta(hours=1)
+"""Maximum delay between two attempts.
+"""
+
+
+def queue_email(subject, body, to, from_email='', html=False, attachments=()):
+    """Queues an email in the outbox.
+
+    Parameters
+    ----------
+    subject: string
+        Subject of the email.
+    body: string
+        Body of the email.
+    to: list
+        Email addresses of the recipients.
+    from_email: string
+        Sender address, `DEFAULT_FROM_EMAIL` if empty.
+    html: bool
+        True if the body is html.
+    attachments: list
+        (filename, content, mimetype) tuples of the attached files, content in bytes.
+
+    Returns
+    -------
+    email: :model:`notifications.OutboxEmail` object
+    """
+    return OutboxEmail.objects.create(
+        subject=subject, body=body, to=list(to), from_email=from_email or '', html=html,
+        attachments=[
+            {'filename': filename, 'content': base64.b64encode(content).decode(), 'mimetype': mimetype}
+            for filename, content, mimetype in attachments
+        ]
+    )
+
+
+def retry_delay(attempts):
+    """Return the delay before the next attempt of an email which failed `attempts` times.
+    """
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def send_batch(batch_size=100, max_attempts=MAX_ATTEMPTS):
+    """Sends a batch of the due emails of the outbox over a single connection.
+    The emails are locked while they are sent, and the emails locked by other workers are skipped.
+
+    Parameters
+    ----------
+    batch_size: int
+        Maximum number of emails sent.
+    max_attempts: int
+        Number of attempts after which an email is given up.
+
+    Returns
+    -------
+    result: dict
+        -sent: (int) number of emails sent
+        -failed: (int) number of emails which failed
+    """
+    result = {'sent': 0, 'failed': 0}
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+                sent_at__isnull=True, attempts__lt=max_attempts, next_attempt_at__lte=timezone.now()
+            ).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not emails:
+            return result
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            connection, error = None, e
+        for email in emails:
+            try:
+                if connection is None:
+                    raise error
+                message = EmailMessage(
+                    email.subject, email.body, email.from_email or None, email.to, connection=connection
+                )
+                if email.html:
+                    message.content_subtype = "html"
+                for attachment in email.attachments:
+                    message.attach(
+                        attachment['filename'], base64.b64decode(attachment['content']), attachment['mimetype']
+                    )
+                message.send()
+            except Exception as e:
+                email.attempts += 1
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                email.last_error = str(e)
+                result['failed'] += 1
+            else:
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                result['sent'] += 1
+        if connection is not None:
+            connection.close()
+        OutboxEmail.objects.bulk_update(emails, ['attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return result
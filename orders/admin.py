@@ -1,4 +1,6 @@
 from django.contrib import admin
-from .models import Order
+from .models import BookingHold, Order, OrderRefund
 
 admin.site.register(Order)
+admin.site.register(BookingHold)
+admin.site.register(OrderRefund)
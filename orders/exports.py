@@ -0,0 +1,125 @@
+"""Streaming exports of :model:`orders.Order` as CSV or NDJSON.
+
+The rows are read through a server-side cursor, `QuerySet.iterator`, and
+written to the response as they are read, a chunk of rows at a time. So the
+memory used by an export stays the same whatever the number of rows.
+"""
+
+import csv
+import json
+from datetime import datetime
+from io import StringIO
+from itertools import islice
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from cars.importers import CSV, FORMATS, NDJSON
+from constants import INVALID_DATE_FORMAT, INVALID_EXPORT_FORMAT, INVALID_START_END_DATE, PROVIDE_START_END_DATE
+
+EXPORT_FIELDS = (
+    'id', 'car_id', 'user_id', 'start_date', 'end_date', 'order_date', 'price', 'discount',
+    'fine_amount', 'accrued_fine', 'status', 'payment_intent_id',
+)
+"""Columns of the exported orders.
+"""
+
+CHUNK_SIZE = 2000
+"""Number of rows fetched from the cursor, and written to the response, at once.
+"""
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    NDJSON: 'application/x-ndjson',
+}
+
+
+def export_format(request):
+    """Return the validated format of an export request, `?type=csv` by default.
+    """
+    format = request.query_params.get('type', CSV)
+    if format not in FORMATS:
+        raise ValidationError({'message': INVALID_EXPORT_FORMAT})
+    return format
+
+
+def export_dates(request):
+    """Return the validated `from` and `to` order dates of an export request.
+
+    Returns
+    -------
+    dates: tuple
+        (from date, to date)
+    """
+    start_date = request.query_params.get('from')
+    end_date = request.query_params.get('to')
+    if start_date is None or end_date is None:
+        raise ValidationError({'message': PROVIDE_START_END_DATE})
+    try:
+        start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValidationError({'message': INVALID_DATE_FORMAT})
+    if start_date > end_date:
+        raise ValidationError({'message': INVALID_START_END_DATE})
+    return start_date, end_date
+
+
+def format_rows(rows, format):
+    """Return the rows formatted as CSV or NDJSON lines.
+    """
+    if format == NDJSON:
+        return ''.join(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n' for row in rows
+        )
+    buffer = StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def export_chunks(queryset, format, chunk_size=CHUNK_SIZE):
+    """Yield the orders of the queryset as CSV or NDJSON text, a chunk of rows at a time.
+    A CSV export starts with a header line.
+
+    Parameters
+    ----------
+    queryset: queryset
+        Queryset of :model:`orders.Order`, ordered.
+    format: string
+        `csv` or `ndjson`.
+    chunk_size: int
+        Number of rows per chunk.
+
+    Yields
+    ------
+    chunk: string
+    """
+    if format == CSV:
+        yield format_rows([EXPORT_FIELDS], CSV)
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield format_rows(chunk, format)
+
+
+def export_response(queryset, format, filename):
+    """Return a streaming response exporting the orders of the queryset.
+
+    Parameters
+    ----------
+    queryset: queryset
+        Queryset of :model:`orders.Order`, ordered.
+    format: string
+        `csv` or `ndjson`.
+    filename: string
+        Name of the exported file, without extension.
+
+    Returns
+    -------
+    response: StreamingHttpResponse object
+    """
+    response = StreamingHttpResponse(export_chunks(queryset, format), content_type=CONTENT_TYPES[format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{format}"'
+    return response
+
@@ -0,0 +1,148 @@
+"""Late return fines of :model:`orders.Order`.
+
+The fine of a late return grows every day: the price of the car is charged for
+every day late, plus a percentage of the price increasing by `FINE_PERCENT_PER_DAY`
+each day. If the percentage is 5% per day then, for 3 days, the total is
+5 + 10 + 15 = 30%, so for a car priced 3000 the fine is 3000*3 + (3000*30)//100 = 9900.
+
+Fines are computed in integer cents with the same formula for a single order and
+for numpy arrays of orders, so the nightly accrual of the unreturned orders matches
+the fine charged at their return.
+"""
+
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from .models import ACTIVE, Order
+
+FINE_PERCENT_PER_DAY = 5
+"""Increase of the percentage fine for every day late.
+"""
+
+
+def fine_cents(price_cents, days):
+    """Return the fine in cents of a car returned some days late.
+    Works element-wise on numpy integer arrays as well as on ints.
+
+    Parameters
+    ----------
+    price_cents: int or array
+        Price per day of the car, in cents.
+    days: int or array
+        Days late, 0 or more.
+
+    Returns
+    -------
+    fine: int or array
+        Fine in cents, the percentage part rounded down to a whole amount.
+    """
+    percent = ((days + 1) * days) // 2 * FINE_PERCENT_PER_DAY
+    return days * price_cents + price_cents * percent // 10000 * 100
+
+
+def fine_amount(price, days):
+    """Return the fine of a car returned some days late.
+
+    Parameters
+    ----------
+    price: Decimal
+        Price per day of the car.
+    days: int
+        Days late.
+
+    Returns
+    -------
+    fine: Decimal
+    """
+    return Decimal(fine_cents(int(price * 100), days)) / 100
+
+
+def late_fines(prices, end_dates, today):
+    """Return the days late and the fines of a batch of orders returned today, computed at once.
+
+    Parameters
+    ----------
+    prices: list
+        Prices per day of the cars of the orders, as decimals.
+    end_dates: list
+        Last days of the orders.
+    today: date
+        Day the cars are returned.
+
+    Returns
+    -------
+    days: array
+        Days late of every order, 0 for the orders returned in time.
+    fines: array
+        Fines of every order, in cents.
+    """
+    days = (np.datetime64(today, 'D') - np.array(end_dates, dtype='datetime64[D]')).astype(np.int64)
+    days = np.maximum(days, 0)
+    price_cents = np.array([int(price * 100) for price in prices], dtype=np.int64)
+    return days, fine_cents(price_cents, days)
+
+
+def overdue_orders(today):
+    """Return the orders which should have been returned before today, and aren't.
+    """
+    return Order.objects.filter(status=ACTIVE, end_date__lt=today, car__isnull=False)
+
+
+def accrue_fines(today, top=10, batch_size=1000):
+    """Computes the fine accrued by every overdue order as of today and stores it in
+    `accrued_fine`. The overdue orders and the prices of their cars are loaded with a
+    single query, the fines computed in one vectorized pass, and only the changed fines
+    written back, with `bulk_update`.
+
+    Parameters
+    ----------
+    today: date
+        Day the fines are accrued for.
+    top: int
+        Number of the largest fines reported.
+    batch_size: int
+        Number of orders updated per query.
+
+    Returns
+    -------
+    report: dict
+        -orders: (int) number of overdue orders
+        -updated: (int) number of orders whose accrued fine changed
+        -total_fine: (Decimal) sum of the accrued fines
+        -average_days: (float) average days overdue
+        -max_days: (int) most days overdue
+        -top: (list) id, car, user, days overdue and accrued fine of the largest fines
+    """
+    rows = list(
+        overdue_orders(today).values_list('id', 'car_id', 'user_id', 'end_date', 'car__price', 'accrued_fine')
+    )
+    report = {
+        'orders': len(rows), 'updated': 0, 'total_fine': Decimal(0), 'average_days': 0.0, 'max_days': 0, 'top': []
+    }
+    if not rows:
+        return report
+    ids, car_ids, user_ids, end_dates, prices, accrued = zip(*rows)
+    days, fines = late_fines(prices, end_dates, today)
+    accrued_cents = np.array([int(fine * 100) for fine in accrued], dtype=np.int64)
+
+    changed = np.flatnonzero(fines != accrued_cents)
+    with transaction.atomic():
+        Order.objects.bulk_update(
+            [Order(id=ids[i], accrued_fine=Decimal(int(fines[i])) / 100) for i in changed],
+            ['accrued_fine'],
+            batch_size=batch_size
+        )
+    report.update({
+        'updated': len(changed),
+        'total_fine': Decimal(int(fines.sum())) / 100,
+        'average_days': float(days.mean()),
+        'max_days': int(days.max()),
+        'top': [
+            {
+                'id': ids[i], 'car': car_ids[i], 'user': user_ids[i],
+                'days': int(days[i]), 'accrued_fine': Decimal(int(fines[i])) / 100,
+            }
+            for i in np.argsort(-fines, kind='stable')[:top]
+        ],
+    })
+    return report
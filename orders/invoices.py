@@ -0,0 +1,101 @@
+"""Invoices of :model:`orders.Order`.
+
+The invoice templates are compiled once per process, and the rendered invoices
+are kept in the shared cache by order id, so resending or downloading an
+invoice doesn't render it again. Saving an order drops its cached invoices, and
+changing the name of a user bumps the invoice version of the user, which is part
+of the keys of the invoices of all their orders.
+"""
+
+from functools import lru_cache
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import get_template
+from cars.cache import bump_version, get_version
+from core.pdf import text_pdf
+
+HTML = 'html'
+PDF = 'pdf'
+FORMATS = (HTML, PDF)
+
+TEMPLATES = {
+    HTML: 'orders/invoice.html',
+    PDF: 'orders/invoice.txt',
+}
+"""Template of each invoice format, the PDF is written from the lines of a text template.
+"""
+
+INVOICE_TIMEOUT = 60 * 60 * 24 * 7
+"""Seconds a rendered invoice is kept in the cache.
+"""
+
+USER_FIELDS = ('first_name', 'last_name', 'email')
+"""Fields of :model:`accounts.User` the invoices of the user depend on.
+"""
+
+CONTENT_TYPES = {
+    HTML: 'text/html; charset=utf-8',
+    PDF: 'application/pdf',
+}
+
+
+@lru_cache(maxsize=None)
+def invoice_template(format):
+    """Return the compiled template of the invoice format, loaded once per process.
+    """
+    return get_template(TEMPLATES[format])
+
+
+def user_namespace(user_id):
+    """Return the version namespace of the invoices of the user.
+    """
+    return f"invoices:{user_id}"
+
+
+def invoice_key(order, format):
+    return f"invoice:{order.id}:{format}:{get_version(user_namespace(order.user_id))}"
+
+
+def invoice_filename(order):
+    return f"invoice-{order.id}.pdf"
+
+
+def render_invoice(order, format=HTML):
+    """Return the invoice of the order, from the cache or rendered.
+
+    Parameters
+    ----------
+    order: :model:`orders.Order` object
+        Order with its user, fetched with `select_related('user')`.
+    format: string
+        `html` or `pdf`.
+
+    Returns
+    -------
+    invoice: string for html, bytes for pdf
+    """
+    key = invoice_key(order, format)
+    invoice = cache.get(key)
+    if invoice is None:
+        content = invoice_template(format).render({'order': order, 'user': order.user})
+        if format == PDF:
+            invoice = text_pdf(content.splitlines(), title=f"Invoice {order.id}")
+        else:
+            invoice = content
+        cache.set(key, invoice, timeout=INVOICE_TIMEOUT)
+    return invoice
+
+
+def invalidate_invoice(order):
+    """Drop the cached invoices of the order, right away and again once the current transaction
+    commits, so that an invoice rendered by another worker before the commit is dropped too.
+    """
+    keys = [invoice_key(order, format) for format in FORMATS]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user_invoices(user_id):
+    """Drop the cached invoices of all the orders of the user, by bumping their version.
+    """
+    bump_version(user_namespace(user_id))
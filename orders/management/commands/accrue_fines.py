@@ -0,0 +1,34 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from orders.fines import accrue_fines
+
+
+class Command(BaseCommand):
+    """Accrues the fines of the overdue, unreturned :model:`orders.Order` and
+    reports the overdue orders of the fleet.
+
+    The fines of all the overdue orders are computed in one vectorized pass and
+    stored in `accrued_fine`, the fine is charged when the car is returned.
+    Meant to be run nightly.
+    """
+
+    help = "Accrues the fines of the overdue orders and prints the overdue report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Day the fines are accrued for, today by default.")
+        parser.add_argument('--top', type=int, default=10, help="Number of the largest fines listed.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of orders updated per query.")
+
+    def handle(self, *args, **options):
+        today = options['date'] or date.today()
+        report = accrue_fines(today, options['top'], options['batch_size'])
+        self.stdout.write(f"Overdue report for {today}")
+        self.stdout.write(f"Overdue orders: {report['orders']} ({report['updated']} fines updated)")
+        self.stdout.write(f"Accrued fines: {report['total_fine']}")
+        self.stdout.write(f"Days overdue: {report['average_days']:.1f} on average, {report['max_days']} at most")
+        for row in report['top']:
+            self.stdout.write(
+                f"Order-{row['id']} Car-{row['car']} user-{row['user']}: "
+                f"{row['days']} days, fine {row['accrued_fine']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Fines accrued."))
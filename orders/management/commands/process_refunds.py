@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from orders.refunds import MAX_ATTEMPTS, process_refunds
+
+
+class Command(BaseCommand):
+    """Issues the queued refunds of the cancelled :model:`orders.Order` to Stripe.
+
+    The refunds are issued in batches, with an idempotency key per order, and
+    the failed calls retried with an exponential backoff. With `--loop` the
+    worker keeps polling the queue.
+    """
+
+    help = "Issues the queued refunds of the cancelled orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help="Number of refunds issued per batch.")
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help="Attempts before a refund fails.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the queue.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between two polls of an empty queue.")
+
+    def handle(self, *args, **options):
+        while True:
+            result = process_refunds(options['batch_size'], options['max_attempts'])
+            processed = sum(result.values())
+            if processed:
+                self.stdout.write(
+                    f"Issued {result['issued']} refunds, {result['retried']} to retry, {result['failed']} failed."
+                )
+            if processed < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from cars.cache import BOOKINGS, bump_version
+from orders.models import BookingHold
+
+
+class Command(BaseCommand):
+    """Deletes the expired :model:`orders.BookingHold` rows with a single query.
+
+    Expired holds are already ignored by the availability lookups, reaping them
+    keeps the table small and refreshes the ETags of the date-range car searches.
+    Meant to be run periodically, every few minutes.
+    """
+
+    help = "Deletes the expired booking holds."
+
+    def handle(self, *args, **options):
+        deleted, _ = BookingHold.objects.filter(expires_at__lte=timezone.now()).delete()
+        if deleted:
+            bump_version(BOOKINGS)
+        self.stdout.write(self.style.SUCCESS(f"Reaped {deleted} expired booking holds."))
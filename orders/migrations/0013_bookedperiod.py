@@ -0,0 +1,37 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_alter_car_price'),
+        ('orders', '0012_order_fine_generated_order_fine_paid_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_periods', to='cars.car')),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='booked_period', to='orders.order')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookedperiod',
+            index=models.Index(fields=['car', 'end_date', 'start_date'], name='booked_period_car_dates_idx'),
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO orders_bookedperiod (car_id, order_id, start_date, end_date)
+            SELECT car_id, id, start_date, end_date FROM orders_order
+            WHERE NOT cancelled AND car_id IS NOT NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:20
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+MAX_REPORTED_PAIRS = 100
+
+
+def check_overlapping_orders(apps, schema_editor):
+    """Aborts the migration if non-cancelled orders of a car overlap, which the exclusion
+    constraint would reject, listing the pairs of order ids to be resolved by hand first.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT a.id, b.id FROM orders_order a JOIN orders_order b "
+            "ON a.car_id = b.car_id AND a.id < b.id AND a.period && b.period "
+            "WHERE NOT a.cancelled AND NOT b.cancelled ORDER BY a.id, b.id"
+        )
+        pairs = cursor.fetchall()
+    if pairs:
+        listed = ', '.join(f"{first}/{second}" for first, second in pairs[:MAX_REPORTED_PAIRS])
+        more = f" and {len(pairs) - MAX_REPORTED_PAIRS} more" if len(pairs) > MAX_REPORTED_PAIRS else ""
+        raise RuntimeError(
+            f"Non-cancelled orders book the same car for overlapping dates, {len(pairs)} pairs of "
+            f"order ids: {listed}{more}. Cancel or rebook one order of each pair, then run the migration again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_bookedperiod'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name='order',
+            name='period',
+            field=django.contrib.postgres.fields.ranges.DateRangeField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE orders_order SET period = daterange(start_date, end_date, '[]')",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='period',
+            field=django.contrib.postgres.fields.ranges.DateRangeField(editable=False),
+        ),
+        # the double bookings made before the constraint must be resolved before it is added.
+        migrations.RunPython(check_overlapping_orders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('cancelled', False)), expressions=[('car', '='), ('period', '&&')], name='order_car_period_excl'),
+        ),
+        migrations.DeleteModel(
+            name='BookedPeriod',
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_order_period'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='payment_intent_id',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('payment_intent_id', 'car'), name='order_payment_intent_car_uniq'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:32
+
+from django.conf import settings
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cars', '0012_carblackout'),
+        ('orders', '0015_group_bookings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('period', django.contrib.postgres.fields.ranges.DateRangeField(editable=False)),
+                ('session_id', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='cars.car')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='bookinghold',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[('car', '='), ('period', '&&')], name='booking_hold_car_period_excl'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0016_bookinghold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='accrued_fine',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='fine_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
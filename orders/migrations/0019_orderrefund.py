@@ -0,0 +1,34 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0018_order_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRefund',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_intent_id', models.CharField(max_length=100)),
+                ('amount', models.PositiveIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('issued', 'Issued'), ('refunded', 'Refunded'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('stripe_refund_id', models.CharField(blank=True, max_length=100)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='refund_request', to='orders.order')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='orderrefund',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='order_refund_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.0.5 on 2026-10-18 19:47
+
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0019_orderrefund'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('cancelling', 'Cancelling'), ('cancelled', 'Cancelled'), ('returned', 'Returned'), ('fine_pending', 'Fine pending'), ('fine_paid', 'Fine paid')], default='active', max_length=12),
+        ),
+        migrations.RemoveConstraint(
+            model_name='order',
+            name='order_car_period_excl',
+        ),
+        # the lifecycle booleans are folded into the status, before they are removed.
+        migrations.RunSQL(
+            sql="""
+                UPDATE orders_order SET status = CASE
+                    WHEN cancelled AND refund THEN 'cancelled'
+                    WHEN cancelled THEN 'cancelling'
+                    WHEN returned AND fine_paid THEN 'fine_paid'
+                    WHEN returned AND fine_generated THEN 'fine_pending'
+                    WHEN returned THEN 'returned'
+                    ELSE 'active'
+                END
+            """,
+            reverse_sql="""
+                UPDATE orders_order SET
+                    cancelled = status IN ('cancelling', 'cancelled'),
+                    refund = status = 'cancelled',
+                    returned = status IN ('returned', 'fine_pending', 'fine_paid'),
+                    fine_generated = status IN ('fine_pending', 'fine_paid'),
+                    fine_paid = status = 'fine_paid'
+            """,
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='cancelled',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='fine_generated',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='fine_paid',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='refund',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='returned',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['user'], name='order_active_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['car'], name='order_active_car_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['end_date'], name='order_active_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'fine_pending')), fields=['user'], name='order_fine_pending_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ('cancelling', 'cancelled')), _negated=True), expressions=[('car', '='), ('period', '&&')], name='order_car_period_excl'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.CheckConstraint(check=models.Q(('status__in', ['active', 'cancelling', 'cancelled', 'returned', 'fine_pending', 'fine_paid'])), name='order_status_valid'),
+        ),
+    ]
@@ -1,8 +1,59 @@
-from django.db import models
-from cars.models import Car
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, RangeOperators
+from rest_framework.exceptions import ValidationError
+from cars.models import Car, booking_period
+from constants import INVALID_ORDER_STATUS
 from django.conf import settings
 
 User = settings.AUTH_USER_MODEL
+ORDER_PERIOD_CONSTRAINT = 'order_car_period_excl'
+ORDER_PAYMENT_CONSTRAINT = 'order_payment_intent_car_uniq'
+BOOKING_HOLD_CONSTRAINT = 'booking_hold_car_period_excl'
+
+BOOKING_HOLD_TTL = timedelta(minutes=35)
+"""Lifetime of a booking hold, the checkout session expires with its holds.
+Stripe accepts session expiries from 30 minutes on.
+"""
+
+ACTIVE = 'active'
+CANCELLING = 'cancelling'
+CANCELLED = 'cancelled'
+RETURNED = 'returned'
+FINE_PENDING = 'fine_pending'
+FINE_PAID = 'fine_paid'
+ORDER_STATUS_CHOICES = [
+    (ACTIVE, 'Active'),
+    (CANCELLING, 'Cancelling'),
+    (CANCELLED, 'Cancelled'),
+    (RETURNED, 'Returned'),
+    (FINE_PENDING, 'Fine pending'),
+    (FINE_PAID, 'Fine paid'),
+]
+
+ORDER_TRANSITIONS = {
+    ACTIVE: (CANCELLING, CANCELLED, RETURNED, FINE_PENDING),
+    CANCELLING: (CANCELLED,),
+    CANCELLED: (),
+    RETURNED: (),
+    FINE_PENDING: (FINE_PAID,),
+    FINE_PAID: (),
+}
+"""Statuses an order can move to from each status.
+An order is cancelled when its refund is confirmed, and is cancelling until then. An active order
+is cancelled directly when its payment is refunded outside of a cancellation.
+"""
+
+CANCELLED_STATUSES = (CANCELLING, CANCELLED)
+RETURNED_STATUSES = (RETURNED, FINE_PENDING, FINE_PAID)
+
+BOOKED = ~Q(status__in=CANCELLED_STATUSES)
+"""Orders holding their car for their period, the same condition as the partial index of the
+exclusion constraint so that the lookups filtering with it can use the index.
+"""
 
 
 class Order(models.Model):
@@ -11,21 +62,163 @@ class Order(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     price = models.DecimalField(max_digits=12, decimal_places=2)
-    fine_amount = models.DecimalField(max_digits=6, decimal_places=2, default=0)
-    returned = models.BooleanField(default=False)
+    fine_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    accrued_fine = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    status = models.CharField(max_length=12, choices=ORDER_STATUS_CHOICES, default=ACTIVE)
     order_date = models.DateField(auto_now_add=True)
-    cancelled = models.BooleanField(default=False)
     discount = models.DecimalField(max_digits=12, decimal_places=2)
-    payment_intent_id = models.CharField(max_length=100, unique=True)
-    refund = models.BooleanField(default=False)
-    fine_generated = models.BooleanField(default=False)
-    fine_paid = models.BooleanField(default=False)
+    payment_intent_id = models.CharField(max_length=100, db_index=True)
     fine_payment_intent_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    period = DateRangeField(editable=False)
+
+    class Meta:
+        constraints = [
+            # A car can't have two non-cancelled orders for overlapping periods, the GiST index
+            # backing this constraint also serves the overlap lookups of the availability search.
+            ExclusionConstraint(
+                name=ORDER_PERIOD_CONSTRAINT,
+                expressions=[
+                    ('car', RangeOperators.EQUAL),
+                    ('period', RangeOperators.OVERLAPS),
+                ],
+                condition=BOOKED,
+            ),
+            # The orders of a group booking share the payment of their checkout session.
+            models.UniqueConstraint(fields=['payment_intent_id', 'car'], name=ORDER_PAYMENT_CONSTRAINT),
+            models.CheckConstraint(
+                check=Q(status__in=[status for status, _ in ORDER_STATUS_CHOICES]), name='order_status_valid'
+            ),
+        ]
+        indexes = [
+            # range scans of the admin exports.
+            models.Index(fields=['order_date', 'id'], name='order_date_idx'),
+            # current bookings of a user, and the delete guard of users.
+            models.Index(fields=['user'], condition=Q(status=ACTIVE), name='order_active_user_idx'),
+            # delete guards of cars, brands and types.
+            models.Index(fields=['car'], condition=Q(status=ACTIVE), name='order_active_car_idx'),
+            # overdue orders of the nightly fine accrual.
+            models.Index(fields=['end_date'], condition=Q(status=ACTIVE), name='order_active_end_idx'),
+            # pending fines of a user.
+            models.Index(fields=['user'], condition=Q(status=FINE_PENDING), name='order_fine_pending_user_idx'),
+        ]
 
     def __str__(self):
         return f"Order-{self.id} Car-{self.car_id} user-{self.user_id}"
 
+    def save(self, *args, **kwargs):
+        self.period = booking_period(self.start_date, self.end_date)
+        # the receivers of the save signals, like the rollups, write within the transaction of the save.
+        with transaction.atomic():
+            super(Order, self).save(*args, **kwargs)
+
     @property
     def total_amount(self):
         return self.price + self.fine_amount
-        
\ No newline at end of file
+
+    @property
+    def cancelled(self):
+        return self.status in CANCELLED_STATUSES
+
+    @property
+    def refund(self):
+        return self.status == CANCELLED
+
+    @property
+    def returned(self):
+        return self.status in RETURNED_STATUSES
+
+    @property
+    def fine_generated(self):
+        return self.status in (FINE_PENDING, FINE_PAID)
+
+    @property
+    def fine_paid(self):
+        return self.status == FINE_PAID
+
+    def transition(self, status):
+        """Moves the order to the status, if allowed from its current status.
+        The order isn't saved.
+
+        Parameters
+        ----------
+        status: string
+            New status of the order.
+        """
+        if status not in ORDER_TRANSITIONS[self.status]:
+            raise ValidationError({'message': INVALID_ORDER_STATUS})
+        self.status = status
+
+
+class BookingHold(models.Model):
+    """Claim on a car for the dates of a checkout session, from the creation of the session
+    until its payment is confirmed or it expires. A live hold makes the car unavailable like
+    a booking, and holds can't overlap each other.
+    """
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name="holds")
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    period = DateRangeField(editable=False)
+    session_id = models.CharField(max_length=255, blank=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            # Expired holds still take part in the constraint until they are released or reaped.
+            ExclusionConstraint(
+                name=BOOKING_HOLD_CONSTRAINT,
+                expressions=[
+                    ('car', RangeOperators.EQUAL),
+                    ('period', RangeOperators.OVERLAPS),
+                ],
+            ),
+        ]
+
+    def __str__(self):
+        return f"Hold-{self.id} Car-{self.car_id} user-{self.user_id}"
+
+    def save(self, *args, **kwargs):
+        self.period = booking_period(self.start_date, self.end_date)
+        super(BookingHold, self).save(*args, **kwargs)
+
+
+class OrderRefund(models.Model):
+    """Refund of a cancelled order, queued by the cancellation and issued to Stripe by the
+    `process_refunds` worker. The `charge.refunded` webhook then marks the order refunded.
+    """
+    PENDING = 'pending'
+    ISSUED = 'issued'
+    REFUNDED = 'refunded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (ISSUED, 'Issued'),
+        (REFUNDED, 'Refunded'),
+        (FAILED, 'Failed'),
+    ]
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="refund_request")
+    payment_intent_id = models.CharField(max_length=100)
+    amount = models.PositiveIntegerField(null=True, blank=True)
+    """Amount refunded in cents, None for the whole payment. Set when the refund is issued.
+    """
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    stripe_refund_id = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=Q(status='pending'), name='order_refund_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"Refund-{self.id} Order-{self.order_id} {self.status}"
+
+    @property
+    def idempotency_key(self):
+        """Key making Stripe create the refund of the order only once, whatever the retries.
+        """
+        return f"order-refund-{self.order_id}"
@@ -0,0 +1,152 @@
+"""Asynchronous refunds of the cancelled :model:`orders.Order`.
+
+Cancelling an order only marks it cancelling, which frees its car, and queues an
+:model:`orders.OrderRefund` in the same transaction. The `process_refunds`
+worker issues the queued refunds to Stripe, with an idempotency key per order
+so a retried call never refunds twice, and the `charge.refunded` webhook marks
+the orders cancelled once Stripe has processed the refunds.
+"""
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from notifications.outbox import retry_delay
+from .models import ACTIVE, CANCELLED, CANCELLING, Order, OrderRefund
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+
+MAX_ATTEMPTS = 8
+"""Number of attempts after which a refund is marked failed, to be issued by hand.
+"""
+
+NETWORK_RETRIES = 2
+"""Retries of a Stripe call on network errors, within an attempt.
+"""
+
+
+def queue_refund(order):
+    """Cancels the order and queues its refund, within the current transaction.
+
+    Parameters
+    ----------
+    order: :model:`orders.Order` object
+        Order locked with `select_for_update`.
+
+    Returns
+    -------
+    refund: :model:`orders.OrderRefund` object
+    """
+    order.transition(CANCELLING)
+    order.save(update_fields=['status'])
+    return OrderRefund.objects.create(order=order, payment_intent_id=order.payment_intent_id)
+
+
+def refund_amount(refund):
+    """Return the amount of the refund in cents, None to refund the whole payment.
+    Only the price of the order is refunded when its payment also paid for other orders,
+    the orders of a group booking.
+    """
+    shared = Order.objects.filter(payment_intent_id=refund.payment_intent_id).exclude(id=refund.order_id)
+    if shared.exists():
+        return int(refund.order.price * 100)
+    return None
+
+
+def issue_refund(refund):
+    """Issues the refund to Stripe and records it.
+
+    Parameters
+    ----------
+    refund: :model:`orders.OrderRefund` object
+    """
+    refund.amount = refund_amount(refund)
+    refund_data = {
+        'payment_intent': refund.payment_intent_id,
+        'metadata': {'order_id': refund.order_id},
+        'idempotency_key': refund.idempotency_key,
+    }
+    if refund.amount is not None:
+        refund_data['amount'] = refund.amount
+    stripe_refund = stripe.Refund.create(**refund_data)
+    refund.stripe_refund_id = stripe_refund['id']
+    refund.status = OrderRefund.ISSUED
+
+
+def process_refunds(batch_size=50, max_attempts=MAX_ATTEMPTS):
+    """Issues a batch of the due refunds.
+    The refunds are locked while they are issued, and the refunds locked by other workers are
+    skipped. A refund rejected by Stripe is marked failed, the other errors are retried later
+    with an exponential backoff.
+
+    Parameters
+    ----------
+    batch_size: int
+        Maximum number of refunds issued.
+    max_attempts: int
+        Number of attempts after which a refund is marked failed.
+
+    Returns
+    -------
+    result: dict
+        -issued: (int) number of refunds issued
+        -retried: (int) number of refunds to be retried
+        -failed: (int) number of refunds marked failed
+    """
+    stripe.max_network_retries = NETWORK_RETRIES
+    result = {'issued': 0, 'retried': 0, 'failed': 0}
+    with transaction.atomic():
+        refunds = list(
+            OrderRefund.objects.select_related('order').select_for_update(skip_locked=True, of=('self',)).filter(
+                status=OrderRefund.PENDING, next_attempt_at__lte=timezone.now()
+            ).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for refund in refunds:
+            refund.attempts += 1
+            try:
+                issue_refund(refund)
+            except stripe.error.InvalidRequestError as e:
+                refund.status = OrderRefund.FAILED
+                refund.last_error = str(e)
+                result['failed'] += 1
+            except stripe.error.StripeError as e:
+                refund.last_error = str(e)
+                if refund.attempts >= max_attempts:
+                    refund.status = OrderRefund.FAILED
+                    result['failed'] += 1
+                else:
+                    refund.next_attempt_at = timezone.now() + retry_delay(refund.attempts)
+                    result['retried'] += 1
+            else:
+                result['issued'] += 1
+        OrderRefund.objects.bulk_update(
+            refunds, ['amount', 'status', 'stripe_refund_id', 'attempts', 'next_attempt_at', 'last_error']
+        )
+    return result
+
+
+def finalize_refunds(charge):
+    """Marks cancelled the orders refunded by the charge of a `charge.refunded` event.
+
+    The refunds issued by the worker carry the id of their order in their metadata. For a
+    charge without its refunds, the active and cancelling orders of a fully refunded payment are
+    all cancelled, and only the cancelling ones for a partially refunded payment.
+
+    Parameters
+    ----------
+    charge: dict
+        Refunded charge.
+    """
+    orders = Order.objects.filter(payment_intent_id=charge["payment_intent"], status__in=[ACTIVE, CANCELLING])
+    refunds = (charge.get("refunds") or {}).get("data") or []
+    order_ids = [refund["metadata"]["order_id"] for refund in refunds if refund.get("metadata", {}).get("order_id")]
+    if not charge.get("refunded"):
+        #partially refunded payment of a group booking, only the cancelling orders are refunded.
+        orders = orders.filter(status=CANCELLING)
+        if order_ids:
+            orders = orders.filter(id__in=order_ids)
+    orders = list(orders)
+    for order in orders:
+        order.transition(CANCELLED)
+        order.save(update_fields=['status'])
+    OrderRefund.objects.filter(order__in=orders).update(status=OrderRefund.REFUNDED)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Order
+from .services import MAX_BULK_RETURN
 
 
 class CreateOrderSerializer(serializers.ModelSerializer):
@@ -27,20 +28,27 @@ class ReturnOrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = [
             'id', 'car', 'user', 'start_date', 'end_date',
-            'price', 'fine_amount', 'total_amount', 'discount',
-            'cancelled', 'refund', 'returned', 'fine_generated',
+            'price', 'fine_amount', 'accrued_fine', 'total_amount', 'discount',
+            'status', 'cancelled', 'refund', 'returned', 'fine_generated',
             'payment_intent_id', 'fine_paid', 'fine_payment_intent_id'
         ]
         extra_kwargs = {
-            'cancelled': {'read_only': True},
-            'refund': {'read_only': True},
-            'returned': {'read_only': True},
+            'status': {'read_only': True},
             'payment_intent_id': {'read_only': True},
-            'fine_generated': {'read_only': True},
-            'fine_paid': {'read_only': True},
             'fine_payment_intent_id': {'read_only': True},
         }
 
+class BulkReturnSerializer(serializers.Serializer):
+    """Validates the orders of a bulk return.
+    """
+
+    orders = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_BULK_RETURN
+    )
+    """Ids of the :model:Order to return.
+    """
+
+
 class OrderSerializer(serializers.ModelSerializer):
     """Serializer for viewing existing bookings.
     """
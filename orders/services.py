@@ -0,0 +1,75 @@
+from decimal import Decimal
+from django.db import transaction
+from analytics.rollups import order_state, update_rollups
+from constants import CAR_RETURN_SUCCESS, INVALID_REQUEST, ORDER_NOT_FOUND
+from .fines import late_fines
+from .models import ACTIVE, FINE_PENDING, RETURNED, Order
+
+MAX_BULK_RETURN = 500
+"""Maximum number of orders returned by a single request.
+"""
+
+
+def return_orders(order_ids, today):
+    """Returns the cars of the orders, charging the fines of the late returns.
+    The orders are loaded and locked with their cars in a single query, the fines of the
+    whole batch are computed at once and every returned order is written with a single
+    `bulk_update`, in one transaction.
+
+    Orders which are cancelled, already returned, not started yet or without car are left unchanged.
+
+    Parameters
+    ----------
+    order_ids: list
+        Ids of :model:`orders.Order`.
+    today: date
+        Day the cars are returned.
+
+    Returns
+    -------
+    results: list
+        One dict per order id, in the given order, with,
+            -id: (int) id of the order
+            -returned: (bool) True if the car was returned by this request
+            -message: (string) result of the return
+            -fine_generated: (bool) True if the car was returned late
+            -fine_amount: (Decimal) fine of the late return
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    with transaction.atomic():
+        orders = Order.objects.select_related('car').select_for_update(of=('self',)).filter(id__in=order_ids)
+        orders = {order.id: order for order in orders}
+        returnable = [
+            order for order in orders.values()
+            if order.status == ACTIVE and today >= order.start_date and order.car is not None
+        ]
+        if returnable:
+            previous = [order_state(order) for order in returnable]
+            days, fines = late_fines(
+                [order.car.price for order in returnable], [order.end_date for order in returnable], today
+            )
+            for order, late, fine in zip(returnable, days, fines):
+                if late:
+                    order.fine_amount = Decimal(int(fine)) / 100
+                order.transition(FINE_PENDING if late else RETURNED)
+                order.accrued_fine = 0
+            # returning a car changes neither the bookings nor the invoice of the order, only the
+            # rollups depend on the post_save signals bulk_update doesn't send.
+            Order.objects.bulk_update(returnable, ['fine_amount', 'status', 'accrued_fine'])
+            update_rollups(list(zip(previous, [order_state(order) for order in returnable])))
+
+    returned = {order.id for order in returnable}
+    results = []
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        if order is None:
+            results.append({'id': order_id, 'returned': False, 'message': ORDER_NOT_FOUND})
+            continue
+        results.append({
+            'id': order_id,
+            'returned': order_id in returned,
+            'message': CAR_RETURN_SUCCESS if order_id in returned else INVALID_REQUEST,
+            'fine_generated': order.fine_generated,
+            'fine_amount': order.fine_amount,
+        })
+    return results
@@ -1,9 +1,19 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from cars.cache import BOOKINGS, bump_version
+from django.conf import settings
+from .invoices import (
+    CONTENT_TYPES,
+    HTML,
+    PDF,
+    USER_FIELDS,
+    invalidate_invoice,
+    invalidate_user_invoices,
+    invoice_filename,
+    render_invoice,
+)
 from .models import Order
-from accounts.models import User
-from core.settings import EMAIL_HOST_USER
-from django.core.mail import EmailMessage
+from notifications.outbox import queue_email
 
 
 @receiver(post_save, sender=Order)
@@ -15,29 +25,65 @@ def send_invoice(sender, instance, created, **kwargs):
     sender: :model:`orders.Order`
     """
     if created:
-        user = User.objects.get(id=instance.user_id)
-
-        subject = f"Car Rental System"
-        body = f"Greetings {user.first_name}, <br>\
-            Your booking is confirmed <br><br>\
-            <b>----------------------------------</b><br>\
-            <b>Invoice </b><br>\
-            <b>----------------------------------</b><br>\
-            Order Id: <b>{instance.id}</b> <br>\
-            Issue date: {instance.order_date} <br>\
-            Customer: {user.first_name} {user.last_name} <br>\
-            Amount: {instance.price} <br>\
-            From: {instance.start_date} <br>\
-            To: {instance.end_date} <br>\
-            <b>----------------------------------</b><br><br>\
-            Thank you for the order, have a safe journey."
-
-        msg = EmailMessage(
-            subject,
-            body,
-            EMAIL_HOST_USER,
-            [user.email]
-        )
-        msg.content_subtype = "html"
-        msg.send()
-        
\ No newline at end of file
+        # the saved instance holds the values as given, the invoice is rendered from the stored ones.
+        send_order_invoice(Order.objects.select_related('user').get(id=instance.id))
+
+
+def send_order_invoice(order):
+    """Queues the invoice of the order to its user in the email outbox,
+    within the transaction creating the order.
+    The invoice is rendered from the cached template, with a PDF copy attached
+    if `INVOICE_PDF_ATTACHMENT` is set.
+    ----------
+    order: object
+        Instance of :model:`orders.Order`, fetched with `select_related('user')`.
+    """
+    attachments = []
+    if settings.INVOICE_PDF_ATTACHMENT:
+        attachments.append((invoice_filename(order), render_invoice(order, PDF), CONTENT_TYPES[PDF]))
+    queue_email(
+        "Car Rental System",
+        render_invoice(order, HTML),
+        [order.user.email],
+        from_email=settings.EMAIL_HOST_USER,
+        html=True,
+        attachments=attachments,
+    )
+
+
+@receiver(post_save, sender=Order)
+def invalidate_order_invoice(sender, instance, created, **kwargs):
+    """Drops the cached invoices of an updated order.
+    ----------
+    instance: object
+        Instance of :model:`orders.Order`
+    sender: :model:`orders.Order`
+    """
+    if not created:
+        invalidate_invoice(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_invoice(sender, instance, created, update_fields, **kwargs):
+    """Drops the cached invoices of the orders of an updated user, unless the saved fields
+    are known and none of them is shown on the invoices, like the `last_login` of a login.
+    ----------
+    instance: object
+        Instance of :model:`accounts.User`
+    sender: :model:`accounts.User`
+    """
+    if not created and (update_fields is None or set(update_fields) & set(USER_FIELDS)):
+        invalidate_user_invoices(instance.id)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_bookings(sender, instance, **kwargs):
+    """Bumps the bookings version after an order is saved or deleted,
+    which changes the ETags of the date-range car searches.
+    ----------
+    instance: object
+        Instance of :model:`orders.Order`
+    sender: :model:`orders.Order`
+    """
+    bump_version(BOOKINGS)
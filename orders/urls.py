@@ -1,6 +1,10 @@
 from django.urls import path
 from .views import (
+    BulkReturnCarOrders,
     CancelOrder,
+    ExportBookingHistory,
+    ExportOrders,
+    OrderInvoiceView,
     ReturnCarOrder, 
     ViewBookings,
     ViewBookingHistory,
@@ -10,9 +14,13 @@ from .views import (
 urlpatterns = [
     path('<int:pk>/cancel/', CancelOrder.as_view(), name="cancel-booking"),
     path('<int:pk>/return-car/', ReturnCarOrder.as_view(), name="return-car"),
+    path('return-cars/', BulkReturnCarOrders.as_view(), name="bulk-return-cars"),
+    path('<int:pk>/invoice/', OrderInvoiceView.as_view(), name="order-invoice"),
 
     path('bookings/', ViewBookings.as_view(), name="new-bookings"),
     path('bookings-history/', ViewBookingHistory.as_view(), name="booking-history"),
+    path('bookings-history/export/', ExportBookingHistory.as_view(), name="booking-history-export"),
+    path('export/', ExportOrders.as_view(), name="orders-export"),
 
     path('pending-fine/', ViewPendingFineView.as_view(), name="pending-fine"),
 ]
@@ -1,31 +1,36 @@
+from django.db import transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
-from cars.models import Car
-from .models import Order
-from .serializers import ReturnOrderSerializer, OrderSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from core.pagination import OptionalCursorPagination
+from .exports import export_dates, export_format, export_response
+from .fines import fine_amount
+from .invoices import CONTENT_TYPES, FORMATS, HTML, PDF, invoice_filename, render_invoice
+from .models import ACTIVE, FINE_PENDING, RETURNED, Order
+from .serializers import BulkReturnSerializer, ReturnOrderSerializer, OrderSerializer
+from .refunds import queue_refund
+from .services import return_orders
 from rest_framework import status
 from datetime import date, timedelta
 from constants import (
     CAR_RETURN_SUCCESS,
+    INVALID_INVOICE_FORMAT,
     INVALID_REQUEST,
     LATE_ORDER_CANCEL,
     ORDER_ALREADY_CANCELLED,
     ORDER_CANCEL_SUCCESS,
-    ORDER_CANCEL_FAILED,
 )
-from django.conf import settings
-import stripe
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 class CancelOrder(APIView):
     """
     View for Cancellation of booking.
     Only allows if the booking start date is less than date of cancellation.
+    The order is cancelled right away, which frees its car, and its refund is queued
+    for the `process_refunds` worker.
     """
 
     permission_classes = [IsAuthenticated]
@@ -51,23 +56,20 @@ class CancelOrder(APIView):
         Response: objects
             Renders to content type as requested by the client.
         """
-        order = get_object_or_404(Order, id=pk)
-        if order.cancelled:
-            return Response(
-                {'message': ORDER_ALREADY_CANCELLED},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        elif order.start_date < date.today():
-            return Response(
-                {'message': LATE_ORDER_CANCEL},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        refund = stripe.Refund.create(payment_intent=order.payment_intent_id)
-        if refund["status"] == "succeeded":
-            order.cancelled = True
-            order.save()
-            return Response({'message': ORDER_CANCEL_SUCCESS}, status=status.HTTP_200_OK)
-        return Response({'message': ORDER_CANCEL_FAILED}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        with transaction.atomic():
+            order = get_object_or_404(Order.objects.select_for_update(), id=pk)
+            if order.cancelled:
+                return Response(
+                    {'message': ORDER_ALREADY_CANCELLED},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            elif order.start_date < date.today():
+                return Response(
+                    {'message': LATE_ORDER_CANCEL},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queue_refund(order)
+        return Response({'message': ORDER_CANCEL_SUCCESS}, status=status.HTTP_200_OK)
 
 
 class ReturnCarOrder(APIView):
@@ -98,9 +100,9 @@ class ReturnCarOrder(APIView):
         Response: objects
             Renders to content type as requested by the client.
         """
-        order = get_object_or_404(Order, id=pk)
+        order = get_object_or_404(Order.objects.select_related('car'), id=pk)
         today = date.today()
-        if order.cancelled or order.returned or today < order.start_date:
+        if order.status != ACTIVE or today < order.start_date:
             return Response(
                 {'message': INVALID_REQUEST},
                 status=status.HTTP_400_BAD_REQUEST
@@ -108,21 +110,12 @@ class ReturnCarOrder(APIView):
         if order.end_date+timedelta(days=1) <= today:
             days = today - (order.end_date + timedelta(days=1))
             days = days.days + 1
-            car = Car.objects.get(id=order.car.id)
-            """fine calculations
-            Increasing fine per day, if fine is 5% per day then, for 3 days the total fine would be,
-                5, 10, 15 -> total 30%
-                considering price of car as 3000,
-                fine_percent = (3000 * 30)//100 = 900
-                total_fine = 3000*3 + 900 = 9900
-            """
-            percentage_fine = (car.price * ((((days+1) * days)//2)*5)) //100
-            fine_amount = days * car.price + percentage_fine
-            order.fine_amount = fine_amount
-            order.fine_generated = True
-        
-        order.returned = True
-        order.save()
+            order.fine_amount = fine_amount(order.car.price, days)
+            order.transition(FINE_PENDING)
+        else:
+            order.transition(RETURNED)
+        order.accrued_fine = 0
+        order.save(update_fields=['status', 'fine_amount', 'accrued_fine'])
         serializer = ReturnOrderSerializer(order)
         return Response(
             {
@@ -133,6 +126,86 @@ class ReturnCarOrder(APIView):
         )
 
 
+class BulkReturnCarOrders(APIView):
+    """Returns the cars of several orders at once, for the staff of the depots.
+    The result of every order is listed, the orders which can't be returned don't
+    prevent the others from being returned.
+    """
+
+    permission_classes = [IsAdminUser]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def post(self, request, *args, **kwargs):
+        """Accepts post requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request, with the `orders` ids.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        Response: objects
+            Renders to content type as requested by the client.
+        """
+        serializer = BulkReturnSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = return_orders(serializer.validated_data['orders'], date.today())
+        return Response(
+            {
+                'returned': sum(result['returned'] for result in results),
+                'data': results,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class OrderInvoiceView(APIView):
+    """Invoice of an order of the user, as html or as a pdf file with `?type=pdf`.
+    Invoices are served from the cache once rendered.
+    """
+
+    permission_classes = [IsAuthenticated]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        pk: (int)
+            Id of the :model:`order`.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        HttpResponse: object
+            Invoice of the order.
+        """
+        format = request.query_params.get('type', HTML)
+        if format not in FORMATS:
+            return Response({'message': INVALID_INVOICE_FORMAT}, status=status.HTTP_400_BAD_REQUEST)
+        orders = Order.objects.select_related('user')
+        if not request.user.is_staff:
+            orders = orders.filter(user=request.user)
+        order = get_object_or_404(orders, id=pk)
+        response = HttpResponse(render_invoice(order, format), content_type=CONTENT_TYPES[format])
+        if format == PDF:
+            response['Content-Disposition'] = f'attachment; filename="{invoice_filename(order)}"'
+        return response
+
+
 class ViewBookings(ListAPIView):
     """
     Current and new bookings view.
@@ -152,7 +225,7 @@ class ViewBookings(ListAPIView):
         -------
         queryset: for :model:`Order`
         """
-        queryset = Order.objects.filter(user=self.request.user, returned=False)
+        queryset = Order.objects.select_related('user').filter(user=self.request.user, status=ACTIVE)
         return queryset
 
 
@@ -164,6 +237,10 @@ class ViewBookingHistory(ListAPIView):
     """List of permissions that should be used for granting or denial of request.
     """
 
+    pagination_class = OptionalCursorPagination
+    """Limit offset pagination, with keyset pages on `id` when requested with `?pagination=cursor`.
+    """
+
     serializer_class = ReturnOrderSerializer
     """The serializer class that should be used for validating and deserializing input,
     and for serializing output.
@@ -175,10 +252,72 @@ class ViewBookingHistory(ListAPIView):
         -------
         queryset: for :model:`Order`
         """
-        queryset = Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.select_related('user').filter(user=self.request.user).order_by('id')
         return queryset
 
 
+class ExportBookingHistory(APIView):
+    """Streams the whole booking history of the user as a csv file, or ndjson with `?type=ndjson`.
+    """
+
+    permission_classes = [IsAuthenticated]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        StreamingHttpResponse: object
+            Exported orders of the user.
+        """
+        format = export_format(request)
+        queryset = Order.objects.filter(user=request.user).order_by('id')
+        return export_response(queryset, format, "booking-history")
+
+
+class ExportOrders(APIView):
+    """Streams all the orders made between the `from` and `to` dates, both included,
+    as a csv file, or ndjson with `?type=ndjson`.
+    """
+
+    permission_classes = [IsAdminUser]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Accepts get requests
+
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+        *args
+            Variable length argument list.
+        **kwargs
+            Arbitrary keyword arguments.
+
+        Returns
+        -------
+        StreamingHttpResponse: object
+            Exported orders.
+        """
+        format = export_format(request)
+        start_date, end_date = export_dates(request)
+        queryset = Order.objects.filter(order_date__range=(start_date, end_date)).order_by('order_date', 'id')
+        return export_response(queryset, format, f"orders-{start_date}-{end_date}")
+
+
 class ViewPendingFineView(ListAPIView):
     """Shows previous bookings made by the user.
     """
@@ -187,6 +326,10 @@ class ViewPendingFineView(ListAPIView):
     """List of permissions that should be used for granting or denial of request.
     """
 
+    pagination_class = OptionalCursorPagination
+    """Limit offset pagination, with keyset pages on `id` when requested with `?pagination=cursor`.
+    """
+
     serializer_class = ReturnOrderSerializer
     """The serializer class that should be used for validating and deserializing input,
     and for serializing output.
@@ -198,5 +341,7 @@ class ViewPendingFineView(ListAPIView):
         -------
         queryset: for :model:`Order`
         """
-        queryset = Order.objects.filter(user=self.request.user, fine_generated=True, fine_paid=False)
+        queryset = Order.objects.select_related('user').filter(
+            user=self.request.user, status=FINE_PENDING
+        ).order_by('id')
         return queryset
@@ -3,7 +3,14 @@ from orders.serializers import OrderSerializer
 from .models import Discount
 from django.conf import settings
 import stripe
-from cars.models import Car
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from cars.availability import best_fit_car_ids, booked_periods, exclude_booked_cars
+from cars.cache import BOOKINGS, bump_version
+from cars.models import Car, booking_period
+from constants import CAR_BOOKING_NOT_AVAILABLE
+from orders.models import BOOKING_HOLD_CONSTRAINT, BOOKING_HOLD_TTL, BookingHold
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -14,6 +21,95 @@ def get_car_object(pk):
         raise ValidationError({'message': "Invalid Car id."})
     return obj
 
+def lock_best_fit_car(queryset, start_date, end_date):
+    """Locks and returns the car of the queryset which best fits the dates, the car leaving the
+    tightest free gap around them. Only the row of the chosen car is locked, until the end of the
+    current transaction, and the rows locked by concurrent requests are skipped so that they are
+    assigned different cars.
+
+    Parameters
+    ----------
+    queryset: queryset
+        Queryset of :model:`cars.Car`.
+    start_date: date
+        First day of the booking.
+    end_date: date
+        Last day of the booking, inclusive.
+
+    Returns
+    -------
+    car: :model:`cars.Car` object or None if no car is free.
+    """
+    car_ids = list(exclude_booked_cars(queryset, start_date, end_date).order_by().values_list('id', flat=True))
+    for car_id in best_fit_car_ids(car_ids, start_date, end_date):
+        car = Car.objects.select_for_update(skip_locked=True).filter(id=car_id).first()
+        # the car may have been booked after it was found free, before it was locked.
+        if car is not None and not booked_periods(start_date, end_date, car_id=car_id).exists():
+            return car
+    return None
+
+def release_holds(user, car_ids, start_date, end_date):
+    """Deletes the holds of the cars for the dates which are expired or belong to the user,
+    before the user holds the cars again. Only the expired holds are deleted for an anonymous
+    user, the holds without user belong to other customers.
+    """
+    released = Q(expires_at__lte=timezone.now())
+    if user is not None and user.is_authenticated:
+        released |= Q(user=user)
+    BookingHold.objects.filter(
+        car_id__in=car_ids, period__overlap=booking_period(start_date, end_date)
+    ).filter(released).delete()
+
+def hold_cars(user, cars, start_date, end_date):
+    """Holds the cars for the dates until the checkout session is completed or expires.
+    The holds of concurrent checkouts are rejected by the exclusion constraint of
+    :model:`orders.BookingHold`, so only one of them can pay for the car.
+
+    Parameters
+    ----------
+    user: :model:`accounts.User` object
+    cars: list
+        :model:`cars.Car` objects to hold.
+    start_date: date
+        First day of the booking.
+    end_date: date
+        Last day of the booking, inclusive.
+
+    Returns
+    -------
+    holds: list
+        :model:`orders.BookingHold` objects created.
+    """
+    expires_at = timezone.now() + BOOKING_HOLD_TTL
+    # bulk_create doesn't call save(), the period is set here.
+    holds = [
+        BookingHold(
+            car=car, user=user, start_date=start_date, end_date=end_date,
+            period=booking_period(start_date, end_date), expires_at=expires_at
+        )
+        for car in cars
+    ]
+    try:
+        with transaction.atomic():
+            BookingHold.objects.bulk_create(holds)
+    except IntegrityError as e:
+        if getattr(getattr(e.__cause__, 'diag', None), 'constraint_name', None) != BOOKING_HOLD_CONSTRAINT:
+            raise
+        raise ValidationError({'message': CAR_BOOKING_NOT_AVAILABLE})
+    bump_version(BOOKINGS)
+    return holds
+
+def attach_holds(holds, checkout_session):
+    """Links the holds to the checkout session, which consumes or expires them.
+    """
+    BookingHold.objects.filter(id__in=[hold.id for hold in holds]).update(session_id=checkout_session['id'])
+
+def consume_holds(session_id):
+    """Deletes the holds of a completed or expired checkout session.
+    """
+    if BookingHold.objects.filter(session_id=session_id).delete()[0]:
+        bump_version(BOOKINGS)
+
 def create_order_serializer(request, start_date, end_date, car):
     data = {}
     days = end_date - start_date
@@ -42,7 +138,15 @@ def discount_validator(discount_id, user):
     return discounts
 
 
-def create_payment_session(serializer, car, discounts):
+def session_expiry(expires_at):
+    """Returns the arguments expiring a checkout session with its holds.
+    """
+    if expires_at is None:
+        return {}
+    return {'expires_at': int(expires_at.timestamp())}
+
+
+def create_payment_session(serializer, car, discounts, expires_at=None):
     pay_data = {
         "price_data": {
             "currency": "inr",
@@ -68,6 +172,7 @@ def create_payment_session(serializer, car, discounts):
         line_items=[
             pay_data,
         ],
+        **session_expiry(expires_at)
     )
     return checkout_session
 
@@ -96,3 +201,46 @@ def create_fine_payment_session(order):
         ],
     )
     return checkout_session
+
+def create_group_payment_session(serializers, cars, discounts, expires_at=None):
+    """Creates one checkout session paying for the orders of a group booking,
+    with a line item per car.
+    The cars and dates are kept in the metadata of the session, in the order of the line items,
+    so that the webhook creates all the orders from the completed session.
+    """
+    line_items = [
+        {
+            "price_data": {
+                "currency": "inr",
+                "unit_amount": int(float(serializer.data['price']))*100,
+                "product_data": {
+                    "name": f"{car.brand} {car.name} {car.reg_number}",
+                    "metadata": {
+                        "car": serializer.data['car'],
+                        "start_date": serializer.data['start_date'],
+                        "end_date": serializer.data['end_date'],
+                        "user": serializer.data['user'],
+                        "fine": False
+                    }
+                },
+            },
+            "quantity": 1
+        }
+        for serializer, car in zip(serializers, cars)
+    ]
+    checkout_session = stripe.checkout.Session.create(
+        success_url= settings.DOMAIN + "/payments/success?session_id={CHECKOUT_SESSION_ID}",
+        cancel_url=settings.DOMAIN + "/payments/cancel/",
+        mode='payment',
+        discounts=discounts,
+        line_items=line_items,
+        **session_expiry(expires_at),
+        metadata={
+            "group": True,
+            "cars": ",".join(str(car.id) for car in cars),
+            "start_date": serializers[0].data['start_date'],
+            "end_date": serializers[0].data['end_date'],
+            "user": serializers[0].data['user'],
+        },
+    )
+    return checkout_session
@@ -4,13 +4,16 @@ from .views import (
     StripeConfigView, SuccessView,
     CancelledView, stripe_webhook,
     ListCreateDiscount, DeleteDiscountCoupon,
-    StripeFineSessionView,
+    StripeFineSessionView, StripeAnyCarSessionView,
+    StripeGroupSessionView,
 )
 
 urlpatterns = [
     path('config/', StripeConfigView.as_view(), name="stripe-config"),
     path('checkout/', CheckoutRender.as_view(), name="checkout-page"),
     path('checkout-session/', StripeSessionView.as_view(), name="checkout-session"),
+    path('checkout-session/any-car/', StripeAnyCarSessionView.as_view(), name="any-car-checkout-session"),
+    path('checkout-session/group/', StripeGroupSessionView.as_view(), name="group-checkout-session"),
 
     path('<int:pk>/fine-checkout-session/', StripeFineSessionView.as_view()),
 
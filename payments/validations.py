@@ -6,7 +6,7 @@ from constants import (
     INVALID_START_END_DATE,
     PROVIDE_START_END_DATE
 )
-from orders.models import Order
+from cars.availability import booked_periods, free_windows
 
 def date_validation(start_date, end_date):
     if start_date is None or end_date is None:
@@ -27,12 +27,22 @@ def date_validation(start_date, end_date):
         
 
 def overlapping_orders_validation(car_id, start_date, end_date):
-    overlapping_orders = Order.objects.filter(
-        car_id=car_id, cancelled=False,
-        start_date__lte=end_date, end_date__gte=start_date).exists()
-    if overlapping_orders:
+    if booked_periods(start_date, end_date, car_id=car_id).exists():
         raise ValidationError({
-            "message": CAR_BOOKING_NOT_AVAILABLE
+            "message": CAR_BOOKING_NOT_AVAILABLE,
+            "suggestions": free_windows(car_id, start_date, end_date)
+        })
+
+
+def group_overlapping_orders_validation(car_ids, start_date, end_date):
+    """Validates that none of the cars is booked for the dates, all the cars are checked
+    with a single query.
+    """
+    booked = sorted({car_id for car_id, _, _ in booked_periods(start_date, end_date, car_id__in=car_ids)})
+    if booked:
+        raise ValidationError({
+            "message": CAR_BOOKING_NOT_AVAILABLE,
+            "cars": booked
         })
 
 
@@ -4,16 +4,31 @@ from rest_framework.response import Response
 from rest_framework.generics import ListCreateAPIView, DestroyAPIView
 from django.conf import settings
 import stripe
+from cars.filters import CarFilter
 from cars.models import Car
-from orders.models import Order
+from constants import INVALID_GROUP_CARS, NO_CAR_AVAILABLE
+from orders.models import FINE_PAID, FINE_PENDING, Order, ORDER_PAYMENT_CONSTRAINT, ORDER_PERIOD_CONSTRAINT, booking_period
+from orders.refunds import finalize_refunds
+from analytics.rollups import order_state, update_rollups
+from orders.signals import send_order_invoice
+from cars.cache import BOOKINGS, bump_version
 from orders.serializers import CreateOrderSerializer
 from django.views.decorators.csrf import csrf_exempt
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
+from datetime import datetime
 from .models import Discount
 from .serializers import CreateDiscountSerializer
 from rest_framework.permissions import IsAdminUser
-from .validations import date_validation, overlapping_orders_validation, validate_order_fine
-from .services import create_fine_payment_session, create_order_serializer, discount_validator, create_payment_session, get_car_object
+from .validations import (
+    date_validation, group_overlapping_orders_validation, overlapping_orders_validation, validate_order_fine
+)
+from .services import (
+    attach_holds, consume_holds, create_fine_payment_session, create_group_payment_session,
+    create_order_serializer, discount_validator, create_payment_session, get_car_object, hold_cars,
+    lock_best_fit_car, release_holds
+)
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 
 
@@ -107,12 +122,119 @@ class StripeSessionView(APIView):
         discount_id = request.data.get('stripe_discount_id')
         
         start_date, end_date = date_validation(start_date, end_date)
-        overlapping_orders_validation(car_id, start_date, end_date)
         discounts = discount_validator(discount_id, request.user)
         car = get_car_object(car_id)
         serializer = create_order_serializer(request, start_date, end_date, car)
+        user = request.user if request.user.is_authenticated else None
 
-        checkout_session = create_payment_session(serializer, car, discounts)
+        #the car is held for the dates until the payment is confirmed or the session expires.
+        with transaction.atomic():
+            release_holds(user, [car.id], start_date, end_date)
+            overlapping_orders_validation(car.id, start_date, end_date)
+            holds = hold_cars(user, [car], start_date, end_date)
+            checkout_session = create_payment_session(serializer, car, discounts, holds[0].expires_at)
+            attach_holds(holds, checkout_session)
+
+        return Response({'sessionId': checkout_session['id']})
+
+
+class StripeAnyCarSessionView(APIView):
+    """StripeAnyCarSessionView is the API of sessions resource for booking any car, and
+    responsible to handle the requests of /checkout-session/any-car/ endpoint.
+    The car is picked by the server among the listable cars matching the filters of the car list,
+    such as `type`, `brand` or `seats`, as the free car which best fits the dates.
+    """
+
+    permission_classes = [IsAuthenticated]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    def post(self, request):
+        """
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+
+        Returns
+        -------
+        sessionId: String
+            stripe checkout session ID for payment gateway.
+        car: Int
+            Primary key of the assigned :model:`cars.Car`.
+        """
+        start_date, end_date = date_validation(request.data.get('start_date'), request.data.get('end_date'))
+        discounts = discount_validator(request.data.get('stripe_discount_id'), request.user)
+        filterset = CarFilter(data=request.data, queryset=Car.objects.filter(is_listable=True))
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        #the chosen car stays locked until it is held for the payment session.
+        with transaction.atomic():
+            car = lock_best_fit_car(filterset.qs, start_date, end_date)
+            if car is None:
+                raise ValidationError({'message': NO_CAR_AVAILABLE})
+            serializer = create_order_serializer(request, start_date, end_date, car)
+            #the expired holds still count for the exclusion constraint until they are reaped.
+            release_holds(request.user, [car.id], start_date, end_date)
+            holds = hold_cars(request.user, [car], start_date, end_date)
+            checkout_session = create_payment_session(serializer, car, discounts, holds[0].expires_at)
+            attach_holds(holds, checkout_session)
+
+        return Response({'sessionId': checkout_session['id'], 'car': car.id})
+
+
+class StripeGroupSessionView(APIView):
+    """StripeGroupSessionView is the API of sessions resource for group bookings, and
+    responsible to handle the requests of /checkout-session/group/ endpoint.
+    Books several cars for the same dates with a single payment, either all the cars are booked
+    or none of them.
+    """
+
+    permission_classes = [IsAuthenticated]
+    """List of permissions that should be used for granting or denial of request.
+    """
+
+    max_cars = 10
+    """Maximum number of cars of a group booking, the webhook reads the line items of the
+    session from a single page.
+    """
+
+    def post(self, request):
+        """
+        Parameters
+        ----------
+        request: HttpRequest object
+            Contains data about the request.
+
+        Returns
+        -------
+        sessionId: String
+            stripe checkout session ID for payment gateway.
+        """
+        start_date, end_date = date_validation(request.data.get('start_date'), request.data.get('end_date'))
+        car_ids = request.data.get('cars')
+        if hasattr(request.data, 'getlist'):
+            car_ids = request.data.getlist('cars')
+        try:
+            car_ids = [int(car_id) for car_id in car_ids or []]
+        except (TypeError, ValueError):
+            raise ValidationError({'message': INVALID_GROUP_CARS})
+        cars = list(Car.objects.filter(id__in=car_ids, is_listable=True).order_by('id'))
+        if not 0 < len(car_ids) <= self.max_cars or len(cars) != len(car_ids):
+            raise ValidationError({'message': INVALID_GROUP_CARS})
+        discounts = discount_validator(request.data.get('stripe_discount_id'), request.user)
+        serializers = [create_order_serializer(request, start_date, end_date, car) for car in cars]
+
+        with transaction.atomic():
+            release_holds(request.user, car_ids, start_date, end_date)
+            #validates the dates of all the cars at once.
+            group_overlapping_orders_validation(car_ids, start_date, end_date)
+            holds = hold_cars(request.user, cars, start_date, end_date)
+            checkout_session = create_group_payment_session(
+                serializers, cars, discounts, holds[0].expires_at
+            )
+            attach_holds(holds, checkout_session)
 
         return Response({'sessionId': checkout_session['id']})
 
@@ -166,33 +288,105 @@ def stripe_webhook(request):
                                                       payment_intent=session["payment_intent"],
                                                       expand=['data.line_items']
                                                      )
-        product_id = payment_intent['data'][0]['line_items']['data'][0]['price']['product']
+        line_items = payment_intent['data'][0]['line_items']['data']
+        if session.get('metadata', {}).get('group') == "True":
+            create_group_orders(session, line_items)
+            consume_holds(session['id'])
+            return HttpResponse(status=200)
+        product_id = line_items[0]['price']['product']
         product = stripe.Product.retrieve(product_id)
         if product['metadata']['fine'] == "True":
             order_id = product['metadata']['order_id']
             order = Order.objects.get(id=order_id)
-            order.fine_paid=True
-            order.fine_payment_intent_id = session["payment_intent"]
-            order.save()
+            if order.status == FINE_PENDING:
+                order.transition(FINE_PAID)
+                order.fine_payment_intent_id = session["payment_intent"]
+                order.save()
         else:
             product['metadata']['price'] = session['amount_total']//100
             product['metadata']['discount'] = session['total_details']['amount_discount']//100
             product['metadata']['payment_intent_id'] = session["payment_intent"]
             create_order(**product['metadata'])
+            consume_holds(session['id'])
+
+    if event['type'] == 'checkout.session.expired':
+        consume_holds(event['data']['object']['id'])
 
     if event['type'] == "charge.refunded":
-        session = event['data']['object']
-        order = Order.objects.get(payment_intent_id=session["payment_intent"])
-        order.refund = True
-        order.save()
+        finalize_refunds(event['data']['object'])
 
     return HttpResponse(status=200)
 
 
 def create_order(**data):
+    """Creates the order paid through the checkout session.
+    The period of the order is guarded by the exclusion constraint of :model:`orders.Order`,
+    if another order took the car for overlapping dates in the meantime the payment is refunded.
+    """
     serializer = CreateOrderSerializer(data=data)
     if serializer.is_valid(raise_exception=True):
-        serializer.save()
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError as e:
+            handle_order_conflict(e, data['payment_intent_id'])
+
+
+def handle_order_conflict(error, payment_intent_id):
+    """Handles an integrity error raised while creating the orders paid by the payment intent.
+    The payment is refunded if another order took a car for overlapping dates, unless the
+    orders of the payment already exist, created by an earlier delivery of the same webhook.
+    """
+    constraint = getattr(getattr(error.__cause__, 'diag', None), 'constraint_name', None)
+    if constraint not in (ORDER_PERIOD_CONSTRAINT, ORDER_PAYMENT_CONSTRAINT):
+        raise error
+    if Order.objects.filter(payment_intent_id=payment_intent_id).exists():
+        return
+    stripe.Refund.create(payment_intent=payment_intent_id)
+
+
+def create_group_orders(session, line_items):
+    """Creates all the orders of a group booking paid through the checkout session,
+    with a single insert in one transaction.
+    If any of the cars was taken for overlapping dates in the meantime none of the orders is
+    created and the payment is refunded, an already processed session is ignored.
+
+    Parameters
+    ----------
+    session: dict
+        Completed checkout session.
+    line_items: list
+        Line items of the session, in the order of the cars of its metadata.
+    """
+    metadata = session['metadata']
+    start_date = datetime.strptime(metadata['start_date'], "%Y-%m-%d").date()
+    end_date = datetime.strptime(metadata['end_date'], "%Y-%m-%d").date()
+    car_ids = [int(car_id) for car_id in metadata['cars'].split(',')]
+    # bulk_create neither calls save() nor sends post_save, the period, the cache version,
+    # the rollups and the invoices are handled here.
+    orders = [
+        Order(
+            car_id=car_id,
+            user_id=metadata['user'],
+            start_date=start_date,
+            end_date=end_date,
+            period=booking_period(start_date, end_date),
+            price=line_item['amount_total']//100,
+            discount=line_item.get('amount_discount', 0)//100,
+            payment_intent_id=session["payment_intent"],
+        )
+        for car_id, line_item in zip(car_ids, line_items)
+    ]
+    try:
+        with transaction.atomic():
+            Order.objects.bulk_create(orders)
+            update_rollups([(None, order_state(order)) for order in orders])
+    except IntegrityError as e:
+        handle_order_conflict(e, session["payment_intent"])
+        return
+    bump_version(BOOKINGS)
+    for order in Order.objects.select_related('user').filter(id__in=[order.id for order in orders]):
+        send_order_invoice(order)
 
 
 class ListCreateDiscount(ListCreateAPIView):
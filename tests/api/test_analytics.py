@@ -0,0 +1,255 @@
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from analytics.models import BrandDailyRollup, CarDailyRollup, TypeDailyRollup
+from analytics.rollups import backfill_rollups
+from cars.models import Brand, Car
+from orders.models import ACTIVE, RETURNED, Order
+from orders.refunds import queue_refund
+from orders.services import return_orders
+from payments.views import create_group_orders
+from constants import INVALID_ROLLUP_GROUP, INVALID_ROLLUP_PERIOD, PROVIDE_START_END_DATE
+from datetime import datetime, timedelta
+
+MEASURES = ('orders', 'revenue', 'discount', 'fines', 'booked_days')
+
+
+def rollups(model):
+    """Return the non-empty rollup rows of the model, as tuples.
+    """
+    return sorted(
+        row for row in model.objects.values_list('day', *MEASURES)
+        if any(row[1:])
+    )
+
+
+def snapshot():
+    return {
+        model.__name__: sorted(model.objects.exclude(orders=0, fines=0, booked_days=0).values_list(
+            *[field.attname for field in model._meta.concrete_fields if field.name != 'id']
+        ))
+        for model in (CarDailyRollup, BrandDailyRollup, TypeDailyRollup)
+    }
+
+
+@pytest.mark.django_db
+def test_order_rollups(order):
+    """An order adds its sale on its order day and a booked day on every day of its booking,
+        to the rollups of its car, brand and type, cancelling it removes them.
+    """
+    order.refresh_from_db()
+    today = datetime.today().date()
+    for model in (CarDailyRollup, BrandDailyRollup, TypeDailyRollup):
+        assert rollups(model) == [
+            (today, 1, Decimal(1000), Decimal(0), Decimal(0), 0),
+            (order.start_date, 0, Decimal(0), Decimal(0), Decimal(0), 1),
+        ]
+    assert BrandDailyRollup.objects.filter(brand=order.car.brand).count() == 2
+
+    queue_refund(order)
+    for model in (CarDailyRollup, BrandDailyRollup, TypeDailyRollup):
+        assert rollups(model) == []
+
+
+@pytest.mark.django_db
+def test_return_fine_rollups(order_return_late, auth_user_client):
+    """The fine of a late return is added on the last day of the order.
+    """
+    response = auth_user_client.post(f'/orders/{order_return_late.id}/return-car/')
+    assert response.status_code == 200
+    order_return_late.refresh_from_db()
+    fines = CarDailyRollup.objects.get(car=order_return_late.car, day=order_return_late.end_date).fines
+    assert fines == order_return_late.fine_amount > 0
+
+
+@pytest.mark.django_db
+def test_bulk_return_fine_rollups(order_return_late):
+    """The orders returned together, with a single bulk update, add their fines too.
+    """
+    return_orders([order_return_late.id], datetime.today().date())
+    order_return_late.refresh_from_db()
+    fines = TypeDailyRollup.objects.get(type=order_return_late.car.type, day=order_return_late.end_date).fines
+    assert fines == order_return_late.fine_amount > 0
+
+
+@pytest.mark.django_db
+def test_group_orders_rollups(car, user):
+    """The orders of a group booking, inserted with a single bulk create, are added to the rollups.
+    """
+    other = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    start_date = datetime.today().date() + timedelta(days=3)
+    session = {
+        "payment_intent": "pi_group",
+        "metadata": {
+            "group": "True",
+            "cars": f"{car.id},{other.id}",
+            "start_date": str(start_date),
+            "end_date": str(start_date + timedelta(days=1)),
+            "user": str(user.id),
+        },
+    }
+    line_items = [
+        {"amount_total": 400000, "amount_discount": 0},
+        {"amount_total": 180000, "amount_discount": 20000},
+    ]
+    create_group_orders(session, line_items)
+    assert rollups(BrandDailyRollup) == [
+        (datetime.today().date(), 2, Decimal(5800), Decimal(200), Decimal(0), 0),
+        (start_date, 0, Decimal(0), Decimal(0), Decimal(0), 2),
+        (start_date + timedelta(days=1), 0, Decimal(0), Decimal(0), Decimal(0), 2),
+    ]
+    assert CarDailyRollup.objects.filter(car=other, booked_days=1).count() == 2
+
+
+@pytest.mark.django_db
+def test_backfill_rollups(order_return_late, user):
+    """The backfill rebuilds the rollups kept incrementally, in chunks, entirely or
+        for a date range only.
+    """
+    return_orders([order_return_late.id], datetime.today().date())
+    start_date = datetime.today().date() - timedelta(days=10)
+    Order.objects.create(
+        user=user, car=order_return_late.car, start_date=start_date, end_date=start_date + timedelta(days=2),
+        price=3000, discount=100, payment_intent_id='def',
+    )
+    expected = snapshot()
+
+    CarDailyRollup.objects.all().delete()
+    BrandDailyRollup.objects.update(revenue=0)
+    call_command('backfill_rollups', '--chunk-size', '1')
+    assert snapshot() == expected
+
+    CarDailyRollup.objects.all().delete()
+    report = backfill_rollups(chunk_size=1, window_days=2)
+    assert report['windows'] == 6
+    assert snapshot() == expected
+
+    TypeDailyRollup.objects.update(booked_days=7)
+    report = backfill_rollups(start_date, start_date + timedelta(days=1), chunk_size=1)
+    assert (report['orders'], report['windows']) == (1, 1)
+    assert TypeDailyRollup.objects.get(day=start_date).booked_days == 1
+    assert TypeDailyRollup.objects.get(day=start_date + timedelta(days=2)).booked_days == 7
+
+
+@pytest.mark.django_db
+def test_order_rollups_atomic(order, monkeypatch):
+    """The order isn't saved if its rollups can't be updated.
+    """
+    def fail(*args, **kwargs):
+        raise RuntimeError("rollups unavailable")
+
+    monkeypatch.setattr('analytics.signals.update_rollups', fail)
+    order.status = RETURNED
+    with pytest.raises(RuntimeError):
+        order.save(update_fields=['status'])
+    order.refresh_from_db()
+    assert order.status == ACTIVE
+
+
+@pytest.mark.django_db
+def test_car_brand_change_moves_rollups(order):
+    """The brand rollups follow the car to its new brand, and then its orders are removed
+        from the rollups of the new brand.
+    """
+    order.refresh_from_db()
+    car = order.car
+    previous_brand = car.brand
+    car.brand = Brand.objects.create(name="Mahindra")
+    car.save()
+    assert rollups(BrandDailyRollup) == rollups(CarDailyRollup)
+    assert not BrandDailyRollup.objects.filter(brand=previous_brand).exclude(orders=0, booked_days=0).exists()
+
+    order.status = RETURNED
+    order.fine_amount = 500
+    order.save()
+    assert BrandDailyRollup.objects.get(brand=car.brand, day=order.end_date).fines == Decimal(500)
+    assert not BrandDailyRollup.objects.filter(brand=previous_brand).exclude(orders=0, fines=0, booked_days=0).exists()
+
+
+@pytest.mark.django_db
+def test_car_delete_removes_rollups(order_return_late, user):
+    """Deleting a car removes its orders from the rollups of its brand and type, as the
+        backfill counts only the orders with a car.
+    """
+    return_orders([order_return_late.id], datetime.today().date())
+    car = order_return_late.car
+    other = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    Order.objects.create(
+        user=user, car=other, start_date=order_return_late.start_date, end_date=order_return_late.end_date,
+        price=3000, discount=100, payment_intent_id='def',
+    )
+    car.delete()
+    order_return_late.refresh_from_db()
+    assert order_return_late.car_id is None
+    assert sum(row[1] for row in rollups(BrandDailyRollup)) == 1
+    incremental = snapshot()
+
+    backfill_rollups()
+    assert snapshot() == incremental
+
+
+@pytest.mark.django_db
+def test_analytics_rollups(order, auth_superuser_client):
+    """The rollups are grouped by brand and month by default, or by car, type and day.
+    """
+    order.refresh_from_db()
+    today = datetime.today().date()
+    dates = {'from': str(today), 'to': str(order.end_date)}
+    response = auth_superuser_client.get('/analytics/rollups/', dates)
+    assert response.status_code == 200
+    revenue = sum(row['revenue'] for row in response.data['data'])
+    assert revenue == Decimal(1000)
+    assert {row['name'] for row in response.data['data']} == {"Tata"}
+    assert sum(row['booked_days'] for row in response.data['data']) == 1
+
+    response = auth_superuser_client.get('/analytics/rollups/', {**dates, 'group_by': 'car', 'period': 'day'})
+    rows = [(row['period'], row['car'], row['orders'], row['booked_days']) for row in response.data['data']]
+    assert rows == [(today, order.car_id, 1, 0), (order.start_date, order.car_id, 0, 1)]
+
+    response = auth_superuser_client.get('/analytics/rollups/', {**dates, 'group_by': 'user'})
+    assert response.data['message'] == INVALID_ROLLUP_GROUP
+    response = auth_superuser_client.get('/analytics/rollups/', {**dates, 'period': 'year'})
+    assert response.data['message'] == INVALID_ROLLUP_PERIOD
+    response = auth_superuser_client.get('/analytics/rollups/')
+    assert response.data['message'] == PROVIDE_START_END_DATE
+
+
+@pytest.mark.django_db
+def test_analytics_utilization(order, auth_superuser_client):
+    """The utilization is the share of the days the cars were booked, for the fleet or by type.
+    """
+    order.refresh_from_db()
+    dates = {'from': str(order.start_date), 'to': str(order.start_date + timedelta(days=3))}
+    response = auth_superuser_client.get('/analytics/utilization/', dates)
+    assert response.status_code == 200
+    assert (response.data['cars'], response.data['days'], response.data['booked_days']) == (1, 4, 1)
+    assert response.data['utilization'] == 0.25
+
+    response = auth_superuser_client.get('/analytics/utilization/', {**dates, 'group_by': 'type'})
+    assert response.data['data'] == [
+        {'type': order.car.type_id, 'cars': 1, 'booked_days': 1, 'utilization': 0.25}
+    ]
+
+    #the cars which can't be listed are left out.
+    Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=order.car.brand, type=order.car.type,
+        available=False,
+    )
+    response = auth_superuser_client.get('/analytics/utilization/', {**dates, 'group_by': 'car'})
+    assert response.data['data'] == [
+        {'car': order.car_id, 'cars': 1, 'booked_days': 1, 'utilization': 0.25}
+    ]
+    response = auth_superuser_client.get('/analytics/utilization/', {**dates, 'group_by': 'user'})
+    assert response.data['message'] == INVALID_ROLLUP_GROUP
+
+
+@pytest.mark.django_db
+def test_analytics_not_admin(order, auth_user_client):
+    response = auth_user_client.get('/analytics/rollups/', {'from': '2022-01-01', 'to': '2022-12-31'})
+    assert response.status_code == 403
+    response = auth_user_client.get('/analytics/utilization/', {'from': '2022-01-01', 'to': '2022-12-31'})
+    assert response.status_code == 403
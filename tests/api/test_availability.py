@@ -0,0 +1,381 @@
+import pytest
+import stripe
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from cars import views
+from cars.availability import exclude_booked_cars
+from cars.models import Car, CarBlackout
+from orders.models import CANCELLED, BookingHold, Order
+from payments.services import attach_holds, consume_holds, hold_cars, lock_best_fit_car, release_holds
+from payments.validations import overlapping_orders_validation
+from constants import (
+    CAR_BLACKOUT_NOT_AVAILABLE,
+    CAR_BOOKING_NOT_AVAILABLE,
+    INVALID_BOOKING_DAYS,
+    INVALID_CAR_IDS,
+    INVALID_START_END_DATE,
+    PROVIDE_START_END_DATE,
+)
+
+
+def book(car, user, start_date, end_date, payment_intent_id):
+    return Order.objects.create(
+        user=user, car=car, start_date=start_date, end_date=end_date,
+        price=1000, discount=0, payment_intent_id=payment_intent_id
+    )
+
+
+@pytest.mark.django_db
+def test_car_availability_success(car, user, client):
+    today = date.today()
+    book(car, user, today + timedelta(days=2), today + timedelta(days=3), 'pi_1')
+    book(car, user, today + timedelta(days=4), today + timedelta(days=4), 'pi_2')
+    response = client.get(f"/cars/{car.id}/availability/?from={today}&to={today + timedelta(days=6)}")
+    assert response.status_code == 200
+    assert response.data["booked"] == [
+        {"start_date": today + timedelta(days=2), "end_date": today + timedelta(days=4)}
+    ]
+    assert response.data["free"] == [
+        {"start_date": today, "end_date": today + timedelta(days=1)},
+        {"start_date": today + timedelta(days=5), "end_date": today + timedelta(days=6)},
+    ]
+    assert [day["booked"] for day in response.data["days"]] == [False, False, True, True, True, False, False]
+
+
+@pytest.mark.django_db
+def test_car_availability_ignores_cancelled_orders(order, client):
+    order.status = CANCELLED
+    order.save()
+    response = client.get(f"/cars/{order.car_id}/availability/?from={order.start_date}&to={order.end_date}")
+    assert response.status_code == 200
+    assert response.data["booked"] == []
+
+
+@pytest.mark.django_db
+def test_car_availability_fail_dates(car, client):
+    response = client.get(f"/cars/{car.id}/availability/")
+    assert response.status_code == 400
+    assert response.data["message"] == PROVIDE_START_END_DATE
+
+    response = client.get(f"/cars/{car.id}/availability/?from=2022-07-15&to=2022-07-13")
+    assert response.status_code == 400
+    assert response.data["message"] == INVALID_START_END_DATE
+
+
+@pytest.mark.django_db
+def test_fleet_availability_success(car, user, client, django_assert_num_queries):
+    other = Car.objects.create(
+        name="Harrier", price=3000, reg_number="GJ-01 EZ 0001", brand=car.brand, type=car.type
+    )
+    today = date.today()
+    book(other, user, today, today, 'pi_1')
+    with django_assert_num_queries(2):
+        response = client.get(f"/cars/availability/?ids={car.id},{other.id}&from={today}&to={today}")
+    assert response.status_code == 200
+    assert [(result["car"], result["days"][0]["booked"]) for result in response.data["results"]] == [
+        (car.id, False), (other.id, True)
+    ]
+
+
+@pytest.mark.django_db
+def test_fleet_availability_fail_ids(client):
+    today = date.today()
+    response = client.get(f"/cars/availability/?ids=a,b&from={today}&to={today}")
+    assert response.status_code == 400
+    assert response.data["message"] == INVALID_CAR_IDS
+
+
+@pytest.mark.django_db
+def test_car_free_windows_success(car, user, client, django_assert_num_queries):
+    """Windows of the requested length are suggested in the gaps around the bookings,
+        the nearest first.
+    """
+    today = date.today()
+    book(car, user, today + timedelta(days=1), today + timedelta(days=5), 'pi_1')
+    book(car, user, today + timedelta(days=8), today + timedelta(days=9), 'pi_2')
+    book(car, user, today + timedelta(days=10), today + timedelta(days=12), 'pi_3')
+    start_date, end_date = today + timedelta(days=4), today + timedelta(days=5)
+    url = f"/cars/{car.id}/free-windows/?start_date={start_date}&end_date={end_date}&count=5"
+    with django_assert_num_queries(2):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert response.data["results"] == [
+        {"start_date": today + timedelta(days=6), "end_date": today + timedelta(days=7)},
+        {"start_date": today + timedelta(days=13), "end_date": today + timedelta(days=14)},
+    ]
+
+    start_date, end_date = today + timedelta(days=20), today + timedelta(days=22)
+    response = client.get(f"/cars/{car.id}/free-windows/?start_date={start_date}&end_date={end_date}")
+    assert response.data["results"] == [{"start_date": start_date, "end_date": end_date}]
+
+
+@pytest.mark.django_db
+def test_car_free_windows_fail(car, client):
+    response = client.get(f"/cars/{car.id}/free-windows/?start_date={date.today()}")
+    assert response.data["message"] == PROVIDE_START_END_DATE
+    response = client.get(f"/cars/0/free-windows/?start_date={date.today()}&end_date={date.today()}")
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_flexible_car_search_success(car, user, client, django_assert_max_num_queries):
+    """Every car is returned with the earliest start of a free stay of the requested days,
+        the cars without one are left out.
+    """
+    today = date.today()
+    busy = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    Car.objects.create(
+        name="Punch", price=1000, reg_number="GJ-01 EZ 0003", brand=car.brand, type=car.type
+    )
+    book(car, user, today + timedelta(days=1), today + timedelta(days=2), 'pi_1')
+    book(car, user, today + timedelta(days=5), today + timedelta(days=5), 'pi_2')
+    book(busy, user, today + timedelta(days=1), today + timedelta(days=6), 'pi_3')
+    client.get("/cars/list_create_brand/")
+    url = f"/cars/flexible-search/?from={today}&to={today + timedelta(days=6)}&days=2"
+    with django_assert_max_num_queries(4) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    #the filtered cars are matched with a subquery rather than a list of their ids.
+    assert any('"car_id" IN (SELECT' in query['sql'] for query in queries.captured_queries)
+    assert [(result["name"], result["earliest_start_date"]) for result in response.data["results"]] == [
+        ("Punch", today), ("Nexon", today + timedelta(days=3)),
+    ]
+
+    response = client.get(f"{url}&name=nexon&limit=1")
+    assert response.data["count"] == 1
+
+
+@pytest.mark.django_db
+def test_flexible_car_search_candidates(car, client, monkeypatch):
+    """Only the first cars by id are searched, and the cars gone since their start dates
+        were computed are skipped.
+    """
+    today = date.today()
+    other = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    url = f"/cars/flexible-search/?from={today}&to={today + timedelta(days=6)}&days=2"
+    monkeypatch.setattr('cars.views.FlexibleCarSearchView.max_candidates', 1)
+    response = client.get(url)
+    assert [result["id"] for result in response.data["results"]] == [car.id]
+
+    earliest_start_dates = views.earliest_start_dates
+
+    def deleting_earliest_start_dates(*args):
+        start_dates = earliest_start_dates(*args)
+        other.delete()
+        return start_dates
+
+    monkeypatch.setattr('cars.views.FlexibleCarSearchView.max_candidates', 500)
+    monkeypatch.setattr('cars.views.earliest_start_dates', deleting_earliest_start_dates)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert [result["id"] for result in response.data["results"]] == [car.id]
+
+
+@pytest.mark.django_db
+def test_flexible_car_search_fail(car, client):
+    today = date.today()
+    response = client.get(f"/cars/flexible-search/?from={today}&to={today + timedelta(days=2)}&days=4")
+    assert response.data["message"] == INVALID_BOOKING_DAYS
+    response = client.get(f"/cars/flexible-search/?from={today}&to={today}")
+    assert response.data["message"] == INVALID_BOOKING_DAYS
+
+
+@pytest.mark.django_db
+def test_blackout_makes_car_unavailable(car, user, client, auth_superuser_client):
+    """A blackout hides the car from the search, rejects its bookings
+        and shows in its calendar, like a booking.
+    """
+    today = date.today()
+    start_date, end_date = today + timedelta(days=3), today + timedelta(days=4)
+    response = auth_superuser_client.post(
+        f"/cars/{car.id}/blackouts/", {"start_date": start_date, "end_date": end_date, "reason": "Service"}
+    )
+    assert response.status_code == 201
+    assert CarBlackout.objects.get(id=response.data["id"]).car_id == car.id
+
+    response = auth_superuser_client.get(
+        f"/cars/list_create_car/?start_date={end_date}&end_date={end_date + timedelta(days=1)}"
+    )
+    assert response.data["count"] == 0
+    response = auth_superuser_client.get(f"/cars/{car.id}/availability/?from={today}&to={end_date}")
+    assert response.data["booked"] == [{"start_date": start_date, "end_date": end_date}]
+    response = auth_superuser_client.post(
+        "/payments/checkout-session/", {"car": car.id, "start_date": start_date, "end_date": start_date}
+    )
+    assert response.data["message"] == CAR_BOOKING_NOT_AVAILABLE
+    suggestion = str(today + timedelta(days=2))
+    assert response.data["suggestions"][0] == {"start_date": suggestion, "end_date": suggestion}
+
+
+@pytest.mark.django_db
+def test_blackout_fail_overlapping(car, user, auth_superuser_client):
+    today = date.today()
+    book(car, user, today + timedelta(days=2), today + timedelta(days=3), 'pi_1')
+    response = auth_superuser_client.post(
+        f"/cars/{car.id}/blackouts/",
+        {"start_date": today + timedelta(days=3), "end_date": today + timedelta(days=5)}
+    )
+    assert response.data["message"] == [CAR_BLACKOUT_NOT_AVAILABLE]
+    blackout = CarBlackout.objects.create(
+        car=car, start_date=today + timedelta(days=6), end_date=today + timedelta(days=7)
+    )
+    response = auth_superuser_client.patch(
+        f"/cars/blackouts/{blackout.id}/", {"end_date": today + timedelta(days=8)}
+    )
+    assert response.status_code == 200
+    response = auth_superuser_client.post(
+        f"/cars/{car.id}/blackouts/",
+        {"start_date": today + timedelta(days=8), "end_date": today + timedelta(days=8)}
+    )
+    assert response.data["message"] == [CAR_BLACKOUT_NOT_AVAILABLE]
+
+    #a checkout in progress holds the car for its dates.
+    BookingHold.objects.create(
+        car=car, user=user, start_date=today + timedelta(days=10), end_date=today + timedelta(days=10),
+        expires_at=timezone.now() + timedelta(minutes=5)
+    )
+    response = auth_superuser_client.post(
+        f"/cars/{car.id}/blackouts/",
+        {"start_date": today + timedelta(days=9), "end_date": today + timedelta(days=10)}
+    )
+    assert response.data["message"] == [CAR_BLACKOUT_NOT_AVAILABLE]
+
+
+@pytest.mark.django_db
+def test_lock_best_fit_car_picks_tightest_gap(car, user):
+    today = date.today()
+    loose = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    tight = Car.objects.create(
+        name="Punch", price=1000, reg_number="GJ-01 EZ 0003", brand=car.brand, type=car.type
+    )
+    book(car, user, today + timedelta(days=4), today + timedelta(days=5), 'pi_1')
+    book(tight, user, today + timedelta(days=2), today + timedelta(days=3), 'pi_2')
+    book(tight, user, today + timedelta(days=6), today + timedelta(days=8), 'pi_3')
+    book(loose, user, today + timedelta(days=1), today + timedelta(days=1), 'pi_4')
+
+    cars = Car.objects.filter(is_listable=True)
+    with transaction.atomic():
+        assert lock_best_fit_car(cars, today + timedelta(days=4), today + timedelta(days=5)) == tight
+    with transaction.atomic():
+        assert lock_best_fit_car(cars, today + timedelta(days=2), today + timedelta(days=2)) == car
+        day = today + timedelta(days=2)
+        assert lock_best_fit_car(cars.filter(id=tight.id), day, day) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lock_best_fit_car_skips_locked_car(car):
+    """A car locked by a concurrent request is skipped for the next best one.
+    """
+    other = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    start_date = end_date = date.today() + timedelta(days=1)
+    locked, release = threading.Event(), threading.Event()
+
+    def concurrent_request():
+        with transaction.atomic():
+            assert lock_best_fit_car(Car.objects.all(), start_date, end_date) == car
+            locked.set()
+            release.wait(5)
+        connection.close()
+
+    thread = threading.Thread(target=concurrent_request)
+    thread.start()
+    try:
+        assert locked.wait(5)
+        with transaction.atomic():
+            assert lock_best_fit_car(Car.objects.all(), start_date, end_date) == other
+    finally:
+        release.set()
+        thread.join()
+
+
+@pytest.mark.django_db
+def test_booking_hold_makes_car_unavailable(car, user, superuser, client):
+    """A live hold hides the car from the search and rejects the checkouts of other users,
+        until it expires or its session is completed.
+    """
+    start_date = end_date = date.today() + timedelta(days=2)
+    with transaction.atomic():
+        release_holds(user, [car.id], start_date, end_date)
+        holds = hold_cars(user, [car], start_date, end_date)
+        attach_holds(holds, {"id": "cs_test"})
+    assert holds[0].period.lower == start_date
+
+    response = client.get(f"/cars/list_create_car/?start_date={start_date}&end_date={end_date}")
+    assert response.data["count"] == 0
+    with pytest.raises(ValidationError):
+        overlapping_orders_validation(car.id, start_date, end_date)
+    with pytest.raises(ValidationError):
+        hold_cars(superuser, [car], start_date, end_date)
+
+    #the user checking out again replaces their own hold.
+    release_holds(user, [car.id], start_date, end_date)
+    holds = hold_cars(user, [car], start_date, end_date)
+    attach_holds(holds, {"id": "cs_test"})
+    consume_holds("cs_test")
+    response = client.get(f"/cars/list_create_car/?start_date={start_date}&end_date={end_date}")
+    assert response.data["count"] == 1
+
+
+@pytest.mark.django_db
+def test_expired_booking_holds_are_ignored_and_reaped(car, user, superuser):
+    start_date = end_date = date.today() + timedelta(days=2)
+    hold = BookingHold.objects.create(
+        car=car, user=user, start_date=start_date, end_date=end_date,
+        expires_at=timezone.now() - timedelta(minutes=1)
+    )
+    assert exclude_booked_cars(Car.objects.all(), start_date, end_date).exists()
+    overlapping_orders_validation(car.id, start_date, end_date)
+
+    call_command('reap_booking_holds', stdout=StringIO())
+    assert not BookingHold.objects.filter(id=hold.id).exists()
+
+
+@pytest.mark.django_db
+def test_any_car_checkout_replaces_expired_hold(car, superuser, auth_user_client, monkeypatch, settings):
+    """An expired hold not reaped yet doesn't keep the best fit car from being held.
+    """
+    start_date = end_date = date.today() + timedelta(days=2)
+    BookingHold.objects.create(
+        car=car, user=superuser, start_date=start_date, end_date=end_date,
+        expires_at=timezone.now() - timedelta(minutes=1)
+    )
+    settings.DOMAIN = 'http://testserver'
+    monkeypatch.setattr(stripe.checkout.Session, 'create', lambda **kwargs: {'id': 'cs_any'})
+    payload = {'start_date': str(start_date), 'end_date': str(end_date)}
+    response = auth_user_client.post('/payments/checkout-session/any-car/', payload, format='json')
+    assert response.status_code == 200
+    assert response.data['car'] == car.id
+    assert list(BookingHold.objects.values_list('car_id', 'session_id')) == [(car.id, 'cs_any')]
+
+
+@pytest.mark.django_db
+def test_release_holds_of_anonymous_user(car):
+    """Only the expired holds are released for an anonymous user, not the holds of other
+        customers without user.
+    """
+    start_date = end_date = date.today() + timedelta(days=2)
+    live = BookingHold.objects.create(
+        car=car, start_date=start_date, end_date=end_date, expires_at=timezone.now() + timedelta(minutes=5)
+    )
+    expired = BookingHold.objects.create(
+        car=car, start_date=start_date - timedelta(days=1), end_date=start_date - timedelta(days=1),
+        expires_at=timezone.now() - timedelta(minutes=1)
+    )
+    release_holds(AnonymousUser(), [car.id], start_date - timedelta(days=1), end_date)
+    release_holds(None, [car.id], start_date - timedelta(days=1), end_date)
+    assert list(BookingHold.objects.values_list('id', flat=True)) == [live.id]
+    assert not BookingHold.objects.filter(id=expired.id).exists()
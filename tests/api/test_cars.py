@@ -6,10 +6,12 @@ from constants import (
     INVALID_START_END_DATE,
     DELETE_SUCCESS,
     DELETE_BRAND_EXISTING_BOOKINGS,
-    DELETE_CAR_EXISTING_BOOKINGS
+    DELETE_CAR_EXISTING_BOOKINGS,
+    INVALID_IMPORT_FORMAT,
+    INVALID_SEARCH_PAGINATION,
 )
 from datetime import datetime
-from orders.models import Order
+from orders.models import CANCELLED, Order
 
 @pytest.mark.django_db
 def test_create_car_brand_success(auth_superuser_client):
@@ -366,3 +368,276 @@ def test_delete_car_type_brand_fail(auth_superuser_client, user):
     response = auth_superuser_client.delete(f"/cars/{car_type.id}/type_detail/", payload)
     assert response.status_code == 400
     assert response.data['message'] == DELETE_TYPE_EXISTING_BOOKINGS
+
+
+@pytest.mark.django_db
+def test_list_car_excludes_booked_car(order, auth_user_client):
+    """The car of `order` is booked for the given date, so it is not listed.
+    """
+    date = order.start_date
+    response = auth_user_client.get(f"/cars/list_create_car/?start_date={date}&end_date={date}")
+    assert response.status_code == 200
+    assert response.data['count'] == 0
+
+
+@pytest.mark.django_db
+def test_list_car_includes_cancelled_booking_car(order, auth_user_client):
+    """Cancelling the order removes its period from the availability index,
+        so the car is listed again for those dates.
+    """
+    order.status = CANCELLED
+    order.save()
+    date = order.start_date
+    response = auth_user_client.get(f"/cars/list_create_car/?start_date={date}&end_date={date}")
+    assert response.status_code == 200
+    assert response.data['count'] == 1
+    assert response.data['results'][0]['id'] == order.car_id
+
+
+@pytest.mark.django_db
+def test_list_car_cursor_pagination(auth_user_client):
+    """With `?pagination=cursor` the list is paginated on the car id,
+        the response carries opaque cursors and no count.
+    """
+    brand = Brand.objects.create(name="Tata", available=True)
+    car_type = Type.objects.create(name="SUV", available=True)
+    cars = Car.objects.bulk_create(
+        Car(name=f"Nexon {i}", price=2000, reg_number=f"GJ-01 EZ {i}", brand=brand, type=car_type)
+        for i in range(8)
+    )
+    response = auth_user_client.get("/cars/list_create_car/?pagination=cursor")
+    assert response.status_code == 200
+    assert "count" not in response.data
+    assert response.data["previous"] is None
+    assert [car["id"] for car in response.data["results"]] == [car.id for car in cars[:6]]
+
+    response = auth_user_client.get(response.data["next"])
+    assert response.status_code == 200
+    assert response.data["next"] is None
+    assert [car["id"] for car in response.data["results"]] == [car.id for car in cars[6:]]
+
+
+@pytest.mark.django_db
+def test_list_car_fuzzy_search(car, auth_user_client):
+    """The search tolerates typos and matches the name, brand and type of the car.
+    """
+    other = Car.objects.create(
+        name="Creta", price=2000, reg_number="GJ-01 EZ 0001",
+        brand=Brand.objects.create(name="Hyundai"), type=car.type,
+    )
+    response = auth_user_client.get("/cars/list_create_car/?search=nexn")
+    assert [result["id"] for result in response.data["results"]] == [car.id]
+
+    response = auth_user_client.get("/cars/list_create_car/?search=hyundia")
+    assert [result["id"] for result in response.data["results"]] == [other.id]
+
+    response = auth_user_client.get("/cars/list_create_car/?search=suv")
+    assert response.data["count"] == 2
+
+    #the ranked results can't be paged on the car id.
+    response = auth_user_client.get("/cars/list_create_car/?search=suv&pagination=cursor")
+    assert response.status_code == 400
+    assert response.data["message"] == INVALID_SEARCH_PAGINATION
+
+
+@pytest.mark.django_db
+def test_brand_rename_updates_car_search(car, auth_superuser_client):
+    response = auth_superuser_client.patch(f"/cars/{car.brand_id}/brand_detail/", {"name": "Tata Motors"})
+    assert response.status_code == 200
+    car.refresh_from_db()
+    assert car.search_text == "Nexon Tata Motors SUV"
+
+
+@pytest.mark.django_db
+def test_brand_update_refreshes_catalogue_cache(car, auth_superuser_client):
+    """Cars render their brand from the catalogue cache, which is invalidated
+        when the brand is updated.
+    """
+    response = auth_superuser_client.get(f"/cars/{car.id}/car_detail/")
+    assert response.data["brand"]["name"] == "Tata"
+
+    auth_superuser_client.patch(f"/cars/{car.brand_id}/brand_detail/", {"name": "Tata Motors"})
+    response = auth_superuser_client.get(f"/cars/{car.id}/car_detail/")
+    assert response.data["brand"]["name"] == "Tata Motors"
+    response = auth_superuser_client.get("/cars/list_create_brand/")
+    assert response.data["results"][0]["name"] == "Tata Motors"
+
+
+@pytest.mark.django_db
+def test_list_car_not_modified(car, client, django_assert_num_queries):
+    """A request with the ETag of the previous response gets a 304 without querying
+        the database, until a car is changed.
+    """
+    response = client.get("/cars/list_create_car/")
+    etag = response["ETag"]
+    with django_assert_num_queries(0):
+        response = client.get("/cars/list_create_car/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    car.price = 2500
+    car.save()
+    response = client.get("/cars/list_create_car/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_list_car_dates_etag_changes_with_bookings(order, client):
+    date = order.start_date
+    url = f"/cars/list_create_car/?start_date={date}&end_date={date}"
+    etag = client.get(url)["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    order.status = CANCELLED
+    order.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data["count"] == 1
+
+
+@pytest.mark.django_db
+def test_retrieve_car_not_modified(car, client):
+    response = client.get(f"/cars/{car.id}/car_detail/")
+    assert client.get(f"/cars/{car.id}/car_detail/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+
+@pytest.mark.django_db
+def test_import_cars_csv_reports_invalid_rows(car, auth_superuser_client):
+    body = (
+        "name,brand,type,price,reg_number,fuel_type\n"
+        "Harrier,tata,SUV,3000,GJ-01 AB 0001,diesel\n"
+        "Safari,Unknown,SUV,3500,GJ-01 AB 0002,diesel\n"
+        "Punch,Tata,suv,abc,GJ-01 AB 0003,petrol\n"
+        "Tiago,Tata,SUV,1500,GJ-01 AB 0004,electric\n"
+    )
+    response = auth_superuser_client.post("/cars/import/", body, content_type="text/csv")
+    assert response.status_code == 201
+    assert response.data["created"] == 2
+    assert response.data["failed"] == 2
+    assert [error["row"] for error in response.data["errors"]] == [2, 3]
+    assert "brand" in response.data["errors"][0]["errors"]
+    assert "price" in response.data["errors"][1]["errors"]
+    imported = Car.objects.get(name="Harrier")
+    assert imported.brand_id == car.brand_id
+    assert imported.search_text == "Harrier Tata SUV"
+
+
+@pytest.mark.django_db
+def test_import_cars_ndjson(car, auth_superuser_client):
+    body = (
+        '{"name": "Harrier", "brand": "Tata", "type": "SUV", "price": 3000, "reg_number": "GJ-01 AB 0001"}\n'
+        '\n'
+        'not json\n'
+    )
+    response = auth_superuser_client.post("/cars/import/", body, content_type="application/x-ndjson")
+    assert response.status_code == 201
+    assert response.data["created"] == 1
+    assert response.data["errors"][0]["row"] == 2
+    response = auth_superuser_client.get("/cars/list_create_car/?search=harrier")
+    assert response.data["count"] == 1
+
+
+@pytest.mark.django_db
+def test_import_cars_unreadable_stream(car, auth_superuser_client):
+    """A body which isn't UTF-8, or isn't valid CSV, ends the import with the position
+        of the error reported like an invalid row.
+    """
+    header = b"name,brand,type,price,reg_number\n"
+    body = header + b"Harrier,Tata,SUV,3000,GJ-01 AB 0001\nSafari,Tata,SUV,3500,GJ-01 AB 0002\xe9\n"
+    response = auth_superuser_client.post("/cars/import/", body, content_type="text/csv")
+    assert response.status_code == 400
+    assert (response.data["created"], response.data["failed"], response.data["truncated"]) == (1, 1, True)
+    assert response.data["errors"] == [
+        {"row": 2, "errors": {"non_field_errors": [f"Invalid utf-8 text at byte {len(body) - 2}."]}}
+    ]
+
+    body = header + b"Punch,Tata,SUV,1500,GJ-01\rAB 0003\n"
+    response = auth_superuser_client.post("/cars/import/", body, content_type="text/csv")
+    assert response.status_code == 400
+    assert response.data["errors"][0]["row"] == 1
+    assert "new-line character seen in unquoted field" in response.data["errors"][0]["errors"]["non_field_errors"][0]
+    assert Car.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_import_cars_fail(car, auth_superuser_client):
+    body = "name,brand,type,price,reg_number\nHarrier,Tata,SUV,3000,GJ-01 AB 0001\n"
+    response = auth_superuser_client.post("/cars/import/", body, content_type="text/plain")
+    assert response.data["message"] == INVALID_IMPORT_FORMAT
+    assert Car.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_import_cars_fail_not_admin(car, auth_user_client):
+    body = "name,brand,type,price,reg_number\nHarrier,Tata,SUV,3000,GJ-01 AB 0001\n"
+    response = auth_user_client.post("/cars/import/", body, content_type="text/csv")
+    assert response.status_code == 403
+    assert Car.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_list_car_hides_unavailable_brand_and_type(car, auth_superuser_client, django_assert_num_queries):
+    """Toggling a brand or type updates the listable flag of its cars with a single update query.
+    """
+    from cars.signals import refresh_cars
+    with django_assert_num_queries(1):
+        refresh_cars(Car.objects.filter(brand=car.brand))
+
+    auth_superuser_client.patch(f"/cars/{car.brand_id}/brand_detail/", {"available": False})
+    assert not Car.objects.get(id=car.id).is_listable
+    assert auth_superuser_client.get("/cars/list_create_car/").data["count"] == 0
+
+    auth_superuser_client.patch(f"/cars/{car.brand_id}/brand_detail/", {"available": True})
+    auth_superuser_client.patch(f"/cars/{car.type_id}/type_detail/", {"available": False})
+    assert auth_superuser_client.get("/cars/list_create_car/").data["count"] == 0
+
+    auth_superuser_client.patch(f"/cars/{car.type_id}/type_detail/", {"available": True})
+    assert auth_superuser_client.get("/cars/list_create_car/").data["count"] == 1
+    auth_superuser_client.patch(f"/cars/{car.id}/car_detail/", {"available": False})
+    assert auth_superuser_client.get("/cars/list_create_car/").data["count"] == 0
+
+
+@pytest.mark.django_db
+def test_car_facets(car, client, django_assert_num_queries):
+    """All the facets of a search are counted by a single query, and then cached.
+    """
+    Car.objects.create(
+        name="Altroz", price=800, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type,
+        seats=5, fuel_type="diesel", transmission_type="automatic",
+    )
+    Car.objects.create(
+        name="Creta", price=12000, reg_number="GJ-01 EZ 0003", brand=Brand.objects.create(name="Hyundai"),
+        type=car.type, available=False,
+    )
+    client.get("/cars/list_create_brand/")
+    with django_assert_num_queries(1):
+        response = client.get("/cars/facets/")
+    assert response.status_code == 200
+    assert response.data["count"] == 2
+    assert response.data["fuel_type"] == [{"value": "diesel", "count": 1}, {"value": "petrol", "count": 1}]
+    assert response.data["seats"] == [{"value": 4, "count": 1}, {"value": 5, "count": 1}]
+    assert response.data["brand"] == [{"id": car.brand_id, "name": "Tata", "count": 2}]
+    assert response.data["price"] == [
+        {"min": None, "max": 1000, "count": 1},
+        {"min": 2000, "max": 5000, "count": 1},
+    ]
+    with django_assert_num_queries(0):
+        assert client.get("/cars/facets/").data == response.data
+
+
+@pytest.mark.django_db
+def test_car_facets_apply_list_filters(order, client):
+    response = client.get("/cars/facets/?fuel_type=petrol&max_price=5000")
+    assert response.data["count"] == 1
+    assert response.data["transmission_type"] == [{"value": "manual", "count": 1}]
+    assert client.get("/cars/facets/?search=nexn").data["count"] == 1
+
+    date = order.start_date
+    response = client.get(f"/cars/facets/?start_date={date}&end_date={date}")
+    assert response.data["count"] == 0
+    assert response.data["brand"] == []
+
+    order.status = CANCELLED
+    order.save()
+    response = client.get(f"/cars/facets/?end_date={date}&start_date={date}")
+    assert response.data["count"] == 1
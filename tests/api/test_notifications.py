@@ -0,0 +1,56 @@
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from notifications.models import OutboxEmail
+from notifications.outbox import queue_email, send_batch
+
+
+@pytest.mark.django_db
+def test_send_outbox(user):
+    """The due emails are sent by the worker and only once.
+    """
+    queue_email("Invoice", "<b>Paid</b>", [user.email], html=True)
+    OutboxEmail.objects.filter(id=queue_email("Later", "Body", [user.email]).id).update(
+        next_attempt_at=timezone.now() + timedelta(hours=1)
+    )
+    call_command('send_outbox')
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].subject == "Invoice"
+    assert mail.outbox[0].content_subtype == "html"
+    assert OutboxEmail.objects.get(subject="Invoice").sent_at is not None
+
+    call_command('send_outbox')
+    assert len(mail.outbox) == 1
+
+
+@pytest.mark.django_db
+def test_send_outbox_retry(user, settings):
+    """An email which fails is retried later, with the error recorded.
+    """
+    email = queue_email("Invoice", "Body", [user.email])
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST = '127.0.0.1'
+    settings.EMAIL_PORT = 1
+    settings.EMAIL_USE_TLS = False
+    assert send_batch() == {'sent': 0, 'failed': 1}
+    email.refresh_from_db()
+    assert email.sent_at is None
+    assert email.attempts == 1
+    assert email.last_error
+    assert email.next_attempt_at > timezone.now()
+
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    assert send_batch() == {'sent': 0, 'failed': 0}
+    OutboxEmail.objects.update(next_attempt_at=timezone.now())
+    assert send_batch() == {'sent': 1, 'failed': 0}
+    assert len(mail.outbox) == 1
+
+
+@pytest.mark.django_db
+def test_password_reset_queued(user, client):
+    response = client.post('/auth/password_reset/', {"email": user.email})
+    assert response.status_code == 200
+    assert OutboxEmail.objects.filter(to=[user.email], sent_at__isnull=True).count() == 1
+    assert len(mail.outbox) == 0
@@ -1,14 +1,40 @@
+import csv
+import json
 import pytest
+import stripe
+import numpy as np
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.utils import timezone
+from accounts.models import User
+from cars.availability import exclude_booked_cars
+from cars.models import Car
+from notifications.models import OutboxEmail
+from orders.exports import EXPORT_FIELDS
+from orders.fines import accrue_fines, fine_amount, fine_cents
+from orders.invoices import HTML, invoice_key
+from orders.models import ACTIVE, BOOKED, CANCELLED, RETURNED, Order, OrderRefund
+from orders.refunds import finalize_refunds, process_refunds, queue_refund
+from payments.views import create_group_orders
 from constants import (
+    CAR_BOOKING_NOT_AVAILABLE,
+    INVALID_EXPORT_FORMAT,
+    INVALID_GROUP_CARS,
+    INVALID_INVOICE_FORMAT,
     INVALID_REQUEST,
     INVALID_START_END_DATE,
     INVALID_START_DATE,
     LATE_ORDER_CANCEL,
     ORDER_ALREADY_CANCELLED,
+    ORDER_CANCEL_SUCCESS,
+    ORDER_NOT_FOUND,
     PROVIDE_START_END_DATE,
     CAR_RETURN_SUCCESS,
 )
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 @pytest.mark.django_db
@@ -81,10 +107,18 @@ def test_create_order_fail_PROVIDE_START_END_DATE(car, auth_user_client):
 
 
 
-# @pytest.mark.django_db
-# def test_cancel_order_success(order, auth_user_client):
-#     response = auth_user_client.post(f'/orders/{order.id}/cancel/')
-#     assert response.status_code == 400
+@pytest.mark.django_db
+def test_cancel_order_success(order, auth_user_client):
+    """The order is cancelled right away, freeing its car, and its refund is queued.
+    """
+    response = auth_user_client.post(f'/orders/{order.id}/cancel/')
+    assert response.status_code == 200
+    assert response.data["message"] == ORDER_CANCEL_SUCCESS
+    order.refresh_from_db()
+    assert order.cancelled and not order.refund
+    assert order.refund_request.status == OrderRefund.PENDING
+    cars = Car.objects.filter(id=order.car_id)
+    assert exclude_booked_cars(cars, order.start_date, order.end_date).exists()
 
 
 @pytest.mark.django_db
@@ -104,6 +138,7 @@ def test_return_order_late_success(order_return_late, auth_user_client):
     data = response.data["data"]
     assert response.status_code == 200
     assert data["fine_generated"] == True
+    assert data["fine_amount"] == "9000.00"
     assert response.data["message"] == CAR_RETURN_SUCCESS
 
 
@@ -111,7 +146,7 @@ def test_return_order_late_success(order_return_late, auth_user_client):
 def test_return_order_returned_fail(order, auth_user_client):
     """The user cannot resubmit the car which is already submitted.
     """
-    order.returned = True
+    order.status = RETURNED
     order.save()
     response = auth_user_client.post(f'/orders/{order.id}/return-car/')
     assert response.status_code == 400
@@ -122,7 +157,7 @@ def test_return_order_returned_fail(order, auth_user_client):
 def test_return_order_cancelled_fail(order, auth_user_client):
     """The user cannot cancel the order which is already cancelled.
     """
-    order.cancelled = True
+    order.status = CANCELLED
     order.save()
     response = auth_user_client.post(f'/orders/{order.id}/return-car/')
     assert response.status_code == 400
@@ -134,7 +169,7 @@ def test_return_order_early_fail(order_early, auth_user_client):
     """If user tries to submit the car before the start_date,
         then he is refused.
     """
-    order_early.cancelled = True
+    order_early.status = CANCELLED
     order_early.save()
     response = auth_user_client.post(f'/orders/{order_early.id}/return-car/')
     assert response.status_code == 400
@@ -164,7 +199,7 @@ def test_view_bookings_fine(auth_user_client):
 def test_cancel_order_cancelled_fail(order, auth_user_client):
     """The user cannot cancel the order which is already cancelled.
     """
-    order.cancelled = True
+    order.status = CANCELLED
     order.save()
     response = auth_user_client.post(f'/orders/{order.id}/cancel/')
     assert response.status_code == 400
@@ -179,3 +214,349 @@ def test_cancel_order_early_fail(order_return_late, auth_user_client):
     response = auth_user_client.post(f'/orders/{order_return_late.id}/cancel/')
     assert response.status_code == 400
     assert response.data["message"] == LATE_ORDER_CANCEL
+
+
+@pytest.mark.django_db
+def test_create_order_fail_CAR_BOOKING_NOT_AVAILABLE(order, auth_user_client):
+    """The car of `order` is already booked for the requested dates.
+    """
+    payload = {
+        "car": order.car_id,
+        "start_date": order.start_date,
+        "end_date": order.end_date,
+    }
+    response = auth_user_client.post('/payments/checkout-session/', payload)
+    assert response.status_code == 400
+    assert response.data['message'] == CAR_BOOKING_NOT_AVAILABLE
+    day = datetime.strptime(order.start_date, '%Y-%m-%d').date()
+    assert response.data['suggestions'] == [
+        {'start_date': str(day - timedelta(days=1)), 'end_date': str(day - timedelta(days=1))},
+        {'start_date': str(day + timedelta(days=1)), 'end_date': str(day + timedelta(days=1))},
+    ]
+
+
+@pytest.mark.django_db
+def test_overlapping_order_rejected_by_database(order):
+    """The exclusion constraint refuses a second order for overlapping dates,
+        even when the application level validation is skipped.
+    """
+    with pytest.raises(IntegrityError):
+        Order.objects.create(
+            user=order.user, car=order.car, start_date=order.start_date,
+            end_date=order.end_date, price=1000, discount=0, payment_intent_id='xyz'
+        )
+
+
+@pytest.mark.django_db
+def test_overlapping_order_allowed_after_cancel(order):
+    """Cancelled orders don't hold their period anymore.
+    """
+    order.status = CANCELLED
+    order.save()
+    Order.objects.create(
+        user=order.user, car=order.car, start_date=order.start_date,
+        end_date=order.end_date, price=1000, discount=0, payment_intent_id='xyz'
+    )
+    assert Order.objects.filter(BOOKED, car=order.car).count() == 1
+
+
+@pytest.mark.django_db
+def test_view_bookings_history_cursor_pagination(order, auth_user_client):
+    response = auth_user_client.get('/orders/bookings-history/?pagination=cursor')
+    assert response.status_code == 200
+    assert "count" not in response.data
+    assert response.data["results"][0]["id"] == order.id
+
+
+@pytest.mark.django_db
+def test_group_checkout_fail_CAR_BOOKING_NOT_AVAILABLE(order, auth_user_client):
+    """All the cars of a group are validated by a single overlap query.
+    """
+    other = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=order.car.brand, type=order.car.type
+    )
+    payload = {"cars": [order.car_id, other.id], "start_date": order.start_date, "end_date": order.end_date}
+    response = auth_user_client.post('/payments/checkout-session/group/', payload, format='json')
+    assert response.status_code == 400
+    assert response.data['message'] == CAR_BOOKING_NOT_AVAILABLE
+    assert response.data['cars'] == [str(order.car_id)]
+
+    payload["cars"] = [other.id, other.id]
+    response = auth_user_client.post('/payments/checkout-session/group/', payload, format='json')
+    assert response.data['message'] == INVALID_GROUP_CARS
+
+
+@pytest.mark.django_db
+def test_create_group_orders(car, user):
+    """The orders of a completed group session are inserted together, a second delivery
+        of the same session is ignored.
+    """
+    other = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    start_date = datetime.today().date() + timedelta(days=3)
+    session = {
+        "payment_intent": "pi_group",
+        "metadata": {
+            "group": "True",
+            "cars": f"{car.id},{other.id}",
+            "start_date": str(start_date),
+            "end_date": str(start_date + timedelta(days=1)),
+            "user": str(user.id),
+        },
+    }
+    line_items = [
+        {"amount_total": 400000, "amount_discount": 0},
+        {"amount_total": 180000, "amount_discount": 20000},
+    ]
+    create_group_orders(session, line_items)
+    orders = Order.objects.filter(payment_intent_id="pi_group").order_by('car_id')
+    assert [(o.car_id, o.price, o.discount) for o in orders] == [(car.id, 4000, 0), (other.id, 1800, 200)]
+    assert orders[0].period.lower == start_date
+    assert OutboxEmail.objects.filter(to=[user.email]).count() == 2
+    cars = Car.objects.filter(id__in=[car.id, other.id])
+    assert not exclude_booked_cars(cars, start_date, start_date).exists()
+
+    create_group_orders(session, line_items)
+    assert Order.objects.filter(payment_intent_id="pi_group").count() == 2
+
+
+@pytest.mark.django_db
+def test_order_invoice(order, auth_user_client):
+    """The invoice is rendered once and then served from the cache, as html or pdf.
+    """
+    response = auth_user_client.get(f'/orders/{order.id}/invoice/')
+    assert response.status_code == 200
+    assert f"Order Id: <b>{order.id}</b>" in response.content.decode()
+    assert cache.get(invoice_key(order, HTML)) == response.content.decode()
+
+    response = auth_user_client.get(f'/orders/{order.id}/invoice/', {'type': 'pdf'})
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/pdf'
+    assert response.content.startswith(b"%PDF-1.4") and response.content.endswith(b"%%EOF\n")
+    assert f"(Order Id: {order.id}) Tj".encode() in response.content
+
+    order.status = CANCELLED
+    order.save()
+    assert cache.get(invoice_key(order, HTML)) is None
+
+    response = auth_user_client.get(f'/orders/{order.id}/invoice/', {'type': 'doc'})
+    assert response.data['message'] == INVALID_INVOICE_FORMAT
+
+
+@pytest.mark.django_db
+def test_order_invoice_user_change(order, auth_user_client):
+    """Renaming the user drops the cached invoices of their orders, a login doesn't.
+    """
+    auth_user_client.get(f'/orders/{order.id}/invoice/')
+    user = order.user
+    user.save(update_fields=['last_login'])
+    assert cache.get(invoice_key(order, HTML)) is not None
+
+    user.first_name = "Renamed"
+    user.save()
+    assert cache.get(invoice_key(order, HTML)) is None
+    response = auth_user_client.get(f'/orders/{order.id}/invoice/')
+    assert "Renamed" in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_order_invoice_other_user(order, auth_user_client):
+    """Users only get the invoices of their own orders.
+    """
+    order.user = User.objects.create_user(
+        email="other.inexture@gmail.com", phone_number="+919987654327", password="Testing@321", password2="Testing@321"
+    )
+    order.save()
+    response = auth_user_client.get(f'/orders/{order.id}/invoice/')
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_order_invoice_pdf_attachment(car, user, settings):
+    settings.INVOICE_PDF_ATTACHMENT = True
+    order = Order.objects.create(
+        user=user, car=car, start_date=datetime.today().date(), end_date=datetime.today().date(),
+        price=1000, discount=0, payment_intent_id='pi_pdf'
+    )
+    email = OutboxEmail.objects.get(to=[user.email])
+    assert email.attachments[0]['filename'] == f"invoice-{order.id}.pdf"
+    assert email.attachments[0]['mimetype'] == 'application/pdf'
+
+
+def test_fine_cents_vectorized():
+    """The vectorized fines match the fine of each order, computed on the prices as decimals.
+    """
+    prices = [Decimal("2000"), Decimal("1999.99"), Decimal("3000"), Decimal("0.50")]
+    days = [4, 1, 3, 40]
+    fines = fine_cents(
+        np.array([int(price * 100) for price in prices], dtype=np.int64), np.array(days, dtype=np.int64)
+    )
+    for price, day, fine in zip(prices, days, fines):
+        expected = day * price + (price * (((day + 1) * day) // 2 * 5)) // 100
+        assert fine_amount(price, day) == expected
+        assert Decimal(int(fine)) / 100 == expected
+    assert fine_amount(Decimal("3000"), 3) == 9900
+
+
+@pytest.mark.django_db
+def test_accrue_fines(order_return_late, auth_user_client):
+    """The nightly run accrues the fine of the overdue orders only, and the return charges it.
+    """
+    order = Order.objects.create(
+        user=order_return_late.user, car=order_return_late.car, start_date=datetime.today().date(),
+        end_date=datetime.today().date(), price=1000, discount=0, payment_intent_id='pi_today'
+    )
+    out = StringIO()
+    call_command('accrue_fines', stdout=out)
+    order_return_late.refresh_from_db()
+    order.refresh_from_db()
+    assert order_return_late.accrued_fine == 9000
+    assert order.accrued_fine == 0
+    assert "Overdue orders: 1 (1 fines updated)" in out.getvalue()
+    assert f"Order-{order_return_late.id} " in out.getvalue()
+
+    assert accrue_fines(datetime.today().date())['updated'] == 0
+    report = accrue_fines(datetime.today().date() + timedelta(days=1))
+    assert report['orders'] == report['updated'] == 2
+    assert report['max_days'] == 5
+    assert [row['id'] for row in report['top']] == [order_return_late.id, order.id]
+
+    response = auth_user_client.post(f'/orders/{order_return_late.id}/return-car/')
+    assert response.data["data"]["fine_amount"] == "9000.00"
+    assert response.data["data"]["accrued_fine"] == "0.00"
+    assert accrue_fines(datetime.today().date())['orders'] == 0
+
+
+@pytest.mark.django_db
+def test_bulk_return_orders(order_return_late, auth_superuser_client):
+    """The returnable orders of the batch are returned with their fines, the others are reported.
+    """
+    today = datetime.today().date()
+    order_today, cancelled = [
+        Order.objects.create(
+            user=order_return_late.user, car=order_return_late.car, start_date=today, end_date=today,
+            price=1000, discount=0, payment_intent_id=payment_intent_id,
+            status=CANCELLED if payment_intent_id == 'pi_cancelled' else ACTIVE
+        )
+        for payment_intent_id in ('pi_today', 'pi_cancelled')
+    ]
+    payload = {"orders": [order_return_late.id, order_today.id, cancelled.id, 999999]}
+    response = auth_superuser_client.post('/orders/return-cars/', payload, format='json')
+    assert response.status_code == 200
+    assert response.data['returned'] == 2
+    late, in_time, cancelled_result, missing = response.data['data']
+    assert late['returned'] and late['fine_generated'] and late['fine_amount'] == 9000
+    assert in_time['returned'] and not in_time['fine_generated'] and in_time['fine_amount'] == 0
+    assert not cancelled_result['returned'] and cancelled_result['message'] == INVALID_REQUEST
+    assert not missing['returned'] and missing['message'] == ORDER_NOT_FOUND
+    order_return_late.refresh_from_db()
+    assert order_return_late.returned and order_return_late.fine_amount == 9000
+
+    response = auth_superuser_client.post('/orders/return-cars/', payload, format='json')
+    assert response.data['returned'] == 0
+
+
+@pytest.mark.django_db
+def test_bulk_return_orders_not_admin(order_today, auth_user_client):
+    response = auth_user_client.post('/orders/return-cars/', {"orders": [order_today.id]}, format='json')
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_export_booking_history(order, auth_user_client):
+    response = auth_user_client.get('/orders/bookings-history/export/')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/csv; charset=utf-8'
+    rows = list(csv.DictReader(b"".join(response.streaming_content).decode().splitlines()))
+    assert [(row['id'], row['price']) for row in rows] == [(str(order.id), "1000.00")]
+
+    response = auth_user_client.get('/orders/bookings-history/export/', {'type': 'ndjson'})
+    rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+    assert rows[0]['id'] == order.id
+    assert rows[0]['start_date'] == str(order.start_date)
+
+    response = auth_user_client.get('/orders/bookings-history/export/', {'type': 'xml'})
+    assert response.data['message'] == INVALID_EXPORT_FORMAT
+
+
+@pytest.mark.django_db
+def test_export_orders(order, auth_superuser_client):
+    """Admins export the orders of all the users made within the dates.
+    """
+    today = datetime.today().date()
+    response = auth_superuser_client.get('/orders/export/', {'from': str(today), 'to': str(today), 'type': 'ndjson'})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+    assert [row['id'] for row in rows] == [order.id]
+
+    yesterday = str(today - timedelta(days=1))
+    response = auth_superuser_client.get('/orders/export/', {'from': yesterday, 'to': yesterday})
+    assert b"".join(response.streaming_content).decode().splitlines() == [",".join(EXPORT_FIELDS)]
+
+    response = auth_superuser_client.get('/orders/export/', {'from': str(today)})
+    assert response.data['message'] == PROVIDE_START_END_DATE
+
+
+@pytest.mark.django_db
+def test_export_orders_not_admin(auth_user_client):
+    today = str(datetime.today().date())
+    response = auth_user_client.get('/orders/export/', {'from': today, 'to': today})
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_process_refunds(order, car, user, monkeypatch):
+    """Refunds are issued once with the key of their order, only the price of a group order
+    is refunded, and errors are retried or failed.
+    """
+    calls = []
+
+    def create_refund(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise stripe.error.APIConnectionError("Network error")
+        return {'id': f"re_{len(calls)}"}
+    monkeypatch.setattr(stripe.Refund, 'create', create_refund)
+
+    other = Car.objects.create(
+        name="Altroz", price=1000, reg_number="GJ-01 EZ 0002", brand=car.brand, type=car.type
+    )
+    order.refresh_from_db()
+    Order.objects.create(
+        user=user, car=other, start_date=order.start_date, end_date=order.end_date,
+        price=500, discount=0, payment_intent_id=order.payment_intent_id
+    )
+    refund = queue_refund(order)
+    assert process_refunds() == {'issued': 0, 'retried': 1, 'failed': 0}
+    refund.refresh_from_db()
+    assert refund.status == OrderRefund.PENDING and refund.attempts == 1 and refund.last_error
+
+    OrderRefund.objects.update(next_attempt_at=timezone.now())
+    assert process_refunds() == {'issued': 1, 'retried': 0, 'failed': 0}
+    refund.refresh_from_db()
+    assert refund.status == OrderRefund.ISSUED and refund.stripe_refund_id == "re_2"
+    assert calls[0]['idempotency_key'] == calls[1]['idempotency_key'] == f"order-refund-{order.id}"
+    assert calls[1]['amount'] == 100000
+    assert process_refunds() == {'issued': 0, 'retried': 0, 'failed': 0}
+
+    finalize_refunds({
+        "payment_intent": order.payment_intent_id,
+        "refunded": False,
+        "refunds": {"data": [{"id": "re_2", "metadata": {"order_id": str(order.id)}}]},
+    })
+    refund.refresh_from_db()
+    order.refresh_from_db()
+    assert order.refund and refund.status == OrderRefund.REFUNDED
+    assert Order.objects.filter(status=CANCELLED).count() == 1
+
+
+@pytest.mark.django_db
+def test_process_refunds_rejected(order, monkeypatch):
+    def create_refund(**kwargs):
+        raise stripe.error.InvalidRequestError("Charge already refunded", "payment_intent")
+    monkeypatch.setattr(stripe.Refund, 'create', create_refund)
+    refund = queue_refund(order)
+    assert process_refunds() == {'issued': 0, 'retried': 0, 'failed': 1}
+    refund.refresh_from_db()
+    assert refund.status == OrderRefund.FAILED
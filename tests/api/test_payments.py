@@ -1,5 +1,6 @@
 import pytest
 from datetime import datetime
+from orders.models import FINE_PAID, FINE_PENDING, RETURNED
 from constants import INVALID_START_DATE, INVALID_START_END_DATE, PROVIDE_START_END_DATE
 
 def test_StripeConfigView_success(client):
@@ -78,8 +79,7 @@ def test_create_session_fail_PROVIDE_START_END_DATE(car, auth_user_client):
 def test_create_fine_session_fail(order, auth_user_client):
     """User cannot create a payment session for a order which has no fine.
     """
-    order.fine_paid = False
-    order.fine_generated = False
+    order.status = RETURNED
     order.save()
     response = auth_user_client.post(f'/payments/{order.id}/fine-checkout-session/')
     assert response.status_code == 400
@@ -91,8 +91,7 @@ def test_create_fine_session_fail_already_paid(order, auth_user_client):
     """User cannot create a payment session for a order which has fine
         and is already been paid.
     """
-    order.fine_generated = True
-    order.fine_paid = True
+    order.status = FINE_PAID
     order.save()
     response = auth_user_client.post(f'/payments/{order.id}/fine-checkout-session/')
     assert response.status_code == 400
@@ -101,8 +100,7 @@ def test_create_fine_session_fail_already_paid(order, auth_user_client):
 
 @pytest.mark.django_db
 def test_create_fine_session_success(order, auth_user_client):
-    order.fine_generated = True
-    order.fine_paid = False
+    order.status = FINE_PENDING
     order.fine_amount = 1000
     order.save()
     response = auth_user_client.post(f'/payments/{order.id}/fine-checkout-session/')
@@ -0,0 +1,72 @@
+import pytest
+from datetime import date, timedelta
+from cars.models import Brand, Type, Car
+from orders.models import FINE_PENDING, Order
+from tests.query_budget import assert_query_budget
+
+
+def grow_cars(size):
+    """Creates cars, each of a different brand and type, up to the given size.
+    """
+    for i in range(Car.objects.count(), size):
+        Car.objects.create(
+            name=f"Nexon {i}",
+            price=2000,
+            reg_number=f"GJ-01 EZ {i}",
+            brand=Brand.objects.create(name=f"Brand {i}"),
+            type=Type.objects.create(name=f"Type {i}"),
+        )
+
+
+def grow_orders(user, **fields):
+    """Returns a callable creating orders of the user up to the given size,
+    every order for a different car.
+    """
+    def grow(size):
+        grow_cars(size)
+        start_date = date.today() + timedelta(days=2)
+        for i, car in enumerate(Car.objects.filter(cars_set__isnull=True).order_by('id')):
+            if Order.objects.filter(user=user).count() >= size:
+                break
+            Order.objects.create(
+                user=user, car=car, start_date=start_date, end_date=start_date,
+                price=1000, discount=0, payment_intent_id=f"pi_{car.id}", **fields
+            )
+    return grow
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url, budget", [
+    ("/cars/list_create_car/", 3),
+    ("/cars/list_create_car/?pagination=cursor", 2),
+    (f"/cars/list_create_car/?start_date={date.today()}&end_date={date.today()}", 3),
+])
+def test_car_list_query_budget(auth_user_client, url, budget):
+    assert_query_budget(auth_user_client, url, budget, grow_cars)
+
+
+@pytest.mark.django_db
+def test_car_detail_query_budget(auth_user_client):
+    assert_query_budget(
+        auth_user_client, lambda: f"/cars/{Car.objects.latest('id').id}/car_detail/", 2, grow_cars
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url, budget, fields", [
+    ("/orders/bookings/", 3, {}),
+    ("/orders/bookings-history/", 3, {}),
+    ("/orders/bookings-history/?pagination=cursor", 2, {}),
+    ("/orders/pending-fine/", 3, {"status": FINE_PENDING}),
+])
+def test_order_list_query_budget(user, auth_user_client, url, budget, fields):
+    assert_query_budget(auth_user_client, url, budget, grow_orders(user, **fields))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", ["/cars/list_create_brand/", "/cars/list_create_type/"])
+def test_catalogue_list_query_budget(client, url):
+    """Brands and types are listed from the catalogue cache, once it is loaded
+        the lists don't query the database.
+    """
+    assert_query_budget(client, url, 0, grow_cars)
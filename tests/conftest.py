@@ -3,9 +3,18 @@ from accounts.models import User
 from cars.models import Car, Brand, Type
 from orders.models import Order
 from rest_framework.test import APIClient
+from django.core.cache import cache
 from datetime import datetime, timedelta
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Clears the cache before every test, the cached data refers
+        to the objects of the previous tests.
+    """
+    cache.clear()
+
+
 @pytest.fixture()
 def user():
     """Customer user fixture for testing purpose.
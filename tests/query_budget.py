@@ -0,0 +1,44 @@
+"""Query budget assertions for the API endpoints.
+
+An endpoint is requested once per fixture size, the number of database queries
+it runs must stay within its declared budget and must not grow with the number
+of objects it returns. Each request is preceded by a warm up request, so the
+budget measures the endpoint with its caches loaded.
+"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def count_queries(client, url):
+    """Return the number of queries run by a successful GET request to the url.
+    """
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200, response.data
+    return len(context.captured_queries)
+
+
+def assert_query_budget(client, url, budget, grow, sizes=(1, 3, 6)):
+    """Assert the endpoint runs a fixed number of queries, within the budget.
+
+    Parameters
+    ----------
+    client: APIClient
+        Client used for the requests.
+    url: string or callable
+        Url of the endpoint, or a callable returning it once the fixtures are created.
+    budget: int
+        Maximum number of queries allowed for a request, authentication included.
+    grow: callable
+        Called with each size, creates the fixtures so that the endpoint lists that many objects.
+    sizes: tuple
+        Increasing fixture sizes the endpoint is requested with.
+    """
+    counts = {}
+    for size in sizes:
+        grow(size)
+        count_queries(client, url() if callable(url) else url)
+        counts[size] = count_queries(client, url() if callable(url) else url)
+    assert max(counts.values()) <= budget, f"{url} exceeded its budget of {budget} queries: {counts}"
+    assert len(set(counts.values())) == 1, f"{url} queries grow with the fixture size: {counts}"